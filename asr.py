@@ -0,0 +1,247 @@
+"""
+Speech recognition backends behind one small interface.
+
+Every backend has transcribe(audio) for a whole utterance and stream(),
+which returns a session with feed(audio, flush=False) -> partial text (or
+None) and finish() -> final text. flush asks for a partial that covers
+everything fed so far, e.g. when the speaker pauses. audio is always 16-bit mono PCM as an int16 numpy
+array at the recognizer's samplerate. Model packages are imported only by
+the backend that needs them:
+
+    whisper   faster-whisper (CTranslate2), local CPU, partials by re-decoding
+    vosk      Vosk/Kaldi, local CPU, native incremental partials
+    google    speech_recognition's recognize_google, online, final only
+    google_cloud  Google Cloud Speech-to-Text, online, final only
+"""
+import json
+import numpy as np
+
+
+class WhisperRecognizer:
+    """
+    faster-whisper on the CPU. Partials come from re-decoding the audio so
+    far every partial_every_ms of new speech (greedy, no beam search), which
+    keeps the final decode short because the model is already warm.
+    """
+
+    def __init__(self, model_size="base.en", compute_type="int8", cpu_threads=0, beam_size=1,
+                 partial_every_ms=600, language="en", samplerate=16000):
+        if samplerate != 16000:
+            raise ValueError("Whisper expects 16 kHz audio")
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+        self.beam_size = beam_size
+        self.language = language
+        self.samplerate = samplerate
+        self.partial_every = int(samplerate * partial_every_ms / 1000)
+
+    def _decode(self, audio, beam_size):
+        segments, _ = self.model.transcribe(
+            audio.astype(np.float32) / 32768.0,
+            language=self.language,
+            beam_size=beam_size,
+            condition_on_previous_text=False,
+            without_timestamps=True,
+        )
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def transcribe(self, audio):
+        return self._decode(np.asarray(audio), self.beam_size)
+
+    def stream(self):
+        return _WhisperStream(self)
+
+
+class _WhisperStream:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.chunks = []
+        self.samples = 0
+        self.decoded_at = 0
+        self.partial = ""
+
+    def feed(self, audio, flush=False):
+        if len(audio):
+            self.chunks.append(np.array(audio, dtype=np.int16))
+            self.samples += len(audio)
+        new = self.samples - self.decoded_at
+        if new == 0 or (new < self.recognizer.partial_every and not flush):
+            return None
+        self.decoded_at = self.samples
+        self.partial = self.recognizer._decode(np.concatenate(self.chunks), 1)
+        return self.partial
+
+    def finish(self):
+        if not self.chunks:
+            return ""
+        if self.decoded_at == self.samples and self.recognizer.beam_size == 1:
+            return self.partial  # nothing new since the last partial
+        return self.recognizer.transcribe(np.concatenate(self.chunks))
+
+
+class VoskRecognizer:
+    """Vosk small models: tens of MB, real-time on one core, true streaming."""
+
+    def __init__(self, model_path="models/vosk-model-small-en-us-0.15", samplerate=16000):
+        from vosk import Model, SetLogLevel
+
+        SetLogLevel(-1)
+        self.model = Model(model_path)
+        self.samplerate = samplerate
+
+    def transcribe(self, audio):
+        session = self.stream()
+        session.feed(audio)
+        return session.finish()
+
+    def stream(self):
+        from vosk import KaldiRecognizer
+
+        return _VoskStream(KaldiRecognizer(self.model, self.samplerate))
+
+
+class _VoskStream:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.done = []  # text of the pieces Vosk has already finalized
+
+    def feed(self, audio, flush=False):
+        # Vosk's partial always covers everything fed, so there is nothing to flush
+        if self.recognizer.AcceptWaveform(np.asarray(audio, dtype=np.int16).tobytes()):
+            self.done.append(json.loads(self.recognizer.Result())["text"])
+            partial = ""
+        else:
+            partial = json.loads(self.recognizer.PartialResult())["partial"]
+        return " ".join(t for t in self.done + [partial] if t) or None
+
+    def finish(self):
+        self.done.append(json.loads(self.recognizer.FinalResult())["text"])
+        return " ".join(t for t in self.done if t)
+
+
+class _BufferedStream:
+    """Session for backends without partials: collects audio, transcribes on finish()."""
+
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.chunks = []
+
+    def feed(self, audio, flush=False):
+        self.chunks.append(np.array(audio, dtype=np.int16))
+        return None
+
+    def finish(self):
+        if not self.chunks:
+            return ""
+        return self.recognizer.transcribe(np.concatenate(self.chunks))
+
+
+class GoogleRecognizer:
+    """The free Google Web Speech API via speech_recognition. Needs internet."""
+
+    def __init__(self, language="en-US", samplerate=16000):
+        import speech_recognition as sr
+
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+        self.language = language
+        self.samplerate = samplerate
+
+    def transcribe(self, audio):
+        data = self.sr.AudioData(np.asarray(audio, dtype=np.int16).tobytes(), self.samplerate, 2)
+        try:
+            return self.recognizer.recognize_google(data, language=self.language)
+        except self.sr.UnknownValueError:
+            return ""
+
+    def stream(self):
+        return _BufferedStream(self)
+
+
+class GoogleCloudRecognizer:
+    """Google Cloud Speech-to-Text (needs credentials and internet)."""
+
+    def __init__(self, language="en-US", samplerate=16000):
+        from google.cloud import speech_v1p1beta1
+
+        self.speech = speech_v1p1beta1
+        self.client = speech_v1p1beta1.SpeechClient()
+        self.config = speech_v1p1beta1.RecognitionConfig(
+            encoding=speech_v1p1beta1.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=samplerate,
+            language_code=language,
+        )
+        self.samplerate = samplerate
+
+    def transcribe(self, audio):
+        content = np.asarray(audio, dtype=np.int16).tobytes()
+        response = self.client.recognize(config=self.config, audio=self.speech.RecognitionAudio(content=content))
+        return " ".join(result.alternatives[0].transcript for result in response.results).strip()
+
+    def stream(self):
+        return _BufferedStream(self)
+
+
+BACKENDS = {
+    "whisper": WhisperRecognizer,
+    "vosk": VoskRecognizer,
+    "google": GoogleRecognizer,
+    "google_cloud": GoogleCloudRecognizer,
+}
+
+
+def load_recognizer(name, **options):
+    """Builds the named backend; options go to its constructor."""
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"unknown ASR backend {name!r} (choose from {', '.join(BACKENDS)})") from None
+    return backend(**options)
+
+
+def transcribe_stream(capture, recognizer, on_partial=None, on_poll=None, poll_ms=100):
+    """
+    Transcribes the next utterance from a MicCapture while it is being spoken.
+
+    New audio is fed to the recognizer every poll_ms as soon as the capture
+    detects speech, and on_partial(text, settled) is called with each new
+    hypothesis. When the speaker pauses, the recognizer is flushed once, so
+    the pause that may end the turn gets a hypothesis covering every word
+    said (Whisper otherwise waits for partial_every_ms of new audio); that
+    one comes with settled=True, even if its text hasn't changed. on_poll(),
+    if given, is called after every poll while speech is in progress.
+    Returns (utterance, final text) once the capture endpoints the turn.
+    """
+    session = None
+    session_start = None
+    fed = 0
+    last_partial = None
+    flushed = False  # this pause already has its flushed hypothesis
+    while True:
+        utterance = capture.next_utterance(timeout=poll_ms / 1000)
+        start = utterance.start if utterance is not None else capture.speech_start
+        if start is None:
+            continue  # nobody is talking yet
+
+        if session is None or start != session_start:
+            session = recognizer.stream()
+            session_start = fed = start
+            last_partial = None
+            flushed = False
+
+        end = utterance.end if utterance is not None else capture.write_pos
+        paused = utterance is None and capture.silence_ms > 0
+        flush = paused and not flushed
+        flushed = paused and (flushed or flush)
+        if end > fed or flush:
+            partial = session.feed(capture.view(fed, end), flush=flush)
+            fed = end
+            if partial and (partial != last_partial or flush) and on_partial is not None:
+                on_partial(partial, flush)
+            last_partial = partial or last_partial
+
+        if utterance is not None:
+            return utterance, session.finish()
+        if on_poll is not None:
+            on_poll()
@@ -0,0 +1,68 @@
+import collections
+import threading
+import weakref
+import numpy as np
+
+
+class BufferPool:
+    """
+    Reusable float32 buffers for audio chunks on their way to a sink.
+
+    take(n) returns an array of n samples backed by a pooled block (sized to
+    the next power of two), for code that receives audio into memory it
+    allocates itself: the TTS daemon client and the process pool. The last
+    consumer, after copying the samples out (the playback ring buffer, a
+    socket), passes the chunk to give() and the block is reused for a later
+    chunk instead of being freed and allocated again.
+
+    Only blocks the pool handed out are taken back; give() ignores any other
+    array, and a chunk that is never given back is just garbage collected.
+    Never give() a chunk something else still holds on to.
+    """
+
+    def __init__(self, max_free_mb=16, min_samples=1024, enabled=True):
+        self.max_free_bytes = max_free_mb * 1024 * 1024
+        self.min_samples = min_samples
+        self.enabled = enabled
+        self._free = collections.defaultdict(list)  # block size -> free blocks
+        self._free_bytes = 0
+        self._issued = weakref.WeakValueDictionary()  # id(block) -> block, while it is out
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    def take(self, n):
+        if not self.enabled:
+            self.allocated += 1
+            return np.empty(n, dtype=np.float32)
+        size = max(self.min_samples, 1 << max(0, n - 1).bit_length())
+        with self._lock:
+            blocks = self._free[size]
+            if blocks:
+                block = blocks.pop()
+                self._free_bytes -= block.nbytes
+                self.reused += 1
+            else:
+                block = np.empty(size, dtype=np.float32)
+                self.allocated += 1
+            self._issued[id(block)] = block
+        return block[:n]
+
+    def give(self, chunk):
+        block = chunk.base if isinstance(chunk, np.ndarray) and chunk.base is not None else chunk
+        with self._lock:
+            if self._issued.get(id(block)) is not block:
+                return
+            del self._issued[id(block)]
+            if self._free_bytes + block.nbytes <= self.max_free_bytes:
+                self._free[len(block)].append(block)
+                self._free_bytes += block.nbytes
+
+    def stats(self):
+        with self._lock:
+            return {"allocated": self.allocated, "reused": self.reused,
+                    "free_mb": round(self._free_bytes / (1024 * 1024), 2)}
+
+
+# Shared by every producer and sink in the process
+audio_pool = BufferPool()
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+CACHE_DIR = "audio_cache"
+
+
+def normalize_key_text(text):
+    """Case and whitespace don't change what XTTS says, so they don't change the key."""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+class AudioCache:
+    """
+    Two-tier cache of synthesized clips keyed by text, speaker, language,
+    model and inference profile (int8 and compiled models don't render
+    exactly what fp32 does, so their clips are kept apart).
+
+    Recent clips stay in a size-bounded in-memory LRU. Every clip is also
+    appended to an int16 blob on disk (clips.pcm) with a JSON index of
+    offsets, which is read back through a memory map, so phrases survive
+    restarts without holding them all in RAM.
+    """
+
+    def __init__(self, model_name, cache_dir=CACHE_DIR, max_memory_mb=64, profile="fp32"):
+        self.model_name = model_name
+        self.profile = profile
+        self.max_bytes = max_memory_mb * 1024 * 1024
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.blob_path = os.path.join(cache_dir, "clips.pcm")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        self._blob = None
+
+    def key(self, text, speaker, language):
+        parts = (normalize_key_text(text), speaker, language, self.model_name)
+        if self.profile != "fp32":
+            parts += (self.profile,)  # fp32 keys stay as they were, so existing caches still hit
+        raw = "\x00".join(parts)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, text, speaker, language):
+        """Returns the cached float32 clip, or None."""
+        key = self.key(text, speaker, language)
+        with self._lock:
+            audio = self.memory.get(key)
+            if audio is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return audio
+
+            entry = self.index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            offset, length = entry
+            audio = self._read_blob(offset, length)
+            self.disk_hits += 1
+            self._remember(key, audio)
+            return audio
+
+    def put(self, text, speaker, language, audio):
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        key = self.key(text, speaker, language)
+        with self._lock:
+            self._remember(key, audio)
+            if key not in self.index:
+                self._append_blob(key, audio)
+
+    def record(self, text, speaker, language, chunks):
+        """Passes streamed chunks through and caches the whole clip once it completes."""
+        parts = []
+        for chunk in chunks:
+            # A copy: the chunk itself may go back to the buffer pool once it is played
+            parts.append(np.array(chunk, dtype=np.float32).reshape(-1))
+            yield chunk
+        if parts:
+            self.put(text, speaker, language, np.concatenate(parts))
+
+    def prewarm(self, phrases, synthesize):
+        """
+        Makes sure each phrase is cached before the first turn.
+
+        synthesize is the script's cache-aware synthesis function; streamed
+        results are drained so they get recorded.
+        """
+        for phrase in phrases:
+            result = synthesize(phrase)
+            if hasattr(result, "__next__"):
+                for _ in result:
+                    pass
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "memory_mb": round(self.memory_bytes / (1024 * 1024), 2),
+            "disk_clips": len(self.index),
+        }
+
+    def _remember(self, key, audio):
+        if key in self.memory:
+            self.memory_bytes -= self.memory.pop(key).nbytes
+        self.memory[key] = audio
+        self.memory_bytes += audio.nbytes
+        while self.memory_bytes > self.max_bytes and len(self.memory) > 1:
+            _, old = self.memory.popitem(last=False)
+            self.memory_bytes -= old.nbytes
+            self.evictions += 1
+
+    def _append_blob(self, key, audio):
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        with open(self.blob_path, "ab") as f:
+            offset = f.tell() // 2
+            f.write(pcm.tobytes())
+        self.index[key] = [offset, len(pcm)]
+        # Remap lazily: the old map doesn't cover the bytes just appended
+        self._blob = None
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _read_blob(self, offset, length):
+        if self._blob is None:
+            self._blob = np.memmap(self.blob_path, dtype=np.int16, mode="r")
+        # Converted in one pass, straight into the float32 result
+        return np.multiply(self._blob[offset:offset + length], np.float32(1 / 32767), dtype=np.float32)
@@ -0,0 +1,180 @@
+"""
+Interchangeable audio outputs for the voice scripts and the server.
+
+Every sink takes float32 mono chunks through the PlaybackEngine interface
+(start, write(audio, crossfade, seq), drain, silence, close,
+buffered_seconds, underruns, output_rms, on_start), so a pipeline can be
+pointed at the sound card, a file or nothing without changes:
+
+    device      playback.PlaybackEngine at the device's native rate
+    null        discards audio; optionally keeps real time like a device
+    *.wav       16-bit PCM WAV file
+    *.flac      FLAC file (needs the soundfile package)
+
+Chunks given to write() are handed back to the buffer pool, as
+PlaybackEngine does.
+"""
+import os
+import threading
+import time
+import wave
+import numpy as np
+from audio_buffers import audio_pool
+from resampler import Resampler
+
+
+class _Sink:
+    """What PlaybackEngine does besides talking to a device: seq drops, counters, on_start."""
+
+    def __init__(self, samplerate):
+        self.samplerate = samplerate
+        self.underruns = 0
+        self.output_rms = 0.0
+        self.min_seq = 0
+        self.on_start = None
+        self.samples = 0
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        pass
+
+    @property
+    def buffered_seconds(self):
+        return 0.0
+
+    @property
+    def seconds(self):
+        """Audio written so far."""
+        return self.samples / self.samplerate
+
+    def write(self, audio, crossfade=True, seq=None):
+        chunk = audio
+        try:
+            audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+            with self._lock:
+                if (seq is not None and seq < self.min_seq) or len(audio) == 0:
+                    return
+                if not self._started and self.on_start is not None:
+                    self.on_start(time.perf_counter())
+                self._started = True
+                self._consume(audio)
+                self.samples += len(audio)
+            self._pace()
+        finally:
+            audio_pool.give(chunk)
+
+    def _consume(self, audio):
+        pass
+
+    def _pace(self):
+        pass
+
+    def drain(self):
+        pass
+
+    def silence(self, fade_ms=30, drop_before=None):
+        with self._lock:
+            if drop_before is not None:
+                self.min_seq = max(self.min_seq, drop_before)
+            self._started = False
+        return 0.0
+
+    def close(self):
+        pass
+
+
+class NullSink(_Sink):
+    """
+    Discards audio. With realtime=True, write() takes as long as the audio
+    lasts, so producers see the same back-pressure as with a sound card.
+    """
+
+    def __init__(self, samplerate=24000, realtime=False):
+        super().__init__(samplerate)
+        self.realtime = realtime
+        self._play_until = 0.0
+        self._last = 0.0
+
+    def _consume(self, audio):
+        if self.realtime:
+            self._last = len(audio) / self.samplerate
+            self._play_until = max(self._play_until, time.perf_counter()) + self._last
+
+    def _pace(self):
+        # Return once this chunk starts "playing", like a device with one chunk of buffer
+        if self.realtime:
+            time.sleep(max(0.0, self._play_until - self._last - time.perf_counter()))
+
+    def drain(self):
+        if self.realtime:
+            time.sleep(max(0.0, self._play_until - time.perf_counter()))
+
+
+class FileSink(_Sink):
+    """
+    Appends everything written to a WAV or FLAC file, resampled to rate if
+    given. Crossfades and barge-in fades don't apply; the clips are joined
+    as they arrive. The file is complete after close().
+    """
+
+    def __init__(self, path, samplerate=24000, rate=None):
+        super().__init__(samplerate)
+        self.path = path
+        self.rate = rate or samplerate
+        self.resampler = Resampler(samplerate, self.rate) if self.rate != samplerate else None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if path.lower().endswith(".flac"):
+            try:
+                import soundfile
+            except ImportError:
+                raise RuntimeError("FLAC output needs the soundfile package (pip install soundfile)") from None
+            self._file = soundfile.SoundFile(path, "w", samplerate=self.rate, channels=1, subtype="PCM_16")
+            self._append = self._file.write
+        else:
+            self._file = wave.open(path, "wb")
+            self._file.setnchannels(1)
+            self._file.setsampwidth(2)
+            self._file.setframerate(self.rate)
+            # int16 only here, at the file
+            self._append = lambda audio: self._file.writeframes(
+                (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+
+    def _consume(self, audio):
+        if self.resampler is None:
+            self._append(audio)
+            return
+        out = self.resampler.process(audio)
+        try:
+            self._append(out)
+        finally:
+            audio_pool.give(out)
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            if self.resampler is not None:
+                tail = self.resampler.flush()
+                self._append(tail)
+                audio_pool.give(tail)
+            self._file.close()
+            self._file = None
+
+
+def open_sink(target="device", samplerate=24000, **options):
+    """
+    Returns a sink for target: "device", "null" or a .wav / .flac path.
+    options go to the sink (PlaybackEngine options for "device").
+    """
+    if target == "device":
+        from playback import PlaybackEngine
+
+        return PlaybackEngine(samplerate=samplerate, **options)
+    if target == "null":
+        return NullSink(samplerate, **options)
+    if target.lower().endswith((".wav", ".flac")):
+        return FileSink(target, samplerate, **options)
+    raise ValueError(f"unknown audio output {target!r} (use device, null or a .wav/.flac path)")
@@ -0,0 +1,21 @@
+import threading
+import time
+
+
+class CancelToken:
+    """Set once to stop one reply: the LLM stream, its synthesis and its playback."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+        self.cancelled_at = None
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self.cancelled_at = time.perf_counter()
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
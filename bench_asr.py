@@ -0,0 +1,224 @@
+"""
+Word error rate vs. latency for the speech recognition backends in asr.py.
+
+Each sample is bench_data/asr/<name>.wav with its reference text in
+bench_data/asr/prompts.jsonl. Audio is fed to the backend in real-time
+sized chunks on a simulated clock, so a backend that falls behind pays for
+it; reported latencies are measured from the end of the audio.
+
+    python bench_asr.py                                  # whisper, default options
+    python bench_asr.py --backend whisper --backend vosk --option model_size=tiny.en
+    python bench_asr.py --make-samples                   # synthesize missing WAVs with XTTS
+    python bench_asr.py --record                         # or read the prompts into your mic
+"""
+import argparse
+import json
+import os
+import re
+import time
+import wave
+import numpy as np
+from asr import load_recognizer
+from resampler import resample
+from text_normalizer import normalize_text
+
+ASR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_data", "asr")
+SAMPLE_RATE = 16000
+
+
+def load_prompts(directory):
+    with open(os.path.join(directory, "prompts.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_wav(path, samplerate=SAMPLE_RATE):
+    """Reads a 16-bit WAV as mono int16 at samplerate."""
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM is supported")
+        audio = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+        audio = audio.reshape(-1, w.getnchannels()).mean(axis=1)
+        rate = w.getframerate()
+    if rate != samplerate:
+        audio = np.clip(resample(audio, rate, samplerate), -32768, 32767)
+    return audio.astype(np.int16)
+
+
+def save_wav(path, audio, samplerate=SAMPLE_RATE):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(samplerate)
+        w.writeframes(np.asarray(audio, dtype=np.int16).tobytes())
+
+
+def words(text):
+    """Reference and hypothesis go through the TTS normalizer so "12" matches "twelve"."""
+    return re.sub(r"[^a-z0-9' ]+", " ", normalize_text(text).lower().replace("-", " ")).split()
+
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance (substitutions + deletions + insertions)."""
+    ref, hyp = words(reference), words(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1], len(ref)
+
+
+def run_sample(recognizer, audio, chunk_ms):
+    """
+    Streams one sample. Chunk i can't be fed before it would have been
+    spoken, and can't start before the previous feed() returned.
+    """
+    step = SAMPLE_RATE * chunk_ms // 1000
+    session = recognizer.stream()
+    clock = compute = 0.0
+    first_partial = None
+    for start in range(0, len(audio), step):
+        end = min(start + step, len(audio))
+        clock = max(clock, end / SAMPLE_RATE)
+        began = time.perf_counter()
+        partial = session.feed(audio[start:end])
+        spent = time.perf_counter() - began
+        clock += spent
+        compute += spent
+        if partial and first_partial is None:
+            first_partial = clock
+
+    began = time.perf_counter()
+    text = session.finish()
+    spent = time.perf_counter() - began
+    compute += spent
+    duration = len(audio) / SAMPLE_RATE
+    return {
+        "text": text,
+        "first_partial": first_partial,
+        "final_latency": clock + spent - duration,
+        "rtf": compute / duration,
+    }
+
+
+def bench_backend(name, options, samples, chunk_ms):
+    began = time.perf_counter()
+    recognizer = load_recognizer(name, samplerate=SAMPLE_RATE, **options)
+    load_seconds = time.perf_counter() - began
+
+    errors = total = 0
+    latencies, partials, rtfs = [], [], []
+    for sample in samples:
+        result = run_sample(recognizer, sample["audio"], chunk_ms)
+        e, n = word_errors(sample["text"], result["text"])
+        errors += e
+        total += n
+        latencies.append(result["final_latency"])
+        rtfs.append(result["rtf"])
+        if result["first_partial"] is not None:
+            partials.append(result["first_partial"])
+        if e:
+            print(f"  [{name}] {sample['name']}: {result['text']!r}")
+
+    return {
+        "backend": name + "".join(f" {k}={v}" for k, v in options.items()),
+        "samples": len(samples),
+        "wer": round(errors / max(total, 1), 4),
+        "final_ms": round(1000 * sum(latencies) / len(latencies)),
+        "final_p90_ms": round(1000 * sorted(latencies)[int(0.9 * (len(latencies) - 1))]),
+        "first_partial_s": round(sum(partials) / len(partials), 2) if partials else None,
+        "rtf": round(sum(rtfs) / len(rtfs), 3),
+        "load_s": round(load_seconds, 1),
+    }
+
+
+def make_samples(directory, prompts):
+    """Synthesizes every missing sample with XTTS, cycling through the catalog voices."""
+    from speaker_store import read_catalog
+    from tts_daemon import connect_synthesizer
+
+    speakers = connect_synthesizer()
+    voices = read_catalog()
+    for i, prompt in enumerate(prompts):
+        path = os.path.join(directory, prompt["name"] + ".wav")
+        if os.path.exists(path):
+            continue
+        audio = np.asarray(speakers.tts(prompt["text"], voices[i % len(voices)], "en"), dtype=np.float32)
+        audio = resample(audio, 24000, SAMPLE_RATE)
+        save_wav(path, np.clip(audio * 32767, -32768, 32767))
+        print(f"Wrote {path} ({voices[i % len(voices)]})")
+
+
+def record_samples(directory, prompts):
+    """Records every missing sample from the microphone, one endpointed utterance each."""
+    from mic_capture import MicCapture
+
+    capture = MicCapture(SAMPLE_RATE, end_silence_ms=700)
+    capture.start()
+    try:
+        for prompt in prompts:
+            path = os.path.join(directory, prompt["name"] + ".wav")
+            if os.path.exists(path):
+                continue
+            capture.clear()
+            print(f'\nRead aloud: "{prompt["text"]}"')
+            utterance = capture.next_utterance()
+            save_wav(path, utterance.audio)
+            print(f"Wrote {path} ({utterance.duration:.1f}s)")
+    finally:
+        capture.close()
+
+
+def parse_option(text):
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", action="append", help="asr backend(s) to compare (default: whisper)")
+    parser.add_argument("--option", action="append", default=[], metavar="KEY=VALUE",
+                        help="backend constructor option, e.g. model_size=tiny.en")
+    parser.add_argument("--dir", default=ASR_DIR)
+    parser.add_argument("--chunk-ms", type=int, default=100, help="audio fed per call, like the mic loop")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    parser.add_argument("--make-samples", action="store_true", help="synthesize missing WAVs with XTTS")
+    parser.add_argument("--record", action="store_true", help="record missing WAVs from the microphone")
+    args = parser.parse_args()
+
+    prompts = load_prompts(args.dir)
+    if args.make_samples:
+        make_samples(args.dir, prompts)
+        return
+    if args.record:
+        record_samples(args.dir, prompts)
+        return
+
+    samples = []
+    for prompt in prompts:
+        path = os.path.join(args.dir, prompt["name"] + ".wav")
+        if os.path.exists(path):
+            samples.append(dict(prompt, audio=load_wav(path)))
+    if not samples:
+        parser.error(f"no sample WAVs in {args.dir}; run with --make-samples or --record first")
+
+    options = dict(parse_option(o) for o in args.option)
+    results = [bench_backend(name, options, samples, args.chunk_ms) for name in args.backend or ["whisper"]]
+
+    print()
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+    else:
+        print(f"{'backend':<28}{'samples':>8}{'WER':>8}{'final ms':>10}{'p90 ms':>8}{'partial s':>10}{'RTF':>7}{'load s':>8}")
+        for r in results:
+            partial = f"{r['first_partial_s']:.2f}" if r["first_partial_s"] is not None else "-"
+            print(f"{r['backend']:<28}{r['samples']:>8}{r['wer']:>8.1%}{r['final_ms']:>10}{r['final_p90_ms']:>8}"
+                  f"{partial:>10}{r['rtf']:>7.2f}{r['load_s']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
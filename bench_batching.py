@@ -0,0 +1,137 @@
+"""
+Throughput vs. added latency for micro-batched synthesis (MicroBatcher).
+
+A number of caller threads each synthesize sentences back to back, like
+sessions on the voice server or clients of the TTS daemon. Every batch
+size / wait combination is run on the same sentences and compared with
+unbatched synthesis (batch 1).
+
+    python bench_batching.py --callers 4 --batch 1 --batch 2 --batch 4 --wait-ms 5 --wait-ms 20
+    python bench_batching.py --offline --callers 8           # fake TTS with bench_pipeline's cost model
+
+Sentences come from the recorded replies in bench_data, split and
+normalized the way the voice scripts do it.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from segmenter import SentenceSegmenter
+from text_normalizer import normalize_text
+from tts_scheduler import MicroBatcher
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_data")
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+SPEAKER = "Ana Florence"
+SAMPLE_RATE = 24000
+
+
+def load_sentences():
+    sentences = []
+    for path in sorted(glob.glob(os.path.join(BENCH_DIR, "*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            tokens = [json.loads(line) for line in f if line.strip()][1:]
+        segmenter = SentenceSegmenter()
+        for token in tokens:
+            sentences += segmenter.feed(token["content"])
+        sentences += segmenter.flush()
+    return [s for s in (normalize_text(s) for s in sentences) if len(s) >= 2]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run(synthesizer, sentences, callers, batch, wait_ms):
+    """Each caller takes every callers-th sentence; returns throughput and latency figures."""
+    tts = MicroBatcher(synthesizer, max_batch=batch, max_wait_ms=wait_ms) if batch > 1 else synthesizer
+    # Unbatched, requests take turns on the model: it is one compute-bound instance either way
+    model_lock = threading.Lock()
+    results_lock = threading.Lock()
+    latencies, samples = [], [0]
+
+    def caller(mine):
+        for text in mine:
+            started = time.perf_counter()
+            if batch > 1:
+                audio = tts.tts(text, SPEAKER, "en")
+            else:
+                with model_lock:
+                    audio = tts.tts(text, SPEAKER, "en")
+            with results_lock:
+                latencies.append(time.perf_counter() - started)
+                samples[0] += len(audio)
+
+    threads = [threading.Thread(target=caller, args=(sentences[i::callers],)) for i in range(callers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    stats = tts.stats() if batch > 1 else {"mean_batch": 1.0}
+    return {
+        "batch": batch,
+        "wait_ms": wait_ms if batch > 1 else 0,
+        "sentences_per_s": round(len(latencies) / wall, 2),
+        "audio_x_realtime": round(samples[0] / SAMPLE_RATE / wall, 2),
+        "latency_p50": round(percentile(latencies, 50), 3),
+        "latency_p95": round(percentile(latencies, 95), 3),
+        "mean_batch": stats["mean_batch"],
+    }
+
+
+def load_synthesizer(args):
+    if args.offline:
+        import bench_pipeline
+        bench_pipeline.FakeSpeakerStore.rtf = args.rtf
+        return bench_pipeline.FakeSpeakerStore()
+    # Batching needs the model in this process; a tts_daemon client can't batch
+    from model_loader import load_tts
+    from speaker_store import SpeakerStore
+
+    print("Loading XTTS v2...")
+    store = SpeakerStore(load_tts(TTS_MODEL))
+    store.get(SPEAKER)
+    store.tts("Warming up.", SPEAKER, "en")
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=4, help="concurrent threads asking for speech")
+    parser.add_argument("--batch", type=int, action="append", help="max batch size(s) to try (default: 1 2 4)")
+    parser.add_argument("--wait-ms", type=float, action="append", help="batch wait(s) to try (default: 5)")
+    parser.add_argument("--sentences", type=int, default=24, help="sentences per run")
+    parser.add_argument("--offline", action="store_true", help="use the fake TTS from bench_pipeline")
+    parser.add_argument("--rtf", type=float, default=0.5, help="--offline: fake TTS real-time factor")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    synthesizer = load_synthesizer(args)
+    sentences = load_sentences()[:args.sentences]
+
+    results = []
+    for batch in args.batch or [1, 2, 4]:
+        for wait_ms in (args.wait_ms or [5]) if batch > 1 else [0]:
+            results.append(run(synthesizer, sentences, args.callers, batch, wait_ms))
+            if args.json:
+                print(json.dumps(results[-1]))
+
+    if not args.json:
+        # "added" is p50 latency relative to the first run (batch 1 by default)
+        base = results[0]["latency_p50"]
+        print(f"\n{'batch':>5}{'wait ms':>9}{'sent/s':>8}{'audio x':>9}{'p50 s':>8}{'p95 s':>8}{'added':>8}{'mean':>6}")
+        for r in results:
+            print(f"{r['batch']:>5}{r['wait_ms']:>9}{r['sentences_per_s']:>8}{r['audio_x_realtime']:>9}"
+                  f"{r['latency_p50']:>8}{r['latency_p95']:>8}{r['latency_p50'] - base:>+8.3f}{r['mean_batch']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+"""
+Offline benchmark for the voice pipeline: no Ollama, no XTTS, no sound card.
+
+Replays recorded token streams (bench_data/*.jsonl) with their original
+inter-token timing in place of ollama.chat, swaps in a fake TTS with a
+configurable real-time factor and a null audio device, then drives a voice
+script's stream_and_speak() and reports time-to-first-audio (the device
+starting) and to first speech (the first block above -40 dBFS), gaps between
+segments, thread count and peak memory per scenario. --device-rate 48000
+makes the null device report that native rate, so playback resamples.
+--padding-ms pads every fake sentence with near-silence like XTTS does;
+compare with and without --no-trim to see what silence trimming saves.
+
+    python bench_pipeline.py                       # all scenarios against voice_v4
+    python bench_pipeline.py --script mic_v1 --rtf 0.8 --max-ttfa 2.5
+    python bench_pipeline.py --padding-ms 200,300 [--no-trim]
+    python bench_pipeline.py --record my_reply --prompt "Tell me a story"   # needs Ollama
+"""
+import argparse
+import asyncio
+import glob
+import importlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import numpy as np
+from audio_buffers import audio_pool
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_data")
+SAMPLE_RATE = 24000
+SECONDS_PER_CHAR = 0.065  # roughly how long XTTS takes to say one character
+AUDIBLE = 0.01            # peak level (-40 dBFS) above which a device block counts as sound
+
+
+def load_stream(path):
+    """Reads a recorded stream: a header line, then {"dt", "content"} per token."""
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    return lines[0], lines[1:]
+
+
+# --- Fakes --------------------------------------------------------------------
+
+class ReplayOllama(types.ModuleType):
+    """Stands in for the ollama module: chat() replays the current scenario."""
+
+    def __init__(self):
+        super().__init__("ollama")
+        self.tokens = []
+        self.speed = 1.0
+        self.request_time = None
+
+    def chat(self, model=None, messages=None, stream=False, **kwargs):
+        self.request_time = time.perf_counter()
+        tokens = list(self.tokens)
+        if not stream:
+            return {"message": {"role": "assistant", "content": "".join(t["content"] for t in tokens)}}
+        return self._replay(tokens)
+
+    def _replay(self, tokens):
+        for token in tokens:
+            time.sleep(token["dt"] / self.speed)
+            yield {"message": {"role": "assistant", "content": token["content"]}, "done": False}
+
+    def AsyncClient(self, *args, **kwargs):
+        return ReplayAsyncClient(self)
+
+
+class ReplayAsyncClient:
+    """ollama.AsyncClient stand-in sharing the replay state of a ReplayOllama."""
+
+    def __init__(self, replay):
+        self.replay = replay
+
+    async def chat(self, model=None, messages=None, stream=False, **kwargs):
+        self.replay.request_time = time.perf_counter()
+        tokens = list(self.replay.tokens)
+        if not stream:
+            return {"message": {"role": "assistant", "content": "".join(t["content"] for t in tokens)}}
+        return self._replay(tokens)
+
+    async def _replay(self, tokens):
+        for token in tokens:
+            await asyncio.sleep(token["dt"] / self.replay.speed)
+            yield {"message": {"role": "assistant", "content": token["content"]}, "done": False}
+
+
+class FakeSpeakerStore:
+    """Same interface as speaker_store.SpeakerStore, sleeping instead of synthesizing."""
+
+    rtf = 0.5
+    stream_chunks = 4
+    padding_ms = (0, 0)  # near-silence before and after each sentence, like real XTTS output
+    batch_cost = 0.3  # each extra request in a batch adds this much of its solo time
+
+    def __init__(self, tts=None, cache_dir=None, profile="fp32"):
+        self.profile = profile
+
+    def load_catalog(self, path=None):
+        pass
+
+    def add_reference(self, name, wav_paths):
+        pass
+
+    def get(self, name):
+        return None, None
+
+    def _voiced(self, text):
+        return max(1, int(len(text) * SECONDS_PER_CHAR * SAMPLE_RATE))
+
+    def _samples(self, text):
+        lead, trail = self.padding_ms
+        return self._voiced(text) + int((lead + trail) * SAMPLE_RATE / 1000)
+
+    def _fill(self, out, text, start=0):
+        """Samples [start, start + len(out)) of the clip for text: a 0.1 "voice" inside a -60 dBFS noise floor."""
+        lead = int(self.padding_ms[0] * SAMPLE_RATE / 1000)
+        index = np.arange(start, start + len(out))
+        out[:] = np.where((index >= lead) & (index < lead + self._voiced(text)), 0.1, 0.001 * (index % 2 * 2 - 1))
+        return out
+
+    def tts(self, text, speaker, language="en"):
+        samples = self._samples(text)
+        time.sleep(samples / SAMPLE_RATE * self.rtf)
+        return self._fill(np.empty(samples, dtype=np.float32), text)
+
+    def tts_batch(self, requests):
+        # A batch decodes as long as its longest member, plus a fraction per extra row
+        lengths = [self._samples(text) for text, _, _ in requests]
+        time.sleep(max(lengths) / SAMPLE_RATE * self.rtf * (1 + self.batch_cost * (len(lengths) - 1)))
+        return [self._fill(np.empty(n, dtype=np.float32), text) for n, (text, _, _) in zip(lengths, requests)]
+
+    def stream(self, text, speaker, language="en", chunk_size=20):
+        samples = self._samples(text)
+        step = -(-samples // self.stream_chunks)
+        for start in range(0, samples, step):
+            n = min(step, samples - start)
+            time.sleep(n / SAMPLE_RATE * self.rtf)
+            # Like the daemon client and process pool, streamed chunks arrive in pooled buffers
+            yield self._fill(audio_pool.take(n), text, start)
+
+
+class NullSink:
+    """Records which device blocks carried sound, on the device's own clock."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.blocks = []  # (start time, duration, audible)
+
+    def observe(self, at, duration, audible):
+        self.blocks.append((at, duration, audible))
+
+    def first_sound(self):
+        return next((at for at, _, audible in self.blocks if audible), None)
+
+    def gaps(self):
+        """Silent stretches between the first and last audible block."""
+        audible = [i for i, b in enumerate(self.blocks) if b[2]]
+        if not audible:
+            return []
+        gaps, current = [], 0.0
+        for at, duration, is_audible in self.blocks[audible[0]:audible[-1] + 1]:
+            if is_audible:
+                if current:
+                    gaps.append(current)
+                current = 0.0
+            else:
+                current += duration
+        return gaps
+
+
+SINK = NullSink()
+
+
+class NullOutputStream:
+    """sd.OutputStream that calls the callback in real time and discards the audio."""
+
+    def __init__(self, samplerate=SAMPLE_RATE, channels=1, dtype="float32", blocksize=0, callback=None, **kwargs):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize or samplerate // 50
+        self.callback = callback
+        self._running = False
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        block = np.zeros((self.blocksize, self.channels), dtype=np.float32)
+        duration = self.blocksize / self.samplerate
+        status = types.SimpleNamespace(output_underflow=False)
+        next_time = time.perf_counter()
+        while self._running:
+            block[:] = 0.0
+            self.callback(block, self.blocksize, None, status)
+            SINK.observe(next_time, duration, bool(np.abs(block).max() > AUDIBLE))
+            next_time += duration
+            time.sleep(max(0.0, next_time - time.perf_counter()))
+
+    def write(self, data):
+        # Blocking-write streams (voice_v1) just take as long as the audio lasts
+        data = np.asarray(data)
+        now = time.perf_counter()
+        SINK.observe(now, len(data) / self.samplerate, bool(len(data) and np.abs(data).max() > AUDIBLE))
+        time.sleep(len(data) / self.samplerate)
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        self._running = False
+
+    def __enter__(self):
+        if self.callback is not None:
+            self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def install_fakes(device_rate=None):
+    """Puts the fakes in sys.modules so the voice scripts import them unchanged."""
+    fake_ollama = ReplayOllama()
+    sys.modules["ollama"] = fake_ollama
+
+    sd = types.ModuleType("sounddevice")
+    sd.OutputStream = NullOutputStream
+    sd.InputStream = NullOutputStream
+    sd.play = lambda data, samplerate=SAMPLE_RATE, **kw: NullOutputStream(samplerate).write(data)
+    sd.wait = lambda: None
+    if device_rate:
+        # Otherwise the player can't query a rate and plays at the TTS rate
+        sd.query_devices = lambda device=None, kind=None: {"default_samplerate": float(device_rate)}
+    sys.modules["sounddevice"] = sd
+
+    tts_pkg = types.ModuleType("TTS")
+    tts_api = types.ModuleType("TTS.api")
+    tts_api.TTS = lambda *args, **kwargs: types.SimpleNamespace(synthesizer=types.SimpleNamespace(tts_model=None))
+    tts_pkg.api = tts_api
+    sys.modules["TTS"] = tts_pkg
+    sys.modules["TTS.api"] = tts_api
+
+    store = types.ModuleType("speaker_store")
+    store.SpeakerStore = FakeSpeakerStore
+    sys.modules["speaker_store"] = store
+    # Never pick up a real tts_daemon; connect_synthesizer() falls back to the fake store
+    os.environ["EMMA_TTS_SOCKET"] = os.path.join(tempfile.gettempdir(), "bench-no-daemon.sock")
+
+    whisper = types.ModuleType("faster_whisper")
+    whisper.WhisperModel = lambda *args, **kwargs: None
+    sys.modules["faster_whisper"] = whisper
+
+    speech = types.ModuleType("speech_recognition")
+    speech.Recognizer = types.SimpleNamespace  # scripts build one at import; the bench never listens
+    sys.modules["speech_recognition"] = speech
+    return fake_ollama
+
+
+# --- Benchmark ----------------------------------------------------------------
+
+def wait_for_playback(script):
+    if hasattr(script, "wait_until_spoken"):
+        script.wait_until_spoken()
+    else:
+        script.scheduler.wait()
+        script.audio_queue.join()
+        script.player.drain()
+    # Let the device clock play out the last block
+    time.sleep(0.05)
+
+
+def run_scenario(script, fake_ollama, name, tokens, args, workdir):
+    if hasattr(script, "audio_cache"):
+        # Fresh cache per scenario so earlier runs can't turn synthesis into cache hits
+        from audio_cache import AudioCache
+        script.audio_cache = AudioCache(script.TTS_MODEL, cache_dir=os.path.join(workdir, name))
+
+    fake_ollama.tokens = tokens
+    fake_ollama.speed = args.speed
+    SINK.reset()
+    first_audio = []
+    underruns_before = script.player.underruns
+    pool_before = audio_pool.stats()
+    script.player.on_start = lambda at: first_audio.append(at)
+
+    peak_threads = [threading.active_count()]
+    done = threading.Event()
+
+    def watch_threads():
+        while not done.wait(0.01):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    threading.Thread(target=watch_threads, daemon=True).start()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+
+    script.stream_and_speak("benchmark")
+    wait_for_playback(script)
+
+    total = time.perf_counter() - start
+    _, peak_mem = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    done.set()
+
+    gaps = SINK.gaps()
+    ttfa = first_audio[0] - fake_ollama.request_time if first_audio else float("nan")
+    # The device may start on leading silence; this is when the voice is actually heard
+    sound = SINK.first_sound()
+    ttfs = sound - fake_ollama.request_time if sound is not None else float("nan")
+    return {
+        "scenario": name,
+        "tokens": len(tokens),
+        "ttfa": round(ttfa, 3),
+        "ttfs": round(ttfs, 3),
+        "gap_mean": round(sum(gaps) / len(gaps), 3) if gaps else 0.0,
+        "gap_max": round(max(gaps), 3) if gaps else 0.0,
+        "underruns": script.player.underruns - underruns_before,
+        "peak_threads": peak_threads[0],
+        "peak_mem_mb": round(peak_mem / 1e6, 2),
+        # Audio buffers allocated vs. taken from the pool for this reply
+        "buffers_new": audio_pool.stats()["allocated"] - pool_before["allocated"],
+        "buffers_reused": audio_pool.stats()["reused"] - pool_before["reused"],
+        "total": round(total, 2),
+    }
+
+
+def record(name, prompt, model):
+    """Captures a real Ollama reply with its timing into bench_data/<name>.jsonl."""
+    import ollama
+
+    path = os.path.join(BENCH_DIR, name + ".jsonl")
+    last = time.perf_counter()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"model": model, "prompt": prompt}) + "\n")
+        for chunk in ollama.chat(model=model, messages=[{"role": "user", "content": prompt}], stream=True):
+            now = time.perf_counter()
+            f.write(json.dumps({"dt": round(now - last, 4), "content": chunk["message"]["content"]}) + "\n")
+            last = now
+    print(f"Recorded {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--script", default="voice_v4", help="voice script module to drive")
+    parser.add_argument("--scenario", action="append", help="scenario name(s) from bench_data (default: all)")
+    parser.add_argument("--rtf", type=float, default=0.5, help="fake TTS real-time factor")
+    parser.add_argument("--speed", type=float, default=1.0, help="token replay speed multiplier")
+    parser.add_argument("--padding-ms", default="0,0",
+                        help="LEAD,TRAIL near-silence the fake TTS adds around each sentence (XTTS: ~200,300)")
+    parser.add_argument("--no-trim", action="store_true", help="play the padding (script's TRIM_SILENCE off)")
+    parser.add_argument("--device-rate", type=int, help="native rate the null device reports (resample to it)")
+    parser.add_argument("--no-pool", action="store_true", help="allocate every audio chunk (no buffer reuse)")
+    parser.add_argument("--max-ttfa", type=float, help="exit non-zero if any scenario's TTFA exceeds this")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    parser.add_argument("--record", metavar="NAME", help="record a real Ollama stream instead of benchmarking")
+    parser.add_argument("--prompt", default="Tell me about yourself.")
+    parser.add_argument("--model", default="emma")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.prompt, args.model)
+        return
+
+    paths = sorted(glob.glob(os.path.join(BENCH_DIR, "*.jsonl")))
+    if args.scenario:
+        paths = [p for p in paths if os.path.splitext(os.path.basename(p))[0] in args.scenario]
+
+    fake_ollama = install_fakes(args.device_rate)
+    FakeSpeakerStore.rtf = args.rtf
+    FakeSpeakerStore.padding_ms = tuple(float(ms) for ms in args.padding_ms.split(","))
+    audio_pool.enabled = not args.no_pool
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Caches and metrics the script writes on import land in the temp dir
+        os.chdir(workdir)
+        script = importlib.import_module(args.script)
+        if args.no_trim and hasattr(script, "trimmer"):
+            script.trimmer.enabled = False
+
+        results = []
+        for path in paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            _, tokens = load_stream(path)
+            results.append(run_scenario(script, fake_ollama, name, tokens, args, workdir))
+
+    print()
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+    else:
+        print(f"{'scenario':<14}{'tokens':>7}{'ttfa':>8}{'speech':>8}{'gap avg':>9}{'gap max':>9}{'underrun':>9}{'threads':>8}"
+              f"{'peak MB':>9}{'bufs new':>9}{'reused':>8}{'total':>8}")
+        for r in results:
+            print(f"{r['scenario']:<14}{r['tokens']:>7}{r['ttfa']:>8.2f}{r['ttfs']:>8.2f}{r['gap_mean']:>9.3f}{r['gap_max']:>9.3f}"
+                  f"{r['underruns']:>9}{r['peak_threads']:>8}{r['peak_mem_mb']:>9.2f}{r['buffers_new']:>9}"
+                  f"{r['buffers_reused']:>8}{r['total']:>8.2f}")
+
+    if args.max_ttfa is not None and any(not r["ttfa"] <= args.max_ttfa for r in results):
+        print(f"\nFAIL: time-to-first-audio above {args.max_ttfa}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+How CPU synthesis scales with the number of workers: N threads sharing one
+in-process model vs. N worker processes (tts_pool.ProcessSynthesizer), for
+N = 1 .. --max-workers. Each worker count gets as many concurrent callers.
+
+    python bench_processes.py --max-workers 4
+    python bench_processes.py --max-workers 4 --mode processes --stream
+    python bench_processes.py --offline --max-workers 4      # a CPU-bound pure-Python fake instead of XTTS
+
+The offline fake holds the GIL while it "synthesizes", like the Python parts
+of XTTS inference, so threads stay flat while processes scale with cores.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+from bench_batching import SPEAKER, TTS_MODEL, load_sentences
+from tts_pool import ProcessSynthesizer
+
+SAMPLE_RATE = 24000
+SECONDS_PER_CHAR = 0.065
+
+
+class BusyStore:
+    """SpeakerStore stand-in that spends CPU (holding the GIL) instead of sleeping."""
+
+    loops_per_char = 20000
+
+    def __init__(self, threads=1):
+        pass
+
+    def _burn(self, text):
+        total = 0
+        for i in range(len(text) * self.loops_per_char):
+            total += i
+        return np.full(int(len(text) * SECONDS_PER_CHAR * SAMPLE_RATE), 0.1, dtype=np.float32)
+
+    def tts(self, text, speaker, language="en"):
+        return self._burn(text)
+
+    def stream(self, text, speaker, language="en", chunk_size=20):
+        yield from np.array_split(self._burn(text), 4)
+
+    def load_catalog(self, path=None):
+        pass
+
+
+def _load_in_process():
+    from model_loader import load_tts
+    from speaker_store import SpeakerStore
+
+    store = SpeakerStore(load_tts(TTS_MODEL))
+    store.get(SPEAKER)
+    return store
+
+
+def run(synthesizer, sentences, callers, stream):
+    latencies, samples = [], [0]
+    lock = threading.Lock()
+
+    def caller(mine):
+        for text in mine:
+            started = time.perf_counter()
+            if stream:
+                n = sum(len(chunk) for chunk in synthesizer.stream(text, SPEAKER, "en"))
+            else:
+                n = len(synthesizer.tts(text, SPEAKER, "en"))
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                samples[0] += n
+
+    threads = [threading.Thread(target=caller, args=(sentences[i::callers],)) for i in range(callers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return {
+        "sentences_per_s": round(len(latencies) / wall, 2),
+        "audio_x_realtime": round(samples[0] / SAMPLE_RATE / wall, 2),
+        "latency_mean": round(sum(latencies) / len(latencies), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() // 2 or 1)
+    parser.add_argument("--mode", choices=["threads", "processes", "both"], default="both")
+    parser.add_argument("--sentences", type=int, default=16, help="sentences per run")
+    parser.add_argument("--stream", action="store_true", help="use stream() instead of tts()")
+    parser.add_argument("--offline", action="store_true", help="CPU-bound fake instead of XTTS")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sentences = load_sentences()[:args.sentences]
+    modes = ["threads", "processes"] if args.mode == "both" else [args.mode]
+
+    in_process = None
+    results = []
+    for mode in modes:
+        base = None
+        for workers in range(1, args.max_workers + 1):
+            if mode == "threads":
+                in_process = in_process or (BusyStore() if args.offline else _load_in_process())
+                result = run(in_process, sentences, workers, args.stream)
+            else:
+                pool = ProcessSynthesizer(TTS_MODEL, num_workers=workers, factory=BusyStore if args.offline else None)
+                try:
+                    result = run(pool, sentences, workers, args.stream)
+                finally:
+                    pool.close()
+            base = base or result["audio_x_realtime"]
+            result = dict(mode=mode, workers=workers, speedup=round(result["audio_x_realtime"] / base, 2), **result)
+            results.append(result)
+            if args.json:
+                print(json.dumps(result))
+
+    if not args.json:
+        print(f"\n{'mode':<10}{'workers':>8}{'sent/s':>8}{'audio x':>9}{'speedup':>9}{'latency':>9}")
+        for r in results:
+            print(f"{r['mode']:<10}{r['workers']:>8}{r['sentences_per_s']:>8}{r['audio_x_realtime']:>9}"
+                  f"{r['speedup']:>9}{r['latency_mean']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Speed, memory and output quality of the CPU inference profiles in
+inference_profiles.py, each in a fresh process (thread settings and
+torch.compile are process-wide).
+
+Every profile synthesizes the same sentences with sampling off, so the
+fp32 output is a fixed reference. Speed is the real-time factor after a
+warm-up (compiled profiles compile during it) and quality is the log-mel
+spectral distance to the fp32 audio in dB, after aligning the two with
+DTW, since a quantized GPT may pick a slightly different number of audio
+tokens. For scale: the distance between two sampled (do_sample=True) fp32
+runs of the same sentence is printed as "sampling".
+
+    python bench_profiles.py
+    python bench_profiles.py --profile fp32 --profile int8 --threads 4
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+SPEAKER = "Ana Florence"
+SAMPLE_RATE = 24000
+WARMUP = "Warming up the voice engine."
+SENTENCES = [
+    "Good morning! The weather today is mild, with a light breeze from the west.",
+    "Your appointment has been moved to Thursday at half past three.",
+    "I couldn't find that file, but there are two with similar names in your documents folder.",
+    "Sure.",
+]
+
+
+def child(profile, model_name, threads, out_dir):
+    from model_loader import load_tts
+    from speaker_store import SpeakerStore
+
+    began = time.perf_counter()
+    tts = load_tts(model_name, profile=profile, threads=threads)
+    store = SpeakerStore(tts)
+    gpt_cond_latent, speaker_embedding = store.get(SPEAKER)
+    model = store.model
+    load_s = time.perf_counter() - began
+
+    def synthesize(text, do_sample=False):
+        out = model.inference(text, "en", gpt_cond_latent, speaker_embedding, do_sample=do_sample)
+        return np.asarray(out["wav"], dtype=np.float32)
+
+    began = time.perf_counter()
+    for text in [WARMUP] + SENTENCES:
+        synthesize(text)  # every sentence length once, so compiled profiles don't recompile while timed
+    warmup_s = time.perf_counter() - began
+
+    synth_s, audio_s = 0.0, 0.0
+    for n, text in enumerate(SENTENCES):
+        began = time.perf_counter()
+        audio = synthesize(text)
+        synth_s += time.perf_counter() - began
+        audio_s += len(audio) / SAMPLE_RATE
+        np.save(os.path.join(out_dir, f"{profile}-{n}.npy"), audio)
+    if profile == "fp32":
+        np.save(os.path.join(out_dir, "sampled-a.npy"), synthesize(SENTENCES[0], do_sample=True))
+        np.save(os.path.join(out_dir, "sampled-b.npy"), synthesize(SENTENCES[0], do_sample=True))
+
+    with open("/proc/self/status") as f:
+        rss_mb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024
+    print(json.dumps({
+        "load_s": round(load_s, 2),
+        "warmup_s": round(warmup_s, 2),
+        "rtf": round(synth_s / audio_s, 3),
+        "audio_s": round(audio_s, 2),
+        "rss_mb": round(rss_mb),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+    }), flush=True)
+
+
+def log_mel(audio, n_fft=1024, hop=256, n_mels=80):
+    """Log-mel spectrogram in dB (floored 80 dB below its peak, so near-silent bins don't dominate), frames x n_mels."""
+    if len(audio) < n_fft:
+        audio = np.pad(audio, (0, n_fft - len(audio)))
+    frames = np.lib.stride_tricks.sliding_window_view(audio, n_fft)[::hop] * np.hanning(n_fft)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+
+    def mel(hz):
+        return 2595 * np.log10(1 + hz / 700)
+
+    edges = 700 * (10 ** (np.linspace(mel(0), mel(SAMPLE_RATE / 2), n_mels + 2) / 2595) - 1)
+    bins = np.fft.rfftfreq(n_fft, 1 / SAMPLE_RATE)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    fbank = np.maximum(0, np.minimum((bins - lower) / (center - lower), (upper - bins) / (upper - center)))
+    db = 10 * np.log10(power @ fbank.T + 1e-10)
+    return np.maximum(db, db.max() - 80)
+
+
+def mel_distance(a, b):
+    """Mean per-frame RMS difference in dB between log-mel spectrograms, along the DTW path."""
+    x, y = log_mel(a), log_mel(b)
+    cost = np.sqrt(((x[:, None, :] - y[None, :, :]) ** 2).mean(axis=2))
+    total = np.full((len(x) + 1, len(y) + 1), np.inf)
+    steps = np.zeros((len(x) + 1, len(y) + 1), dtype=np.int32)
+    total[0, 0] = 0.0
+    for i in range(1, len(x) + 1):
+        for j in range(1, len(y) + 1):
+            moves = (total[i - 1, j - 1], total[i - 1, j], total[i, j - 1])
+            k = int(np.argmin(moves))
+            total[i, j] = cost[i - 1, j - 1] + moves[k]
+            steps[i, j] = (steps[i - 1, j - 1], steps[i - 1, j], steps[i, j - 1])[k] + 1
+    return float(total[-1, -1] / steps[-1, -1])
+
+
+def measure(profile, model_name, threads, out_dir):
+    command = [sys.executable, os.path.abspath(__file__), "--child", profile, "--model", model_name,
+               "--out", out_dir]
+    if threads:
+        command += ["--threads", str(threads)]
+    process = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"{profile} failed (exit code {process.returncode})")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def compare(profile, out_dir):
+    """Mean mel distance and duration ratio of profile's sentences against fp32's."""
+    distances, ratios = [], []
+    for n in range(len(SENTENCES)):
+        ref = np.load(os.path.join(out_dir, f"fp32-{n}.npy"))
+        audio = np.load(os.path.join(out_dir, f"{profile}-{n}.npy"))
+        distances.append(mel_distance(ref, audio))
+        ratios.append(len(audio) / len(ref))
+    return round(float(np.mean(distances)), 2), round(float(np.mean(ratios)), 3)
+
+
+def main():
+    from inference_profiles import PROFILES
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=TTS_MODEL)
+    parser.add_argument("--profile", action="append", choices=PROFILES)
+    parser.add_argument("--threads", type=int, help="intra-op threads for tuned profiles (default: physical cores)")
+    parser.add_argument("--child", choices=PROFILES, help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    if args.child:
+        child(args.child, args.model, args.threads, args.out)
+        return
+
+    # fp32 runs first: its output is the reference for the quality columns and its RTF for the speed-up
+    profiles = ["fp32"] + [p for p in dict.fromkeys(args.profile or PROFILES) if p != "fp32"]
+    results = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for profile in profiles:
+            result = dict(profile=profile, **measure(profile, args.model, args.threads, out_dir))
+            result["mel_db"], result["duration_ratio"] = compare(profile, out_dir)
+            results.append(result)
+        sampling = round(mel_distance(np.load(os.path.join(out_dir, "sampled-a.npy")),
+                                      np.load(os.path.join(out_dir, "sampled-b.npy"))), 2)
+    baseline = results[0]["rtf"]
+    for r in results:
+        r["speedup"] = round(baseline / r["rtf"], 2)
+
+    if args.json:
+        for r in results:
+            print(json.dumps(r))
+        print(json.dumps({"profile": "sampling", "mel_db": sampling}))
+        return
+    print(f"\n{'profile':<15}{'load s':>8}{'warmup s':>10}{'RTF':>7}{'speedup':>9}{'RSS MB':>8}{'peak MB':>9}"
+          f"{'mel dB':>8}{'length':>8}")
+    for r in results:
+        print(f"{r['profile']:<15}{r['load_s']:>8}{r['warmup_s']:>10}{r['rtf']:>7}{r['speedup']:>9}{r['rss_mb']:>8}"
+              f"{r['peak_rss_mb']:>9}{r['mel_db']:>8}{r['duration_ratio']:>8}")
+    print(f"{'sampling':<15}{'':>8}{'':>10}{'':>7}{'':>9}{'':>8}{'':>9}{sampling:>8}")
+
+
+if __name__ == "__main__":
+    main()
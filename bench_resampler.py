@@ -0,0 +1,90 @@
+"""
+Speed and quality of resampler.Resampler against linear interpolation
+(np.interp, what bench_asr used before), for the conversions the voice
+scripts need: XTTS 24 kHz and Tacotron 22.05 kHz to common device rates,
+and device rates down to 16 kHz for ASR.
+
+Speed is audio seconds processed per wall second, streaming in chunks of
+--chunk-ms like the playback path. Quality is the SNR of sine tones
+against the exact resampled sine, averaged over tones up to 0.8 of the
+lower Nyquist frequency.
+
+    python bench_resampler.py
+    python bench_resampler.py --chunk-ms 20 --seconds 30
+"""
+import argparse
+import json
+import time
+import numpy as np
+from audio_buffers import audio_pool
+from resampler import Resampler, resample
+
+CONVERSIONS = [(24000, 48000), (24000, 44100), (22050, 48000), (48000, 16000), (24000, 16000)]
+
+
+def linear(audio, rate_in, rate_out):
+    n = int(round(len(audio) * rate_out / rate_in))
+    return np.interp(np.arange(n) * rate_in / rate_out, np.arange(len(audio)), audio).astype(np.float32)
+
+
+def streamed(audio, rate_in, rate_out, chunk):
+    resampler = Resampler(rate_in, rate_out)
+    for start in range(0, len(audio), chunk):
+        audio_pool.give(resampler.process(audio[start:start + chunk]))
+    audio_pool.give(resampler.flush())
+
+
+def speed(fn, seconds):
+    began = time.perf_counter()
+    fn()
+    return round(seconds / (time.perf_counter() - began))
+
+
+def tone_snr(fn, rate_in, rate_out):
+    """Mean SNR in dB over sine tones that fit in both rates (edges skipped)."""
+    nyquist = min(rate_in, rate_out) / 2
+    snrs = []
+    for freq in np.linspace(100, 0.8 * nyquist, 8):
+        x = np.sin(2 * np.pi * freq * np.arange(rate_in) / rate_in).astype(np.float32)
+        y = fn(x, rate_in, rate_out)
+        ref = np.sin(2 * np.pi * freq * np.arange(len(y)) / rate_out)
+        edge = rate_out // 100
+        err = y[edge:-edge] - ref[edge:-edge]
+        snrs.append(10 * np.log10(np.mean(ref[edge:-edge] ** 2) / np.mean(err ** 2)))
+    return round(float(np.mean(snrs)), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0, help="audio per speed run")
+    parser.add_argument("--chunk-ms", type=float, default=100.0, help="chunk size for the streamed run")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for rate_in, rate_out in CONVERSIONS:
+        audio = (rng.standard_normal(int(rate_in * args.seconds)) * 0.1).astype(np.float32)
+        chunk = max(1, int(rate_in * args.chunk_ms / 1000))
+        result = {
+            "conversion": f"{rate_in}->{rate_out}",
+            "polyphase_x": speed(lambda: streamed(audio, rate_in, rate_out, chunk), args.seconds),
+            "whole_x": speed(lambda: resample(audio, rate_in, rate_out), args.seconds),
+            "linear_x": speed(lambda: linear(audio, rate_in, rate_out), args.seconds),
+            "polyphase_snr": tone_snr(resample, rate_in, rate_out),
+            "linear_snr": tone_snr(linear, rate_in, rate_out),
+        }
+        results.append(result)
+
+    if args.json:
+        for r in results:
+            print(json.dumps(r))
+        return
+    print(f"\n{'conversion':<14}{'stream x':>10}{'whole x':>9}{'linear x':>10}{'SNR dB':>8}{'linear dB':>11}")
+    for r in results:
+        print(f"{r['conversion']:<14}{r['polyphase_x']:>10}{r['whole_x']:>9}{r['linear_x']:>10}"
+              f"{r['polyphase_snr']:>8}{r['linear_snr']:>11}")
+
+
+if __name__ == "__main__":
+    main()
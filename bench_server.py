@@ -0,0 +1,183 @@
+"""
+Load generator for voice_server.py: opens many WebSocket sessions at once
+and measures time-to-first-audio per turn as the number of concurrent
+sessions grows.
+
+    python bench_server.py --sessions 8 --turns 3               # against a running server
+    python bench_server.py --offline --sessions 1 --sessions 4 --sessions 16   # fakes, no GPU or Ollama
+
+Each session sends its prompts one at a time and waits for "done" before
+the next; TTFA is measured from sending the text to the first audio frame.
+--offline starts an in-process server on the bench_pipeline fakes (replayed
+token streams, a fake TTS with --rtf), which shows how fairly the shared
+synthesis workers are split between sessions.
+"""
+import argparse
+import asyncio
+import base64
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from voice_server import OP_BINARY, OP_CLOSE, OP_TEXT, percentile, ws_frame, ws_read
+
+PROMPTS = [
+    "Tell me about yourself.",
+    "What's a good name for a cat?",
+    "Give me one tip for sleeping better.",
+    "What's the weather like on Mars?",
+]
+
+
+async def connect(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(np.random.bytes(16)).decode("ascii")
+    writer.write((f"GET /v1/ws HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode("ascii"))
+    await writer.drain()
+    status = await reader.readline()
+    if b" 101 " not in status:
+        raise ConnectionError(f"WebSocket upgrade refused: {status!r}")
+    while await reader.readline() not in (b"\r\n", b""):
+        pass
+    return reader, writer
+
+
+async def run_session(host, port, prompts, results):
+    reader, writer = await connect(host, port)
+    try:
+        for prompt in prompts:
+            sent = time.perf_counter()
+            writer.write(ws_frame(OP_TEXT, json.dumps({"type": "text", "text": prompt}).encode("utf-8"), mask=True))
+            await writer.drain()
+            first_audio, samples, error = None, 0, None
+            while True:
+                opcode, payload = await ws_read(reader)
+                if opcode == OP_BINARY:
+                    if first_audio is None:
+                        first_audio = time.perf_counter()
+                    samples += len(payload) // 2
+                elif opcode == OP_TEXT:
+                    event = json.loads(payload)
+                    if event["type"] == "error":
+                        error = event["message"]
+                    elif event["type"] == "done":
+                        break
+                elif opcode == OP_CLOSE:
+                    raise ConnectionError("server closed the session")
+            results.append({
+                "ttfa": first_audio - sent if first_audio else None,
+                "turn": time.perf_counter() - sent,
+                "audio": samples / 24000,
+                "error": error,
+            })
+        writer.write(ws_frame(OP_CLOSE, b"\x03\xe8", mask=True))
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, sessions, turns):
+    results = []
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(run_session(host, port, [PROMPTS[(i + t) % len(PROMPTS)] for t in range(turns)], results)
+          for i in range(sessions)),
+        return_exceptions=True,
+    )
+    failed = [o for o in outcomes if isinstance(o, BaseException)]
+    for e in failed[:3]:
+        print(f"  session failed: {e!r}")
+
+    ttfa = [r["ttfa"] for r in results if r["ttfa"] is not None]
+    return {
+        "sessions": sessions,
+        "turns": len(results),
+        "ttfa_p50": round(percentile(ttfa, 50), 3) if ttfa else None,
+        "ttfa_p95": round(percentile(ttfa, 95), 3) if ttfa else None,
+        "ttfa_mean": round(sum(ttfa) / len(ttfa), 3) if ttfa else None,
+        "audio_seconds": round(sum(r["audio"] for r in results), 1),
+        "errors": len(failed) + sum(1 for r in results if r["error"]),
+        "wall": round(time.perf_counter() - started, 2),
+    }
+
+
+async def start_offline_server(args):
+    """An in-process VoiceServer on the bench_pipeline fakes; returns (listener, port)."""
+    import bench_pipeline
+    fake_ollama = bench_pipeline.install_fakes()
+    bench_pipeline.FakeSpeakerStore.rtf = args.rtf
+    path = sorted(glob.glob(os.path.join(bench_pipeline.BENCH_DIR, "*.jsonl")))[0]
+    _, fake_ollama.tokens = bench_pipeline.load_stream(path)
+    fake_ollama.speed = args.speed
+
+    import voice_server
+    from audio_cache import AudioCache
+
+    class NoCache(AudioCache):
+        # Every session asks similar questions; hits would hide the synthesis load
+        def get(self, text, speaker, language):
+            return None
+
+        def put(self, text, speaker, language, audio):
+            pass
+
+    speakers, stream_chunk_size, workers = bench_pipeline.FakeSpeakerStore(), voice_server.STREAM_CHUNK_SIZE, args.workers
+    if args.batch > 1:
+        speakers = voice_server.MicroBatcher(speakers, max_batch=args.batch, max_wait_ms=args.batch_wait_ms)
+        stream_chunk_size, workers = 0, max(workers, args.batch)
+    server = voice_server.VoiceServer(speakers, fake_ollama.AsyncClient(),
+                                      NoCache(voice_server.TTS_MODEL, cache_dir=os.path.join(args.workdir, "cache")),
+                                      workers=workers, stream_chunk_size=stream_chunk_size)
+    listener = await asyncio.start_server(server._handle, "127.0.0.1", 0)
+    return listener, listener.sockets[0].getsockname()[1]
+
+
+async def main_async(args):
+    listener = None
+    port = args.port
+    if args.offline:
+        listener, port = await start_offline_server(args)
+    try:
+        results = []
+        for sessions in args.sessions or [4]:
+            result = await run_load(args.host, port, sessions, args.turns)
+            results.append(result)
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print(f"{result['sessions']:>3} sessions  TTFA p50 {result['ttfa_p50']}s  p95 {result['ttfa_p95']}s  "
+                      f"mean {result['ttfa_mean']}s  audio {result['audio_seconds']}s  errors {result['errors']}  "
+                      f"({result['wall']}s)")
+        return results
+    finally:
+        if listener is not None:
+            listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sessions", type=int, action="append", help="concurrent sessions (repeat to sweep)")
+    parser.add_argument("--turns", type=int, default=2, help="prompts per session")
+    parser.add_argument("--offline", action="store_true", help="benchmark an in-process server on fakes")
+    parser.add_argument("--workers", type=int, default=2, help="--offline: shared synthesis threads")
+    parser.add_argument("--batch", type=int, default=1, help="--offline: micro-batch whole sentences (see voice_server --batch)")
+    parser.add_argument("--batch-wait-ms", type=float, default=5)
+    parser.add_argument("--rtf", type=float, default=0.5, help="--offline: fake TTS real-time factor")
+    parser.add_argument("--speed", type=float, default=4.0, help="--offline: token replay speed multiplier")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as workdir:
+        args.workdir = workdir
+        asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Start-up time and memory for loading XTTS: the full checkpoint through the
+TTS API ("checkpoint") vs. the memory-mapped weights from
+model_loader.py --convert ("mapped").
+
+Every measurement runs in fresh processes. "cold" first drops the weight
+files from the page cache (posix_fadvise, no root needed), "warm" runs
+right after another load. With --processes N, N processes load at once
+and report their proportional set size, which splits shared pages between
+the processes that map them.
+
+    python model_loader.py --convert        # once
+    python bench_startup.py --processes 3
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+
+
+def memory_mb():
+    """RSS split into private (anon) and file-backed pages, plus PSS, for this process."""
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                fields[key] = int(value.split()[0]) / 1024
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                fields["Pss"] = int(line.split()[1]) / 1024
+    return {"rss_mb": round(fields.get("VmRSS", 0)), "anon_mb": round(fields.get("RssAnon", 0)),
+            "file_mb": round(fields.get("RssFile", 0)), "pss_mb": round(fields.get("Pss", 0))}
+
+
+def child(mode, model_name):
+    began = time.perf_counter()
+    if mode == "mapped":
+        from model_loader import load_mapped
+        load_mapped(model_name)
+    else:
+        from TTS.api import TTS
+        TTS(model_name=model_name, progress_bar=False, gpu=False)
+    load_s = time.perf_counter() - began
+    # Wait until every process has loaded, so PSS sees all of them
+    print("loaded", flush=True)
+    sys.stdin.readline()
+    print(json.dumps(dict(load_s=round(load_s, 2), **memory_mb())), flush=True)
+
+
+def weight_files(model_name):
+    from model_loader import _model_dir, mapped_path
+
+    model_dir = _model_dir(model_name)
+    return glob.glob(os.path.join(model_dir, "*.pth")) + [p for p in [mapped_path(model_name)] if os.path.exists(p)]
+
+
+def drop_from_page_cache(paths):
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def measure(mode, model_name, processes):
+    children = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", mode, "--model", model_name],
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(processes)
+    ]
+    for process in children:
+        while process.stdout.readline().strip() != "loaded":
+            if process.poll() is not None:
+                raise RuntimeError(f"{mode} load failed (exit code {process.returncode})")
+    results = []
+    for process in children:
+        process.stdin.write("\n")
+        process.stdin.flush()
+        results.append(json.loads(process.stdout.readline()))
+        process.wait()
+    return {key: round(sum(r[key] for r in results) / len(results), 2) for key in results[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=TTS_MODEL)
+    parser.add_argument("--processes", type=int, default=2, help="processes loading at once for the memory run")
+    parser.add_argument("--mode", action="append", choices=["checkpoint", "mapped"])
+    parser.add_argument("--child", choices=["checkpoint", "mapped"], help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    if args.child:
+        child(args.child, args.model)
+        return
+
+    from model_loader import mapped_path
+    modes = args.mode or ["checkpoint", "mapped"]
+    if "mapped" in modes and not os.path.exists(mapped_path(args.model)):
+        parser.error("no mapped weights yet; run `python model_loader.py --convert` first")
+    files = weight_files(args.model)
+
+    results = []
+    for mode in modes:
+        drop_from_page_cache(files)
+        results.append(dict(mode=mode, start="cold", processes=1, **measure(mode, args.model, 1)))
+        results.append(dict(mode=mode, start="warm", processes=1, **measure(mode, args.model, 1)))
+        if args.processes > 1:
+            results.append(dict(mode=mode, start="warm", processes=args.processes,
+                                **measure(mode, args.model, args.processes)))
+
+    if args.json:
+        for r in results:
+            print(json.dumps(r))
+        return
+    print(f"\n{'mode':<12}{'start':<7}{'procs':>6}{'load s':>8}{'RSS MB':>8}{'anon':>7}{'file':>7}{'PSS MB':>8}")
+    for r in results:
+        print(f"{r['mode']:<12}{r['start']:<7}{r['processes']:>6}{r['load_s']:>8}{r['rss_mb']:>8}"
+              f"{r['anon_mb']:>7}{r['file_mb']:>7}{r['pss_mb']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import threading
+
+CHARS_PER_TOKEN = 4  # rough average for English with llama-style tokenizers
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 4  # + per-message template overhead
+
+
+class Conversation:
+    """
+    Chat history for one session, kept under a token budget.
+
+    messages(prompt) always starts with the same system prompt, then the
+    summary of trimmed turns (if any), then the recent turns in order, so
+    from one turn to the next the request only grows at the end. That keeps
+    the prefix byte-identical and Ollama can reuse its KV cache instead of
+    re-running prefill over the whole history.
+
+    compact() is what changes the prefix: once the history is over
+    max_tokens it folds the oldest turns into the summary (via summarize,
+    if given, otherwise they are dropped) until it is back under
+    low_water * max_tokens. Trimming well below the limit means the cache
+    is invalidated once every several turns instead of on every turn.
+    Call it between turns, not while the user is waiting for a reply;
+    compact_in_background() does that without holding up the next turn.
+    The history stays whole until the summary is ready, so a turn that
+    starts in the meantime still sees everything.
+    """
+
+    def __init__(self, system_prompt, max_tokens=2048, low_water=0.5, keep_turns=2, summarize=None):
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.low_water = low_water
+        self.keep_turns = keep_turns
+        self.summarize = summarize
+        self.summary = ""
+        self.turns = []  # (user, assistant)
+        self.last_usage = {}
+        self._lock = threading.RLock()
+        self._compacting = threading.Lock()
+        self._compactor = None
+
+    def messages(self, prompt):
+        with self._lock:
+            messages = [{"role": "system", "content": self.system_prompt}]
+            if self.summary:
+                messages.append({"role": "system", "content": "Earlier in this conversation: " + self.summary})
+            for user, assistant in self.turns:
+                messages.append({"role": "user", "content": user})
+                messages.append({"role": "assistant", "content": assistant})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def add_turn(self, user, assistant):
+        if assistant:
+            with self._lock:
+                self.turns.append((user, assistant))
+
+    def tokens(self):
+        """Estimated prompt tokens for the history (excluding the next user turn)."""
+        with self._lock:
+            total = estimate_tokens(self.system_prompt) + (estimate_tokens(self.summary) if self.summary else 0)
+            return total + sum(estimate_tokens(u) + estimate_tokens(a) for u, a in self.turns)
+
+    def compact(self):
+        """Trims the history if it is over budget. Returns True if the prompt prefix changed."""
+        if not self._compacting.acquire(blocking=False):
+            return False  # a background compaction is already on it
+        try:
+            with self._lock:
+                tokens = self.tokens()
+                if tokens <= self.max_tokens:
+                    return False
+                target = self.max_tokens * self.low_water
+                count = 0
+                while len(self.turns) - count > self.keep_turns and tokens > target:
+                    user, assistant = self.turns[count]
+                    tokens -= estimate_tokens(user) + estimate_tokens(assistant)
+                    count += 1
+                dropped, summary = self.turns[:count], self.summary
+            if not dropped:
+                return False
+            # The slow part runs unlocked; turns are only ever added at the end, so the dropped ones stay first
+            if self.summarize is not None:
+                try:
+                    summary = self.summarize(summary, dropped)
+                except Exception as e:
+                    print(f"\n[Memory] Summary failed, dropping old turns: {e}")
+            with self._lock:
+                del self.turns[:count]
+                self.summary = summary
+            return True
+        finally:
+            self._compacting.release()
+
+    def compact_in_background(self):
+        """Runs compact() on its own thread, so a summary (an LLM round-trip) never delays the next turn."""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, daemon=True)
+        self._compactor.start()
+
+    def record_usage(self, chunk, prompt=""):
+        """
+        Keeps the prompt statistics from the final chunk of an Ollama stream.
+
+        prompt_eval_count only counts tokens that were actually evaluated, so
+        with a warm KV cache it is much smaller than the estimated prompt size.
+        """
+        evaluated = chunk.get("prompt_eval_count")
+        if evaluated is None:
+            return None
+        self.last_usage = {
+            "prompt_tokens": evaluated,
+            "prompt_tokens_estimate": self.tokens() + estimate_tokens(prompt),
+            "prefill_seconds": round((chunk.get("prompt_eval_duration") or 0) / 1e9, 4),
+            "load_seconds": round((chunk.get("load_duration") or 0) / 1e9, 4),
+        }
+        return self.last_usage
+
+
+def ollama_summarizer(model, keep_alive=None, max_words=120):
+    """Returns a summarize(summary, turns) callable that asks the chat model itself."""
+    import ollama
+
+    def summarize(summary, turns):
+        transcript = "\n".join(f"User: {u}\nAssistant: {a}" for u, a in turns)
+        request = (
+            f"Summarize this conversation in at most {max_words} words, keeping names, facts and "
+            f"anything the user asked to remember.\n\n"
+            + (f"Summary so far: {summary}\n\n" if summary else "")
+            + transcript
+        )
+        response = ollama.chat(model=model, messages=[{"role": "user", "content": request}], keep_alive=keep_alive)
+        return response["message"]["content"].strip()
+
+    return summarize
@@ -2,6 +2,7 @@ import ollama
 from TTS.api import TTS
 import sounddevice as sd
 import numpy as np
+from segmenter import SentenceSegmenter
 
 # Load the English-only Tacotron2 model
 tts = TTS(model_name="tts_models/en/ljspeech/tacotron2-DDC", progress_bar=True, gpu=False)
@@ -11,7 +12,7 @@ def speak_text(text):
         # Generate audio from text
         audio = tts.tts(text=text)
         # Play audio
-        sd.play(audio, samplerate=22050)
+        sd.play(audio, samplerate=tts.synthesizer.output_sample_rate)
         sd.wait()
     except Exception as e:
         print(f"Error in TTS: {e}")
@@ -24,17 +25,16 @@ def stream_and_speak(model_name, prompt):
         messages=[{"role": "user", "content": prompt}],
         stream=True,
     )
-    buffer = ""
+    # Segments end at real sentence boundaries (not "3.5" or "Dr."); each token is scanned once
+    segmenter = SentenceSegmenter()
     for chunk in response:
         content = chunk['message']['content']
-        buffer += content
-        # Speak when a sentence ends
-        if content.endswith((".", "!", "?")):
-            speak_text(content)
-            buffer = ""
+        for sentence in segmenter.feed(content):
+            speak_text(sentence)
+
     # Speak any remaining text
-    if buffer:
-        speak_text(buffer)
+    for sentence in segmenter.flush():
+        speak_text(sentence)
 
 # Example usage
 stream_and_speak("emma", "hi")
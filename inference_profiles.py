@@ -0,0 +1,125 @@
+"""
+CPU inference profiles for XTTS: what is done to the model after loading.
+
+    fp32            as loaded, torch's default threading (the baseline)
+    tuned           fp32 with intra-op threads = physical cores, one inter-op thread
+    int8            tuned + dynamic int8 quantization of every Linear layer,
+                    including the GPT-2 backbone's attention and MLP projections
+    compiled        tuned + torch.compile of the GPT-2 backbone and the HiFi-GAN decoder
+    int8-compiled   both
+
+Dynamic quantization stores int8 weights and quantizes activations per
+batch on the fly, so the GPT, which spends its time in matrix-vector
+products over ~400 MB of weights, reads a quarter of the memory per token.
+The HiFi-GAN decoder is convolutional and stays fp32. Quantized layers are
+private copies, so they no longer share pages with the memory-mapped
+weights (model_loader); the rest of the model still does.
+
+Compilation happens on the first synthesis for each new input shape, so
+the first sentences after start-up are slower; warm up before timing.
+
+bench_profiles.py measures speed, memory and output distance to fp32.
+"""
+import os
+
+PROFILES = {
+    "fp32": dict(threads=False, int8=False, compile=False),
+    "tuned": dict(threads=True, int8=False, compile=False),
+    "int8": dict(threads=True, int8=True, compile=False),
+    "compiled": dict(threads=True, int8=False, compile=True),
+    "int8-compiled": dict(threads=True, int8=True, compile=True),
+}
+
+
+def physical_cores():
+    """Physical cores among the CPUs this process may run on (hyper-threads count once)."""
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    cores = set()
+    for cpu in cpus:
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+                cores.add(f.read().strip())
+        except OSError:
+            cores.add(str(cpu))
+    return len(cores)
+
+
+def tune_threads(threads=None, interop_threads=1):
+    """
+    One intra-op thread per physical core (or threads): hyper-thread
+    siblings share the FPUs these kernels saturate. XTTS runs one op at a
+    time, so a single inter-op thread avoids a second pool fighting for the
+    same cores.
+    """
+    import torch
+
+    torch.set_num_threads(threads or physical_cores())
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        pass  # can only be set once, before any inter-op work; keep what is there
+
+
+def _gpt2_conv1d_to_linear(module):
+    """
+    Replaces transformers' Conv1D (GPT-2's attention and MLP projections,
+    weight stored as in x out) with the equivalent nn.Linear, which
+    quantize_dynamic knows how to handle. Modules reached through several
+    parents (gpt_inference wraps the same backbone) are converted once.
+    """
+    import torch.nn as nn
+    from transformers.pytorch_utils import Conv1D
+
+    converted = {}
+    for parent in list(module.modules()):
+        for name, child in list(parent.named_children()):
+            if not isinstance(child, Conv1D):
+                continue
+            if id(child) not in converted:
+                linear = nn.Linear(child.weight.shape[0], child.weight.shape[1])
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                converted[id(child)] = linear
+            setattr(parent, name, converted[id(child)])
+    return len(converted)
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of model's Linear layers, in place."""
+    import torch
+    import torch.nn as nn
+
+    _gpt2_conv1d_to_linear(model.gpt)
+    torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def compile_model(model):
+    """
+    torch.compile on the two hot paths. forward is swapped in place
+    rather than the modules replaced, because gpt_inference holds its own
+    reference to the backbone. Shapes vary with every sentence and every
+    generated token, hence dynamic=True.
+    """
+    import torch
+
+    for module in (model.gpt.gpt, model.hifigan_decoder):
+        module.forward = torch.compile(module.forward, dynamic=True)
+    return model
+
+
+def apply_profile(model, profile="fp32", threads=None):
+    """Applies a profile from PROFILES to a loaded Xtts model (in place) and returns it; fp32 leaves it alone."""
+    try:
+        options = PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"unknown inference profile {profile!r} (choose from {', '.join(PROFILES)})") from None
+    if not any(options.values()):
+        return model
+    if options["threads"]:
+        tune_threads(threads)
+    if options["int8"]:
+        quantize_int8(model)
+    if options["compile"]:
+        compile_model(model)
+    return model
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Turn-level durations derived from a timeline: name -> (from mark, to mark)
+TURN_METRICS = {
+    "endpointing": ("speech_end", "endpointed"),
+    "recognition": ("endpointed", "transcribed"),
+    "ttft": ("llm_request", "first_token"),
+    "first_segment_wait": ("first_token", "first_segment"),
+    "ttfa": ("llm_request", "device_start"),
+    "end_to_end": ("speech_end", "device_start"),
+    "llm_stream": ("llm_request", "llm_done"),
+    "barge_in": ("barge_in_detected", "barge_in_silenced"),
+}
+
+
+class TurnTimeline:
+    """
+    Timestamps for one conversational turn.
+
+    Stages call mark() as they reach a milestone (first token, first
+    segment, device start, ...) and the TTS scheduler reports each segment.
+    Marks are kept relative to the start of the turn, in seconds.
+    """
+
+    def __init__(self, turn_id):
+        self.turn_id = turn_id
+        self.started = time.perf_counter()
+        self.wall_time = time.time()
+        self.marks = {}
+        self.notes = {}
+        self.segments = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name, at=None):
+        """Records a milestone once; later calls with the same name are ignored."""
+        at = time.perf_counter() if at is None else at
+        with self._lock:
+            self.marks.setdefault(name, at - self.started)
+
+    def note(self, name, value):
+        """Attaches a non-timing detail to the turn (e.g. whether speculation hit)."""
+        with self._lock:
+            self.notes[name] = value
+
+    def segment(self, seq, stats):
+        with self._lock:
+            self.segments[seq] = stats
+
+    def summary(self):
+        """Derived durations (seconds) for every metric whose marks are present."""
+        out = {}
+        for name, (start, end) in TURN_METRICS.items():
+            if start in self.marks and end in self.marks:
+                out[name] = round(self.marks[end] - self.marks[start], 4)
+        return out
+
+    def to_record(self):
+        with self._lock:
+            return {
+                "turn": self.turn_id,
+                "time": self.wall_time,
+                "marks": {k: round(v, 4) for k, v in sorted(self.marks.items(), key=lambda kv: kv[1])},
+                "metrics": self.summary(),
+                "notes": dict(self.notes),
+                "segments": [dict(seq=seq, **stats) for seq, stats in sorted(self.segments.items())],
+            }
+
+
+class MetricsRecorder:
+    """
+    Collects finished turns: appends each to a JSONL file and keeps running
+    sums for a Prometheus text endpoint (GET /metrics) when a port is given.
+    """
+
+    def __init__(self, path="metrics/turns.jsonl", port=None):
+        self.path = path
+        self.turns = 0
+        self.sums = {}
+        self.counts = {}
+        self.last = {}
+        self.sources = {}
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if port:
+            self._serve(port)
+
+    def start_turn(self):
+        with self._lock:
+            self.turns += 1
+            return TurnTimeline(self.turns)
+
+    def finish(self, timeline):
+        timeline.mark("turn_done")
+        record = timeline.to_record()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+        observed = dict(record["metrics"])
+        # Numeric notes (prompt tokens, prefill time, ...) get running sums too
+        observed.update((k, v) for k, v in record["notes"].items()
+                        if isinstance(v, (int, float)) and not isinstance(v, bool))
+        with self._lock:
+            for name, value in observed.items():
+                self._observe(name if name in record["notes"] else name + "_seconds", value)
+            for seg in record["segments"]:
+                if "rtf" in seg:
+                    self._observe("segment_rtf", seg["rtf"])
+                if "queue_wait" in seg:
+                    self._observe("segment_queue_wait_seconds", seg["queue_wait"])
+        return record
+
+    def track(self, name, stats):
+        """Exports every number in stats() (called at scrape time) as voice_<name>_<key>."""
+        self.sources[name] = stats
+
+    def _observe(self, name, value):
+        self.sums[name] = self.sums.get(name, 0.0) + value
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.last[name] = value
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP voice_turns_total Conversation turns started.",
+            "# TYPE voice_turns_total counter",
+            f"voice_turns_total {self.turns}",
+        ]
+        with self._lock:
+            sources = list(self.sources.items())
+            for name in sorted(self.sums):
+                lines += [
+                    f"# TYPE voice_{name} summary",
+                    f"voice_{name}_sum {self.sums[name]:.6f}",
+                    f"voice_{name}_count {self.counts[name]}",
+                    f"# TYPE voice_{name}_last gauge",
+                    f"voice_{name}_last {self.last[name]:.6f}",
+                ]
+        for source, stats in sources:
+            for key, value in stats().items():
+                if isinstance(value, (int, float)):
+                    lines += [f"# TYPE voice_{source}_{key} gauge", f"voice_{source}_{key} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def _serve(self, port):
+        recorder = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = recorder.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # keep the chat output clean
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
@@ -0,0 +1,203 @@
+import queue
+import threading
+import time
+import numpy as np
+import sounddevice as sd
+
+
+class EnergyVAD:
+    """
+    Frame-level voice activity detection against a running noise floor.
+
+    A frame is speech when its RMS is threshold_ratio above the floor. The
+    floor follows the quiet frames only, so it adapts to a fan or traffic
+    without being pulled up by speech. If echo_level is given (e.g.
+    lambda: player.output_rms), the threshold is also kept above echo_gain
+    times the current playback level so Emma's own voice from the speakers
+    isn't taken for the user. That is a crude echo guard; headphones work
+    far better.
+    """
+
+    def __init__(self, threshold_ratio=3.0, echo_level=None, echo_gain=0.5, min_floor=1e-4):
+        self.threshold_ratio = threshold_ratio
+        self.echo_level = echo_level
+        self.echo_gain = echo_gain
+        self.min_floor = min_floor
+        self.noise_floor = None
+
+    def is_speech(self, frame):
+        rms = float(np.sqrt(np.mean(np.square(frame, dtype=np.float32))))
+        if frame.dtype.kind == "i":
+            rms /= 32768.0
+        if self.noise_floor is None:
+            self.noise_floor = max(rms, self.min_floor)
+
+        threshold = self.noise_floor * self.threshold_ratio
+        if self.echo_level is not None:
+            threshold = max(threshold, self.echo_level() * self.echo_gain)
+        if rms > threshold:
+            return True
+        self.noise_floor = max(0.95 * self.noise_floor + 0.05 * rms, self.min_floor)
+        return False
+
+
+class Utterance:
+    """
+    One endpointed stretch of speech.
+
+    audio is an int16 view into the capture ring buffer, not a copy; it stays
+    valid until the ring wraps around (buffer_seconds later), so recognize it
+    or copy it before then. pcm is the same memory as bytes-like PCM.
+    start and end are its positions in the capture stream.
+    """
+
+    def __init__(self, audio, samplerate, start, end, onset, speech_end, endpointed):
+        self.audio = audio
+        self.samplerate = samplerate
+        self.start = start
+        self.end = end
+        self.onset = onset              # perf_counter() when speech started
+        self.speech_end = speech_end    # ...when the last speech frame ended
+        self.endpointed = endpointed    # ...when the trailing silence closed it
+
+    @property
+    def pcm(self):
+        return memoryview(self.audio).cast("B")
+
+    @property
+    def duration(self):
+        return len(self.audio) / self.samplerate
+
+
+class MicCapture:
+    """
+    Keeps the microphone open for the whole session and cuts the input into
+    utterances as they happen.
+
+    The audio callback is the only writer: it copies each frame into a
+    preallocated int16 ring buffer and then advances write_pos, so readers
+    never take a lock. Every frame is stored twice (at i and i + capacity)
+    which makes any window up to buffer_seconds one contiguous slice, so
+    utterances are handed out as views with no stitching or copying.
+
+    Speech starts after start_ms of voiced frames (plus pre_roll_ms kept
+    from before the onset) and ends after end_silence_ms of silence, or at
+    max_utterance_seconds. on_speech_start(onset), if set, is called on its
+    own thread as soon as speech starts, e.g. for barge-in.
+    """
+
+    def __init__(self, samplerate=16000, frame_ms=20, buffer_seconds=60, start_ms=100, end_silence_ms=300,
+                 pre_roll_ms=200, max_utterance_seconds=30, vad=None, device=None):
+        if max_utterance_seconds + pre_roll_ms / 1000 >= buffer_seconds:
+            raise ValueError("buffer_seconds must be longer than max_utterance_seconds plus the pre-roll")
+        self.samplerate = samplerate
+        self.frame = int(samplerate * frame_ms / 1000)
+        self.capacity = int(samplerate * buffer_seconds)
+        self.ring = np.zeros(2 * self.capacity, dtype=np.int16)
+        self.write_pos = 0
+        self.vad = vad or EnergyVAD()
+        self.start_samples = int(samplerate * start_ms / 1000)
+        self.end_silence_samples = int(samplerate * end_silence_ms / 1000)
+        self.pre_roll = int(samplerate * pre_roll_ms / 1000)
+        self.max_samples = int(samplerate * max_utterance_seconds)
+        self.on_speech_start = None
+        self.overflows = 0
+        self.utterances = queue.Queue()
+
+        self._voiced = 0        # consecutive voiced samples before an utterance starts
+        self._silence = 0       # consecutive silent samples inside an utterance
+        # Stream position where the utterance in progress starts (None between utterances)
+        self.speech_start = None
+        self._onset = None
+        self._last_speech = 0   # ring position just after the last voiced frame
+
+        self.stream = sd.InputStream(
+            samplerate=samplerate,
+            channels=1,
+            dtype="int16",
+            blocksize=self.frame,
+            device=device,
+            callback=self._callback,
+        )
+
+    def start(self):
+        self.stream.start()
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+    def next_utterance(self, timeout=None):
+        """Blocks until the next utterance is endpointed; None on timeout."""
+        try:
+            return self.utterances.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def clear(self):
+        """Drops utterances that were endpointed but not picked up yet."""
+        while True:
+            try:
+                self.utterances.get_nowait()
+            except queue.Empty:
+                return
+
+    @property
+    def silence_ms(self):
+        """How long the utterance in progress has been silent (0 when nobody is talking)."""
+        if self.speech_start is None:
+            return 0.0
+        return self._silence * 1000 / self.samplerate
+
+    def view(self, start, end):
+        """Contiguous int16 view of ring positions [start, end)."""
+        i = start % self.capacity
+        return self.ring[i:i + (end - start)]
+
+    def _callback(self, indata, frames, time_info, status):
+        if status.input_overflow:
+            self.overflows += 1
+
+        pcm = indata[:, 0]
+        start = self.write_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        rest = frames - first
+        self.ring[start:start + first] = pcm[:first]
+        self.ring[start + self.capacity:start + self.capacity + first] = pcm[:first]
+        if rest:
+            self.ring[:rest] = pcm[first:]
+            self.ring[self.capacity:self.capacity + rest] = pcm[first:]
+        # Publish only after the samples are in place
+        self.write_pos += frames
+
+        self._endpoint(self.vad.is_speech(pcm), frames, time.perf_counter())
+
+    def _endpoint(self, speech, frames, now):
+        pos = self.write_pos
+        if self.speech_start is None:
+            self._voiced = self._voiced + frames if speech else 0
+            if self._voiced < self.start_samples:
+                return
+            onset_pos = pos - self._voiced
+            self.speech_start = max(onset_pos - self.pre_roll, 0)
+            self._onset = now - self._voiced / self.samplerate
+            self._last_speech = pos
+            self._silence = 0
+            if self.on_speech_start is not None:
+                threading.Thread(target=self.on_speech_start, args=(self._onset,), daemon=True).start()
+            return
+
+        if speech:
+            self._silence = 0
+            self._last_speech = pos
+        else:
+            self._silence += frames
+
+        if self._silence >= self.end_silence_samples or pos - self.speech_start >= self.max_samples:
+            # Keep a little of the trailing silence so the last word isn't clipped
+            end = min(self._last_speech + self.pre_roll, pos)
+            speech_end = now - (pos - self._last_speech) / self.samplerate
+            self.utterances.put(Utterance(self.view(self.speech_start, end), self.samplerate, self.speech_start, end,
+                                          self._onset, speech_end, now))
+            self.speech_start = None
+            self._voiced = 0
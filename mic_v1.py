@@ -1,105 +1,287 @@
 import ollama
-import speech_recognition as sr
-from TTS.api import TTS
-import sounddevice as sd
 import numpy as np
 import threading
 import queue
-import re
+import time
+from tts_scheduler import TTSScheduler, ordered
+from audio_sinks import open_sink
+from tts_daemon import connect_synthesizer
+from audio_cache import AudioCache
+from silence_trim import SilenceTrimmer
+from segmenter import SentenceSegmenter
+from text_normalizer import normalize_text
+from metrics import MetricsRecorder
+from barge_in import CancelToken
+from mic_capture import MicCapture, EnergyVAD
+from asr import load_recognizer, transcribe_stream
+from speculation import Speculator
+from conversation import Conversation, ollama_summarizer
 
 # --- CONFIGURATION ---
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
 MODEL_NAME = "emma"             # Your local Ollama model
+SYSTEM_PROMPT = "You are Emma. Be playful and helpful. Speak naturally for voice output."
+KEEP_ALIVE = "30m"              # Keep the model loaded in Ollama between turns
+HISTORY_TOKENS = 2048           # Conversation memory budget; older turns get summarized
 ENGLISH_SPEAKER = "Ana Florence" # XTTS v2 Female voice
 SAMPLE_RATE = 24000             # Native XTTS v2 sample rate
+TTS_WORKERS = 2                 # Parallel synthesis threads
+INFERENCE_PROFILE = "fp32"      # CPU speed-ups: fp32, tuned, int8, compiled, int8-compiled (bench_profiles.py)
+TTS_PROCESSES = 0               # >0: run XTTS in this many processes, each on its own cores (keep <= TTS_WORKERS)
+TTS_MAX_PENDING = 4             # Sentences that may wait for a worker before the LLM loop blocks
+STREAM_CHUNK_SIZE = 20          # GPT tokens per streamed audio chunk (0 = render whole sentences)
+REPORT_TTFA = False             # Print time-to-first-audio for every sentence
+TRIM_SILENCE = True             # Cut XTTS's leading/trailing near-silence; pauses then follow punctuation
+AUDIO_OUT = "device"            # Where Emma's voice goes: device, null, or a .wav/.flac path
+AUDIO_CACHE_MB = 64             # In-memory clip cache; older clips stay on disk
+GOODBYE_TEXT = "Goodbye, darling! It was lovely chatting with you!"
+PREWARM_PHRASES = [GOODBYE_TEXT]  # Synthesized (once, then from disk) before the first turn
+METRICS_FILE = "metrics/turns.jsonl"  # One timeline record per turn
+METRICS_PORT = 9108             # Prometheus text at http://127.0.0.1:9108/metrics (None = off)
+BARGE_IN = True                 # Stop Emma when you start talking over her (headphones recommended)
+BARGE_IN_TARGET_MS = 150        # Speech onset -> silence budget, reported on every barge-in
+FADE_OUT_MS = 30                # Fade applied to the audio that is playing when she is cut off
+MIC_SAMPLE_RATE = 16000         # Capture rate; the mic stays open for the whole session
+END_SILENCE_MS = 300            # Trailing silence that ends your turn
+MAX_UTTERANCE_SECONDS = 30      # Longest single turn before it is cut
+ASR_BACKEND = "whisper"         # "whisper" / "vosk" run locally on the CPU; "google" needs internet
+ASR_OPTIONS = {"model_size": "base.en"}  # Passed to the backend (see asr.py)
+SHOW_PARTIALS = True            # Print the live transcript while you speak
+SPECULATE = True                # Start the LLM on a stable partial transcript, before you finish
+SPECULATE_STABLE_MS = 150       # You silent this long (partial flushed at the pause) -> start speculatively
 # ---------------------
 
 print("Loading Emma's voice engine (XTTS v2)...")
-tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2", progress_bar=False, gpu=False)
+# Uses the shared tts_daemon when one is running, otherwise loads XTTS here
+speakers = connect_synthesizer(TTS_MODEL, processes=TTS_PROCESSES, profile=INFERENCE_PROFILE)
+audio_cache = AudioCache(TTS_MODEL, max_memory_mb=AUDIO_CACHE_MB, profile=speakers.profile)
+# Clips are cached as synthesized and trimmed on the way out
+trimmer = SilenceTrimmer(SAMPLE_RATE, enabled=TRIM_SILENCE)
 
 audio_queue = queue.Queue()
 
+metrics = MetricsRecorder(METRICS_FILE, port=METRICS_PORT)
+current_turn = None  # TurnTimeline of the turn in progress
+
+def mark(name, at=None):
+    """Records a milestone on the current turn's timeline."""
+    if current_turn is not None:
+        current_turn.mark(name, at)
+
+def record_segment(seq, stats):
+    """Scheduler callback: per-segment queue wait, synthesis time and RTF."""
+    if current_turn is not None:
+        current_turn.segment(seq, stats)
+
 def play_audio_worker():
     """Background thread: Plays audio chunks smoothly."""
-    while True:
+    # ordered() holds back finished sentences until the earlier ones have played
+    last_seq = None
+    for seq, audio_data in ordered(audio_queue):
         try:
-            audio_data = audio_queue.get()
-            if audio_data is None: break
-            
-            if len(audio_data) > 0:
-                sd.play(audio_data, samplerate=SAMPLE_RATE)
-                sd.wait()
-            audio_queue.task_done()
+            # One persistent stream: no device setup or gap between sentences.
+            # Only crossfade at sentence joins; streamed chunks are contiguous.
+            mark("first_audio_queued")
+            # seq lets the player drop chunks of a segment cancelled by barge-in
+            player.write(audio_data, crossfade=seq != last_seq, seq=seq)
+            last_seq = seq
         except Exception as e:
             print(f"\n[Playback Error] {e}")
 
 # Start audio playback thread
+player = open_sink(AUDIO_OUT, samplerate=SAMPLE_RATE)
+player.on_start = lambda at: mark("device_start", at)
+player.start()
 threading.Thread(target=play_audio_worker, daemon=True).start()
 
-def clean_text_for_tts(text):
-    """Cleans AI output for TTS."""
-    text = re.sub(r'\(.*?\)', '', text)  # Remove (actions)
-    text = re.sub(r'\*.*?\*', '', text)  # Remove *actions*
-    text = re.sub(r'[^\x00-\x7F]+', '', text)  # Remove emojis
-    text = re.sub(r'[^a-zA-Z0-9\s.,!?\']', '', text)
-    return text.strip()
-
-def speak_text(text):
-    """Generates audio and adds to playback queue."""
-    clean_text = clean_text_for_tts(text)
+def synthesize_text(text):
+    """Generates audio for one sentence on a scheduler worker."""
+    # One pass: drops actions/emojis, spells out numbers, currency and abbreviations
+    clean_text = normalize_text(text)
     if len(clean_text) < 2:
-        return
+        return None
+
+    # Repeated phrases come straight from the cache
+    cached = audio_cache.get(clean_text, ENGLISH_SPEAKER, "en")
+    if cached is not None:
+        return cached
         
     try:
-        audio = tts.tts(text=clean_text, speaker=ENGLISH_SPEAKER, language="en")
-        audio_queue.put(np.array(audio))
+        if STREAM_CHUNK_SIZE:
+            # Playback starts on the first chunk instead of after the whole sentence
+            stream = speakers.stream(clean_text, ENGLISH_SPEAKER, "en", chunk_size=STREAM_CHUNK_SIZE)
+            return audio_cache.record(clean_text, ENGLISH_SPEAKER, "en", stream)
+        audio = np.asarray(speakers.tts(clean_text, ENGLISH_SPEAKER, "en"), dtype=np.float32)
+        audio_cache.put(clean_text, ENGLISH_SPEAKER, "en", audio)
+        return audio
     except Exception:
-        pass
+        return None
+
+audio_cache.prewarm(PREWARM_PHRASES, synthesize_text)
+
+scheduler = TTSScheduler(trimmer.wrap(synthesize_text), audio_queue, num_workers=TTS_WORKERS, max_pending=TTS_MAX_PENDING, report_ttfa=REPORT_TTFA,
+                         samplerate=SAMPLE_RATE, on_segment=record_segment)
+
+def speak_text(text):
+    """Queues a sentence for synthesis; it plays after everything queued before it."""
+    scheduler.submit(text)
+
+reply_cancel = None  # CancelToken of the reply being spoken
+
+def barge_in(onset):
+    """MicCapture on_speech_start hook: the user started talking, so cut the reply short."""
+    token = reply_cancel
+    if token is None or token.cancelled:
+        return
+    mark("barge_in_detected", onset)
+    # Stops the LLM loop, then drops queued/in-flight synthesis, then fades out the device
+    token.cancel("barge-in")
+    first_new = scheduler.cancel()
+    player.silence(FADE_OUT_MS, drop_before=first_new)
+    player.drain()
+    mark("barge_in_silenced")
+    latency_ms = (time.perf_counter() - onset) * 1000
+    verdict = "ok" if latency_ms <= BARGE_IN_TARGET_MS else "over target"
+    print(f"\n✋ Barge-in: silent {latency_ms:.0f} ms after you spoke ({verdict}, target {BARGE_IN_TARGET_MS} ms)")
+
+# One always-open input stream: it endpoints your turns and detects barge-in
+capture = MicCapture(MIC_SAMPLE_RATE, end_silence_ms=END_SILENCE_MS, max_utterance_seconds=MAX_UTTERANCE_SECONDS,
+                     vad=EnergyVAD(echo_level=lambda: player.output_rms))
+if BARGE_IN:
+    capture.on_speech_start = barge_in
+print(f"Loading speech recognition ({ASR_BACKEND})...")
+recognizer = load_recognizer(ASR_BACKEND, samplerate=MIC_SAMPLE_RATE, **ASR_OPTIONS)
+
+def wait_until_spoken():
+    """Blocks until every queued sentence has been synthesized and played."""
+    scheduler.wait()
+    audio_queue.join()
+    player.drain()
+
+# Multi-turn memory; the prompt prefix stays identical between turns so Ollama's KV cache is reused
+conversation = Conversation(SYSTEM_PROMPT, max_tokens=HISTORY_TOKENS,
+                            summarize=ollama_summarizer(MODEL_NAME, keep_alive=KEEP_ALIVE))
+
+def open_reply_stream(prompt):
+    return ollama.chat(model=MODEL_NAME, messages=conversation.messages(prompt), stream=True, keep_alive=KEEP_ALIVE)
+
+# Runs open_reply_stream() early on a stable partial; the final transcript promotes or drops it
+speculator = Speculator(open_reply_stream, lambda: capture.silence_ms, SPECULATE_STABLE_MS) if SPECULATE else None
+if speculator is not None:
+    metrics.track("speculation", speculator.stats)
 
 def listen_to_user():
-    """Listens to microphone and converts speech to text."""
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("🎤 Listening...")
-        recognizer.adjust_for_ambient_noise(source, duration=0.5)
-        audio = recognizer.listen(source, timeout=5, phrase_time_limit=10)
-    
+    """Transcribes the next utterance from the open mic while it is being spoken."""
+    print("🎤 Listening...")
     try:
-        text = recognizer.recognize_google(audio)
-        print(f"✅ You said: {text}")
-        return text
-    except sr.UnknownValueError:
-        print("❌ Could not understand audio")
+        utterance, text = transcribe_stream(capture, recognizer, on_partial=on_partial,
+                                            on_poll=speculator.poll if speculator else None)
+    except Exception as e:
+        print(f"\n❌ Recognition error: {e}")
         return ""
-    except sr.RequestError as e:
-        print(f"❌ Service error: {e}")
+    mark("speech_end", utterance.speech_end)
+    mark("endpointed", utterance.endpointed)
+    mark("transcribed")
+
+    if not text:
+        print("\r\033[K❌ Could not understand audio")
         return ""
+    print(f"\r\033[K✅ You said: {text}")
+    return text
+
+def on_partial(text, settled=False):
+    """Live transcript, rewritten in place as the hypothesis changes."""
+    mark("first_partial")
+    if speculator is not None:
+        speculator.on_partial(text, settled)
+    if SHOW_PARTIALS:
+        print(f"\r\033[K🎤 {text}", end="", flush=True)
+
+def take_speculation(final):
+    """Promotes the speculative LLM stream if it was started on the final transcript."""
+    if speculator is None:
+        return None
+    had_guess = speculator.current is not None
+    reply = speculator.resolve(final)
+    if reply is not None:
+        current_turn.note("speculation", "hit")
+        now = time.perf_counter()
+        current_turn.note("speculation_head_start_seconds", round(now - reply.started, 4))
+        current_turn.note("speculation_saved_seconds", round(reply.saved_seconds(now), 4))
+    elif had_guess:
+        current_turn.note("speculation", "miss")
+    return reply
+
+def report_usage(usage):
+    """Prompt tokens actually evaluated vs. the whole prompt: a small ratio means the KV cache hit."""
+    if not usage:
+        return
+    if current_turn is not None:
+        for name, value in usage.items():
+            current_turn.note(name, value)
+    print(f"\n📝 prefill {usage['prompt_tokens']} of ~{usage['prompt_tokens_estimate']} prompt tokens "
+          f"in {usage['prefill_seconds'] * 1000:.0f} ms", end="")
 
-def stream_and_speak(prompt):
-    """Streams LLM response and speaks it."""
+def stream_and_speak(prompt, cancel=None, response=None):
+    """
+    Streams LLM response and speaks it. Stops early once cancel is set.
+    response may be a stream already opened for prompt (a promoted speculation).
+    """
     print(f"\n🤖 {MODEL_NAME} is thinking...")
     
-    messages = [
-        {"role": "system", "content": "You are Emma. Be playful and helpful. Speak naturally for voice output."},
-        {"role": "user", "content": prompt}
-    ]
-    
     try:
-        response = ollama.chat(model=MODEL_NAME, messages=messages, stream=True)
+        if response is None:
+            mark("llm_request")
+            response = open_reply_stream(prompt)
+        else:
+            mark("llm_request", response.started)
         
-        buffer = ""
+        # Segments end at real sentence boundaries (not "3.5" or "Dr."); each token is scanned once
+        segmenter = SentenceSegmenter()
+        reply = []
+
+        def interrupted():
+            """True (after cleaning up) once the reply is cancelled; checked before anything is queued."""
+            if cancel is None or not cancel.cancelled:
+                return False
+            # Closing the generator drops the HTTP stream, so Ollama stops generating
+            if hasattr(response, "close"):
+                response.close()
+            print(" [interrupted]")
+            # Remember what she got to say, so "as I was saying" still makes sense
+            conversation.add_turn(prompt, "".join(reply) + "...")
+            return True
+
+        def speak(sentences):
+            # Several sentences can come out of one feed(); a barge-in between them must stop the rest
+            for sentence in sentences:
+                if interrupted():
+                    return False
+                mark("first_segment")
+                speak_text(sentence)
+                if cancel is not None and cancel.cancelled:
+                    # Barge-in raced with the submit: drop what was just queued along with the rest
+                    scheduler.cancel()
+            return True
+
         for chunk in response:
+            if interrupted():
+                return
+            # A promoted speculation may have buffered its first token long ago
+            mark("first_token", getattr(response, "first_token_at", None))
             content = chunk['message']['content']
+            reply.append(content)
             print(content, end="", flush=True)
-            buffer += content
-            
-            if any(char in content for char in (".", "!", "?", "\n")):
-                sentence = buffer.strip()
-                if sentence:
-                    threading.Thread(target=speak_text, args=(sentence,), daemon=True).start()
-                buffer = ""
-                
-        if buffer.strip():
-            speak_text(buffer.strip())
+            if chunk.get("done"):
+                report_usage(conversation.record_usage(chunk, prompt))
+            if not speak(segmenter.feed(content)):
+                return
+
+        # Speak any remaining text, unless the turn was cut off
+        if interrupted() or not speak(segmenter.flush()):
+            return
+        mark("llm_done")
+        conversation.add_turn(prompt, "".join(reply))
             
     except Exception as e:
         print(f"\n[Ollama Error] {e}")
@@ -111,20 +293,42 @@ if __name__ == "__main__":
     print("💡 Say 'exit', 'quit', or 'bye' to stop")
     print("💡 Speak clearly into your microphone")
     print("="*50 + "\n")
+    capture.start()
     
     while True:
+        current_turn = metrics.start_turn()
+
         # 1. LISTEN to user
         user_input = listen_to_user()
+        speculative = take_speculation(user_input)
         
         if not user_input:
             continue
             
         # 2. Check for exit commands
         if any(word in user_input.lower() for word in ["exit", "quit", "bye"]):
-            speak_text("Goodbye, darling! It was lovely chatting with you!")
+            if speculative is not None:
+                speculative.close()
+            speak_text(GOODBYE_TEXT)
+            wait_until_spoken()
             break
             
-        # 3. RESPOND with voice
-        stream_and_speak(user_input)
+        # 3. RESPOND with voice; talking over Emma cuts her off
+        reply_cancel = CancelToken()
+        stream_and_speak(user_input, reply_cancel, response=speculative)
+
+        # 4. Let Emma finish before listening again, then log the turn's timeline.
+        # Whatever you said over her is already captured and becomes the next turn.
+        wait_until_spoken()
+        reply_cancel = None
+        # Trim memory on the side: summarizing is an LLM round-trip your next turn shouldn't wait for
+        conversation.compact_in_background()
+        summary = metrics.finish(current_turn)["metrics"]
+        print("\n⏱️ " + " | ".join(f"{k} {v:.2f}s" for k, v in summary.items()))
         
+    capture.close()
+    player.close()
+    print(f"🗂️ Audio cache: {audio_cache.stats()}")
+    if speculator is not None:
+        print(f"🔮 Speculation: {speculator.stats()}")
     print("👋 Chat ended. Goodbye!")
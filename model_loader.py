@@ -0,0 +1,141 @@
+"""
+Fast XTTS loading from memory-mapped weights.
+
+TTS(model_name) unpickles the whole checkpoint into private memory on every
+start. Converting it once to a plain state-dict file lets later starts map
+it instead: torch.load(mmap=True) hands back tensors backed by the page
+cache and load_state_dict(assign=True) makes them the model's parameters,
+so start-up costs page faults rather than deserialization, and every
+process that loads the model shares the same physical pages.
+
+    python model_loader.py --convert      # once, after the model is downloaded
+"""
+import argparse
+import contextlib
+import os
+import re
+import time
+import types
+from inference_profiles import PROFILES
+
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+MODELS_DIR = "models"
+
+
+def mapped_path(model_name=TTS_MODEL, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name.split("/")[-1]) + ".pt")
+
+
+def _model_dir(model_name):
+    """Directory holding config.json / vocab.json / speakers_xtts.pth (downloads the model if needed)."""
+    from TTS.utils.manage import ModelManager
+
+    model_path, _, _ = ModelManager(progress_bar=False).download_model(model_name)
+    return str(model_path) if os.path.isdir(model_path) else os.path.dirname(model_path)
+
+
+@contextlib.contextmanager
+def _skip_init():
+    """
+    Skips random weight initialization while the model is built; every
+    parameter is about to be replaced by a mapped tensor anyway, and
+    untouched torch.empty() storage never becomes resident.
+    """
+    import torch.nn.init as init
+
+    names = ["uniform_", "normal_", "trunc_normal_", "constant_", "zeros_", "ones_", "orthogonal_",
+             "kaiming_uniform_", "kaiming_normal_", "xavier_uniform_", "xavier_normal_"]
+    saved = {name: getattr(init, name) for name in names if hasattr(init, name)}
+    for name in saved:
+        setattr(init, name, lambda tensor, *args, **kwargs: tensor)
+    with contextlib.ExitStack() as stack:
+        try:
+            # The GPT-2 backbone initializes itself through transformers, not torch.nn.init
+            from transformers.modeling_utils import no_init_weights
+            stack.enter_context(no_init_weights())
+        except ImportError:
+            pass
+        try:
+            yield
+        finally:
+            for name, fn in saved.items():
+                setattr(init, name, fn)
+
+
+def convert(model_name=TTS_MODEL, models_dir=MODELS_DIR):
+    """Loads the model the normal way once and writes its weights as a mappable state dict."""
+    import torch
+    from TTS.api import TTS
+
+    model = TTS(model_name=model_name, progress_bar=False, gpu=False).synthesizer.tts_model
+    # gpt.gpt_inference only wraps modules that are already in the dict; it is rebuilt on load
+    state = {k: v.contiguous() for k, v in model.state_dict().items() if not k.startswith("gpt.gpt_inference.")}
+    os.makedirs(models_dir, exist_ok=True)
+    path = mapped_path(model_name, models_dir)
+    torch.save(state, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def load_mapped(model_name=TTS_MODEL, models_dir=MODELS_DIR):
+    """Builds XTTS from the converted weights; returns the Xtts model (eval mode, CPU)."""
+    import torch
+    from TTS.config import load_config
+    from TTS.tts.models.xtts import Xtts
+
+    class MappedXtts(Xtts):
+        # Xtts.load_checkpoint() with the weights mapped and assigned instead of unpickled and copied
+        def get_compatible_checkpoint_state_dict(self, model_path):
+            return torch.load(model_path, mmap=True, weights_only=True, map_location="cpu")
+
+        def load_state_dict(self, state_dict, strict=True, assign=False):
+            return super().load_state_dict(state_dict, strict=strict, assign=True)
+
+    model_dir = _model_dir(model_name)
+    config = load_config(os.path.join(model_dir, "config.json"))
+    with _skip_init():
+        model = MappedXtts(config)
+        model.load_checkpoint(config, checkpoint_dir=model_dir, checkpoint_path=mapped_path(model_name, models_dir),
+                              eval=True)
+    return model
+
+
+def load_tts(model_name=TTS_MODEL, models_dir=MODELS_DIR, profile="fp32", threads=None):
+    """
+    Returns an object with .synthesizer.tts_model, like TTS(model_name), for
+    SpeakerStore: from the mapped weights if they have been converted,
+    otherwise through the regular TTS API. profile is an inference profile
+    from inference_profiles (threads overrides its thread count).
+    """
+    from inference_profiles import apply_profile
+
+    if os.path.exists(mapped_path(model_name, models_dir)):
+        model = load_mapped(model_name, models_dir)
+        tts = types.SimpleNamespace(synthesizer=types.SimpleNamespace(tts_model=model))
+    else:
+        from TTS.api import TTS
+
+        print(f"[Model] No mapped weights in {models_dir}/, loading the full checkpoint "
+              f"(run `python model_loader.py --convert` for faster starts)")
+        tts = TTS(model_name=model_name, progress_bar=False, gpu=False)
+    if profile != "fp32":
+        apply_profile(tts.synthesizer.tts_model, profile, threads)
+    return tts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--convert", action="store_true", help="write the mappable weights file")
+    parser.add_argument("--model", default=TTS_MODEL)
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--profile", choices=PROFILES, default="fp32", help="inference profile to apply after loading")
+    args = parser.parse_args()
+
+    if args.convert:
+        began = time.perf_counter()
+        path = convert(args.model, args.models_dir)
+        print(f"Wrote {path} ({os.path.getsize(path) / 1e6:.0f} MB) in {time.perf_counter() - began:.1f}s")
+    else:
+        began = time.perf_counter()
+        load_tts(args.model, args.models_dir, profile=args.profile)
+        print(f"Loaded {args.model} ({args.profile}) in {time.perf_counter() - began:.1f}s")
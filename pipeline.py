@@ -0,0 +1,176 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+import numpy as np
+from segmenter import SentenceSegmenter
+from text_normalizer import normalize_text
+
+_END = object()
+
+
+class VoicePipeline:
+    """
+    Speaks a streamed LLM reply as a chain of asyncio stages:
+
+        tokens -> segmenter -> normalizer -> synthesis -> playback
+
+    Each stage is its own task and they are connected by bounded queues, so
+    a slow stage pushes back on the ones before it: when max_pending
+    sentences are waiting for synthesis the segmenter stops taking tokens,
+    and the LLM stream is only read as fast as the rest can use it.
+
+    synthesize(clean_text, language) runs on a pool of worker threads (or
+    on executor, e.g. a FairScheduler session) and may return one array, a
+    generator of chunks (streamed, played as they arrive) or None.
+    Sentences are rendered in parallel but played in order, and at most
+    max_chunks float32 chunks per sentence are held in memory. player only
+    needs write(chunk, crossfade), plain or async. Cancelling speak() cancels every stage
+    and stops synthesis after the chunk in progress.
+
+    speak() can be awaited on any loop. For synchronous code, run(coro)
+    starts a private loop on its own thread, so the AsyncClient's
+    connections stay on a single loop.
+    """
+
+    def __init__(self, client, model, synthesize, player, workers=2, max_pending=4, max_chunks=8,
+                 keep_alive=None, normalize=normalize_text, report_ttfa=False, executor=None):
+        self.client = client
+        self.model = model
+        self.synthesize = synthesize
+        self.player = player
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_chunks = max_chunks
+        self.keep_alive = keep_alive
+        self.normalize = normalize
+        self.report_ttfa = report_ttfa
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        self.loop = None
+
+    def run(self, coro):
+        """Runs a coroutine on the pipeline's loop and blocks until it is done (Ctrl+C cancels it)."""
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def speak(self, messages, language="en", on_chunk=None):
+        """
+        Streams a reply to messages and speaks it. Returns the reply text
+        once the last sentence has been handed to the player. on_chunk(chunk)
+        sees every raw chunk of the LLM stream (for printing, usage stats).
+        """
+        tokens = asyncio.Queue(maxsize=64)
+        segments = asyncio.Queue(maxsize=self.max_pending)
+        texts = asyncio.Queue(maxsize=self.max_pending)
+        # One chunk queue per sentence, in play order; its size caps sentences in flight
+        sentences = asyncio.Queue(maxsize=self.workers)
+        cancel = threading.Event()
+        loop = asyncio.get_running_loop()
+        reply = []
+
+        tasks = [
+            asyncio.ensure_future(self._read_tokens(messages, tokens, reply, on_chunk)),
+            asyncio.ensure_future(self._segment(tokens, segments)),
+            asyncio.ensure_future(self._normalize(segments, texts, language)),
+            asyncio.ensure_future(self._synthesize(texts, sentences, language, cancel, loop)),
+            asyncio.ensure_future(self._play(sentences, loop)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            cancel.set()
+            for task in tasks:
+                task.cancel()
+        return "".join(reply)
+
+    async def _read_tokens(self, messages, tokens, reply, on_chunk):
+        stream = await self.client.chat(model=self.model, messages=messages, stream=True, keep_alive=self.keep_alive)
+        async for chunk in stream:
+            content = chunk["message"]["content"]
+            reply.append(content)
+            if on_chunk is not None:
+                on_chunk(chunk)
+            await tokens.put(content)
+        await tokens.put(_END)
+
+    async def _segment(self, tokens, segments):
+        # Segments end at real sentence boundaries (not "3.5" or "Dr."); each token is scanned once
+        segmenter = SentenceSegmenter()
+        while (token := await tokens.get()) is not _END:
+            for sentence in segmenter.feed(token):
+                await segments.put(sentence)
+        for sentence in segmenter.flush():
+            await segments.put(sentence)
+        await segments.put(_END)
+
+    async def _normalize(self, segments, texts, language):
+        while (sentence := await segments.get()) is not _END:
+            clean_text = self.normalize(sentence, language)
+            if len(clean_text) >= 2:
+                await texts.put(clean_text)
+        await texts.put(_END)
+
+    async def _synthesize(self, texts, sentences, language, cancel, loop):
+        seq = 0
+        while (text := await texts.get()) is not _END:
+            chunks = asyncio.Queue(maxsize=self.max_chunks)
+            # Queue the sentence before starting it, so play order is submit order
+            await sentences.put(chunks)
+            loop.run_in_executor(self.executor, self._render, seq, text, language, chunks, cancel, loop,
+                                 time.perf_counter())
+            seq += 1
+        await sentences.put(_END)
+
+    def _render(self, seq, text, language, chunks, cancel, loop, submitted):
+        """Executor side: runs synthesize() and hands its chunks back to the loop."""
+        try:
+            if cancel.is_set():
+                return
+            result = self.synthesize(text, language)
+            pieces = result if hasattr(result, "__next__") else [result]
+            first = True
+            for piece in pieces:
+                if cancel.is_set():
+                    if hasattr(pieces, "close"):
+                        pieces.close()
+                    return
+                if piece is None or len(piece) == 0:
+                    continue
+                if first and self.report_ttfa:
+                    print(f"\n[TTFA] segment {seq}: {time.perf_counter() - submitted:.2f}s after submit")
+                first = False
+                self._put(chunks, np.asarray(piece, dtype=np.float32).reshape(-1), cancel, loop)
+        except Exception as e:
+            print(f"\n[TTS Error] {e}")
+        finally:
+            self._put(chunks, _END, cancel, loop)
+
+    def _put(self, chunks, item, cancel, loop):
+        """Blocking put from a worker thread; gives up once the reply is cancelled."""
+        future = asyncio.run_coroutine_threadsafe(chunks.put(item), loop)
+        while True:
+            try:
+                return future.result(timeout=0.1)
+            except concurrent.futures.TimeoutError:
+                if cancel.is_set():
+                    future.cancel()
+                    return
+
+    async def _play(self, sentences, loop):
+        while (chunks := await sentences.get()) is not _END:
+            # Only crossfade at sentence joins; streamed chunks are contiguous
+            crossfade = True
+            while (chunk := await chunks.get()) is not _END:
+                if asyncio.iscoroutinefunction(self.player.write):
+                    await self.player.write(chunk, crossfade)
+                else:
+                    # write() blocks while the ring buffer is full, so it runs off the loop
+                    await loop.run_in_executor(None, self.player.write, chunk, crossfade)
+                crossfade = False
@@ -0,0 +1,231 @@
+import threading
+import time
+import numpy as np
+import sounddevice as sd
+from audio_buffers import audio_pool
+from resampler import Resampler
+
+
+def native_rate(device=None, fallback=48000):
+    """The output device's default sample rate, or fallback if it can't be queried."""
+    try:
+        return int(sd.query_devices(device, "output")["default_samplerate"])
+    except Exception:
+        return fallback
+
+
+class PlaybackEngine:
+    """
+    Plays audio through one OutputStream that stays open for the whole session.
+
+    Chunks are written into a preallocated float32 ring buffer and the stream
+    callback pulls from it, so there is no per-sentence device setup and no gap
+    between sentences. Consecutive chunks are crossfaded over a few
+    milliseconds to hide clicks at the joins.
+
+    samplerate is the rate of the audio passed to write(). The stream runs
+    at the device's native rate (queried unless device_rate is given) and
+    chunks are resampled on the way in, so the OS mixer never has to; the
+    ring buffer and everything measured in seconds are at device_rate.
+    """
+
+    def __init__(self, samplerate=24000, buffer_seconds=30, crossfade_ms=10, blocksize=0, device=None,
+                 device_rate=None):
+        self.samplerate = samplerate
+        self.device_rate = device_rate or native_rate(device, fallback=samplerate)
+        self.resampler = Resampler(samplerate, self.device_rate) if self.device_rate != samplerate else None
+        self._resample_lock = threading.Lock()
+        self.capacity = int(self.device_rate * buffer_seconds)
+        self.ring = np.zeros(self.capacity, dtype=np.float32)
+        # Monotonic sample counters; ring index is counter % capacity
+        self.read_pos = 0
+        self.write_pos = 0
+        # Times the device reported an underflow, or the ring ran dry in the middle of a reply
+        self.underruns = 0
+        # A reply is in progress from its first write() until drain() or silence(); _dry marks
+        # that the ring emptied since the last write, which is a stall if the reply goes on
+        self._in_reply = False
+        self._dry = False
+        # RMS of the last block sent to the device (barge-in uses it as an echo estimate)
+        self.output_rms = 0.0
+        # write(seq=...) drops chunks numbered below this; see silence()
+        self.min_seq = 0
+        # Called from the audio thread with the start time whenever playback
+        # resumes after silence; keep it cheap
+        self.on_start = None
+        self._idle = True
+
+        fade_len = int(self.device_rate * crossfade_ms / 1000)
+        self.fade_in = np.linspace(0.0, 1.0, fade_len, dtype=np.float32)
+        self.fade_out = self.fade_in[::-1].copy()
+
+        self._cond = threading.Condition()
+        self.stream = sd.OutputStream(
+            samplerate=self.device_rate,
+            device=device,
+            channels=1,
+            dtype="float32",
+            blocksize=blocksize,
+            callback=self._callback,
+        )
+
+    def start(self):
+        self.stream.start()
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+    @property
+    def buffered_seconds(self):
+        """Seconds of audio written but not yet played."""
+        return (self.write_pos - self.read_pos) / self.device_rate
+
+    def write(self, audio, crossfade=True, seq=None):
+        """
+        Appends a chunk, blocking while the ring buffer is full.
+
+        Pass crossfade=False for chunks that continue the previous one
+        sample-for-sample (streamed pieces of the same sentence). With seq,
+        the chunk is dropped (even part-way through) once silence() has
+        cancelled that segment.
+
+        The ring buffer is the only copy made; a chunk from the buffer pool
+        is given back once it is in, so don't keep using it after write().
+        """
+        chunk = audio
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        if len(audio) == 0:
+            audio_pool.give(chunk)
+            return
+        with self._cond:
+            if seq is None or seq >= self.min_seq:
+                if self._dry:
+                    # More of the reply after the ring ran dry: playback stalled waiting for it
+                    self.underruns += 1
+                self._in_reply, self._dry = True, False
+        try:
+            if self.resampler is not None:
+                with self._resample_lock:
+                    resampled = self.resampler.process(audio)
+                audio_pool.give(chunk)
+                chunk = audio = resampled
+            self._write(audio, crossfade, seq)
+        finally:
+            audio_pool.give(chunk)
+
+    def _write(self, audio, crossfade, seq):
+        if len(audio) == 0:
+            return
+        fade_in = 0
+        if crossfade:
+            with self._cond:
+                audio, fade_in = self._crossfade(audio)
+
+        offset = 0
+        while offset < len(audio):
+            with self._cond:
+                while self.write_pos - self.read_pos >= self.capacity:
+                    self._cond.wait()
+                if seq is not None and seq < self.min_seq:
+                    return
+                space = self.capacity - (self.write_pos - self.read_pos)
+                part = audio[offset:offset + space]
+                self._copy_in(self.write_pos, part)
+                if offset < fade_in:
+                    # Fade in from silence inside the ring, so the caller's chunk is never modified
+                    n = min(fade_in - offset, len(part))
+                    idx = (self.write_pos + np.arange(n)) % self.capacity
+                    self.ring[idx] *= self.fade_in[offset:offset + n]
+                self.write_pos += len(part)
+            offset += len(part)
+
+    def drain(self):
+        """Blocks until everything written so far has been played; this ends the reply."""
+        with self._cond:
+            # Running dry from here on is the end of the reply, not a stall
+            self._in_reply, self._dry = False, False
+        if self.resampler is not None:
+            # The resampler holds back a few samples of the last chunk; play those
+            # too unless the ring has already run dry (they'd only add a blip)
+            with self._resample_lock:
+                tail = self.resampler.flush()
+            try:
+                if self.write_pos > self.read_pos:
+                    self._write(tail, False, None)
+            finally:
+                audio_pool.give(tail)
+        with self._cond:
+            while self.write_pos > self.read_pos:
+                self._cond.wait()
+
+    def silence(self, fade_ms=30, drop_before=None):
+        """
+        Stops playback within fade_ms: the next fade_ms of buffered audio is
+        faded to zero and the rest is discarded. If drop_before is given,
+        later write() calls for segments numbered below it are ignored.
+        Returns the seconds of audio that were discarded.
+        """
+        with self._cond:
+            if drop_before is not None:
+                self.min_seq = max(self.min_seq, drop_before)
+            self._in_reply, self._dry = False, False
+            pending = self.write_pos - self.read_pos
+            n = min(pending, int(self.device_rate * fade_ms / 1000))
+            if n:
+                idx = (self.read_pos + np.arange(n)) % self.capacity
+                self.ring[idx] *= np.linspace(1.0, 0.0, n, dtype=np.float32)
+            self.write_pos = self.read_pos + n
+            self._cond.notify_all()
+        if self.resampler is not None:
+            with self._resample_lock:
+                self.resampler.reset()
+        return (pending - n) / self.device_rate
+
+    def _crossfade(self, audio):
+        """
+        Overlaps the head of a new chunk with the unplayed tail of the last
+        one. Returns the part still to write and how many of its samples
+        need fading in from silence.
+        """
+        n = min(len(self.fade_in), len(audio))
+        pending = self.write_pos - self.read_pos
+        if pending < n:
+            # The previous chunk already finished playing; just fade in from silence
+            return audio, n
+
+        start = (self.write_pos - n) % self.capacity
+        idx = (start + np.arange(n)) % self.capacity
+        self.ring[idx] = self.ring[idx] * self.fade_out[-n:] + audio[:n] * self.fade_in[:n]
+        return audio[n:], 0
+
+    def _copy_in(self, pos, data):
+        start = pos % self.capacity
+        first = min(len(data), self.capacity - start)
+        self.ring[start:start + first] = data[:first]
+        self.ring[:len(data) - first] = data[first:]
+
+    def _callback(self, outdata, frames, time_info, status):
+        if status.output_underflow:
+            self.underruns += 1
+
+        with self._cond:
+            available = min(frames, self.write_pos - self.read_pos)
+            start = self.read_pos % self.capacity
+            first = min(available, self.capacity - start)
+            outdata[:first, 0] = self.ring[start:start + first]
+            outdata[first:available, 0] = self.ring[:available - first]
+            outdata[available:, 0] = 0.0
+            self.output_rms = float(np.sqrt(np.mean(np.square(outdata[:, 0])))) if available else 0.0
+
+            # Ran dry (part-way through this block or before it) with the reply still going;
+            # write() counts it once the rest arrives, so the natural end of a reply never does
+            if available < frames and self._in_reply:
+                self._dry = True
+
+            self.read_pos += available
+            self._cond.notify_all()
+
+        if available and self._idle and self.on_start is not None:
+            self.on_start(time.perf_counter())
+        self._idle = available < frames
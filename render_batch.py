@@ -0,0 +1,275 @@
+"""
+Renders a batch of texts or LLM prompts to audio files, for announcements
+and FAQ answers that should be ready before anyone asks.
+
+The input is a .txt file (one item per non-empty line) or a .jsonl file of
+{"id", "text" or "prompt", "speaker", "language"} objects. Prompts are
+answered by Ollama first, at most --llm-concurrency at a time, while
+earlier items are already being synthesized on --workers threads. Each
+file is written sentence by sentence as it is synthesized, so no more
+than one sentence of audio per worker is held in memory.
+
+Finished items are listed in <out>/manifest.jsonl; run the same command
+again to resume an interrupted job, and only the missing items are done.
+LLM replies are kept in <out>/<id>.txt, so a resumed item isn't asked again.
+
+    python render_batch.py announcements.txt --out renders/announcements
+    python render_batch.py faq.txt --prompts --llm-concurrency 2 --workers 2
+    python render_batch.py faq.jsonl --format flac --rate 48000
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import re
+import threading
+import time
+from audio_cache import AudioCache
+from audio_sinks import FileSink
+from inference_profiles import PROFILES
+from segmenter import SentenceSegmenter
+from silence_trim import SilenceTrimmer
+from text_normalizer import normalize_text
+
+# --- CONFIGURATION ---
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+MODEL_NAME = "emma"              # Ollama model that answers prompts
+SPEAKER = "Ana Florence"         # Voice for items that don't pick one
+SAMPLE_RATE = 24000              # Native XTTS v2 sample rate
+TTS_WORKERS = 2                  # Files synthesized at once
+LLM_CONCURRENCY = 1              # Prompts answered at once
+AUDIO_CACHE_MB = 64              # Sentences repeated across items are synthesized once
+SYSTEM_PROMPT = "You are Emma. Answer clearly in a few sentences; your reply will be read aloud."
+KEEP_ALIVE = "30m"
+# ---------------------
+
+
+class Item:
+    def __init__(self, id, text=None, prompt=None, speaker=SPEAKER, language="en"):
+        self.id = id
+        self.text = text
+        self.prompt = prompt
+        self.speaker = speaker
+        self.language = language
+
+
+def load_items(path, prompts=False):
+    """Items from a .txt (one per line) or .jsonl file; plain lines are prompts if prompts is set."""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    for n, line in enumerate(lines, 1):
+        if not line:
+            continue
+        if path.endswith(".jsonl"):
+            record = json.loads(line)
+            item = Item(str(record.get("id") or f"item-{n:04d}"), record.get("text"), record.get("prompt"),
+                        record.get("speaker", SPEAKER), record.get("language", "en"))
+            if (item.text is None) == (item.prompt is None):
+                raise ValueError(f"{path}:{n}: give exactly one of text or prompt")
+        elif prompts:
+            item = Item(f"item-{n:04d}", prompt=line)
+        else:
+            item = Item(f"item-{n:04d}", text=line)
+        item.id = re.sub(r"[^A-Za-z0-9_.-]+", "_", item.id)
+        items.append(item)
+    if len({item.id for item in items}) != len(items):
+        raise ValueError(f"{path}: item ids must be unique")
+    return items
+
+
+def sentences(text):
+    # Nothing is waiting for the first word, so the first segment doesn't need to be short
+    segmenter = SentenceSegmenter(first_min_chars=40, first_max_chars=250)
+    return segmenter.feed(text) + segmenter.flush()
+
+
+class BatchRenderer:
+    """
+    Renders items into out_dir with a synthesizer from connect_synthesizer()
+    (daemon, process pool or in-process model). render() does one file on
+    the calling thread; run() does a whole batch and returns its totals.
+    """
+
+    def __init__(self, speakers, out_dir, workers=TTS_WORKERS, llm_concurrency=LLM_CONCURRENCY, client=None,
+                 model=MODEL_NAME, fmt="wav", rate=None, audio_cache=None):
+        self.speakers = speakers
+        self.out_dir = out_dir
+        self.workers = workers
+        self.llm_concurrency = llm_concurrency
+        self.client = client
+        self.model = model
+        self.fmt = fmt
+        self.rate = rate
+        self.audio_cache = audio_cache
+        self.trimmer = SilenceTrimmer(SAMPLE_RATE)
+        self.manifest_path = os.path.join(out_dir, "manifest.jsonl")
+        self._manifest_lock = threading.Lock()
+        os.makedirs(out_dir, exist_ok=True)
+
+    def path(self, item, ext=None):
+        return os.path.join(self.out_dir, f"{item.id}.{ext or self.fmt}")
+
+    def done(self):
+        """Ids finished by earlier runs whose files are still there."""
+        finished = set()
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        if os.path.exists(os.path.join(self.out_dir, record["file"])):
+                            finished.add(record["id"])
+        return finished
+
+    async def text_for(self, item, llm_slots):
+        if item.text is not None:
+            return item.text
+        saved = self.path(item, "txt")
+        if os.path.exists(saved):
+            with open(saved, encoding="utf-8") as f:
+                return f.read()
+        async with llm_slots:
+            response = await self.client.chat(
+                model=self.model,
+                messages=[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": item.prompt}],
+                keep_alive=KEEP_ALIVE,
+            )
+        text = response["message"]["content"].strip()
+        with open(saved + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(saved + ".tmp", saved)
+        return text
+
+    def synthesize(self, clean_text, item):
+        cached = self.audio_cache.get(clean_text, item.speaker, item.language) if self.audio_cache else None
+        if cached is not None:
+            return cached
+        audio = self.speakers.tts(clean_text, item.speaker, item.language)
+        if self.audio_cache is not None:
+            self.audio_cache.put(clean_text, item.speaker, item.language, audio)
+        return audio
+
+    def render(self, item, text):
+        """Writes item's audio to its file, one sentence at a time; returns its manifest record."""
+        started = time.perf_counter()
+        final = self.path(item)
+        # The extension picks the file format, so the partial file keeps it
+        partial = os.path.join(self.out_dir, f"{item.id}.partial.{self.fmt}")
+        sink = FileSink(partial, SAMPLE_RATE, rate=self.rate)
+        try:
+            for sentence in sentences(text):
+                clean_text = normalize_text(sentence, item.language)
+                if len(clean_text) < 2:
+                    continue
+                sink.write(self.trimmer.trim(self.synthesize(clean_text, item), clean_text))
+        finally:
+            sink.close()
+        os.replace(partial, final)
+        elapsed = time.perf_counter() - started
+        record = {
+            "id": item.id,
+            "file": os.path.basename(final),
+            "text": text,
+            "speaker": item.speaker,
+            "language": item.language,
+            "seconds": round(sink.seconds, 3),
+            "synth_seconds": round(elapsed, 3),
+            "rtf": round(elapsed / sink.seconds, 3) if sink.seconds else None,
+        }
+        with self._manifest_lock, open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+    async def run(self, items, on_item=None):
+        """Renders items that aren't done yet; returns totals for the batch."""
+        finished = self.done()
+        pending = [item for item in items if item.id not in finished]
+        loop = asyncio.get_running_loop()
+        llm_slots = asyncio.Semaphore(self.llm_concurrency)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+        records, failures = [], []
+
+        async def one(item):
+            try:
+                text = await self.text_for(item, llm_slots)
+                record = await loop.run_in_executor(executor, self.render, item, text)
+            except Exception as e:
+                failures.append(item.id)
+                print(f"[Render Error] {item.id}: {e}")
+                return
+            records.append(record)
+            if on_item is not None:
+                on_item(record, len(records), len(pending))
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(one(item) for item in pending))
+        finally:
+            executor.shutdown(wait=True)
+        wall = time.perf_counter() - started
+        audio = sum(r["seconds"] for r in records)
+        synth = sum(r["synth_seconds"] for r in records)
+        return {
+            "items": len(records),
+            "skipped": len(items) - len(pending),
+            "failed": len(failures),
+            "wall_seconds": round(wall, 2),
+            "items_per_minute": round(len(records) / wall * 60, 2) if wall else 0.0,
+            "audio_seconds": round(audio, 2),
+            # Per-item synthesis time over audio produced; below 1 means faster than real time per worker
+            "rtf": round(synth / audio, 3) if audio else None,
+            "audio_x_realtime": round(audio / wall, 2) if wall else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help=".txt (one item per line) or .jsonl file")
+    parser.add_argument("--out", help="output directory (default: renders/<input name>)")
+    parser.add_argument("--prompts", action="store_true", help="lines of a .txt file are prompts for the LLM")
+    parser.add_argument("--model", default=MODEL_NAME, help="Ollama model for prompts")
+    parser.add_argument("--workers", type=int, default=TTS_WORKERS, help="files synthesized at once")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="run XTTS in this many worker processes, each on its own CPU cores")
+    parser.add_argument("--profile", choices=PROFILES, default="fp32", help="CPU inference profile (see inference_profiles.py)")
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY, help="prompts answered at once")
+    parser.add_argument("--format", choices=["wav", "flac"], default="wav")
+    parser.add_argument("--rate", type=int, help=f"output sample rate (default: {SAMPLE_RATE}, no resampling)")
+    parser.add_argument("--json", action="store_true", help="print the totals as JSON")
+    args = parser.parse_args()
+
+    items = load_items(args.input, args.prompts)
+    out_dir = args.out or os.path.join("renders", os.path.splitext(os.path.basename(args.input))[0])
+
+    client = None
+    if any(item.prompt is not None for item in items):
+        import ollama
+        client = ollama.AsyncClient()
+    from tts_daemon import connect_synthesizer
+
+    print("Loading Emma's voice engine (XTTS v2)...")
+    speakers = connect_synthesizer(TTS_MODEL, processes=args.processes, profile=args.profile)
+    audio_cache = AudioCache(TTS_MODEL, max_memory_mb=AUDIO_CACHE_MB, profile=speakers.profile)
+    renderer = BatchRenderer(speakers, out_dir, workers=max(args.workers, args.processes),
+                             llm_concurrency=args.llm_concurrency, client=client, model=args.model, fmt=args.format,
+                             rate=args.rate, audio_cache=audio_cache)
+
+    def progress(record, done, total):
+        print(f"[{done}/{total}] {record['file']}  {record['seconds']:.1f}s audio, RTF {record['rtf']}")
+
+    totals = asyncio.run(renderer.run(items, on_item=progress))
+    if args.json:
+        print(json.dumps(totals))
+    else:
+        print(f"\n{totals['items']} rendered, {totals['skipped']} already done, {totals['failed']} failed "
+              f"in {totals['wall_seconds']}s -> {out_dir}/")
+        print(f"{totals['items_per_minute']} items/min, {totals['audio_seconds']}s of audio, "
+              f"RTF {totals['rtf']} per worker, {totals['audio_x_realtime']}x real time overall")
+    if hasattr(speakers, "close"):
+        speakers.close()
+
+
+if __name__ == "__main__":
+    main()
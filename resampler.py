@@ -0,0 +1,138 @@
+"""
+Streaming polyphase resampling between any two integer sample rates.
+
+rate_out / rate_in is reduced to L / M; the input is conceptually upsampled
+by L, low-pass filtered with one Kaiser-windowed sinc and decimated by M.
+Only the filter taps that meet nonzero input samples are ever evaluated:
+the filter is stored as L phases of `taps` coefficients, and the outputs
+that share a phase read input windows spaced M samples apart, so each
+phase is one matrix-vector product over a strided window view.
+
+The last `taps` input samples are carried from one process() call to the
+next, so feeding a clip in chunks gives the same samples as feeding it
+whole. Output lags the input by taps / 2 input samples; flush() returns
+the tail.
+"""
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from audio_buffers import audio_pool
+
+
+def _kaiser_sinc(length, center, cutoff, beta):
+    """Low-pass prototype: cutoff in cycles per sample, centered on `center`."""
+    k = np.arange(length) - center
+    window = np.i0(beta * np.sqrt(np.clip(1.0 - (k / center) ** 2, 0.0, None))) / np.i0(beta)
+    return 2 * cutoff * np.sinc(2 * cutoff * k) * window
+
+
+class Resampler:
+    """
+    Converts float32 mono audio from rate_in to rate_out, chunk by chunk.
+
+    taps is the filter length per output sample at the lower of the two
+    rates (it grows with the decimation factor when downsampling); rolloff
+    puts the cutoff at that fraction of the lower Nyquist frequency. The
+    defaults keep images and aliases about 60 dB down, plenty for speech.
+    """
+
+    def __init__(self, rate_in, rate_out, taps=32, rolloff=0.85, beta=6.0):
+        self.rate_in = int(rate_in)
+        self.rate_out = int(rate_out)
+        g = math.gcd(self.rate_in, self.rate_out)
+        self.up, self.down = self.rate_out // g, self.rate_in // g
+        L, M = self.up, self.down
+
+        self.taps = taps * max(1, -(-M // L))
+        length = self.taps * L
+        self._center = length // 2
+        h = _kaiser_sinc(length, self._center, 0.5 * rolloff / max(L, M), beta)
+        h *= L / h.sum()  # unity gain at DC after zero-stuffing by L
+        # bank[p, j] weighs input sample i - j for phase p; reversed so it lines up with a window of oldest..newest
+        self._bank = h.reshape(self.taps, L).T[:, ::-1].astype(np.float32).copy()
+        self.reset()
+
+    @property
+    def passthrough(self):
+        return self.up == self.down
+
+    @property
+    def delay(self):
+        """Seconds the output lags the input."""
+        return 0.0 if self.passthrough else self._center / self.up / self.rate_in
+
+    def reset(self):
+        """Forgets buffered input, e.g. when playback is cut off."""
+        self._buf = np.zeros(self.taps - 1, dtype=np.float32)
+        self._start = -(self.taps - 1)  # input index of _buf[0]; the history before the first sample is silence
+        self._received = 0
+        self._produced = 0
+
+    def process(self, audio):
+        """
+        Returns the output samples that audio completes, as an array from
+        the buffer pool (give it back when done; see audio_buffers).
+        """
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        if self.passthrough:
+            out = audio_pool.take(len(audio))
+            out[:] = audio
+            return out
+        self._buf = np.concatenate([self._buf, audio])
+        self._received += len(audio)
+        # Output n needs inputs up to (n * M + center) // L
+        end = (self._received * self.up - self._center + self.down - 1) // self.down
+        return self._run(end)
+
+    def flush(self):
+        """Returns the delayed tail of everything fed so far and resets."""
+        if self.passthrough:
+            return audio_pool.take(0)
+        self._buf = np.concatenate([self._buf, np.zeros(self.taps, dtype=np.float32)])
+        out = self._run(-(-self._received * self.up // self.down))
+        self.reset()
+        return out
+
+    def _run(self, end):
+        L, M = self.up, self.down
+        first = self._produced
+        count = max(0, end - first)
+        if count == 0:
+            # Nothing new yet (an empty or one-sample chunk), and _buf may be shorter than one window.
+            # Any output needs a full window of input, so past here _buf holds at least taps samples.
+            return audio_pool.take(0)
+        out = audio_pool.take(count)
+        windows = sliding_window_view(self._buf, self.taps)
+        if count >= 32 * L:
+            # Outputs first + r, first + r + L, ... share a phase and step M inputs at a time
+            for r in range(L):
+                d = (first + r) * M + self._center
+                newest = d // L - self._start
+                rows = windows[newest - self.taps + 1::M][:(count - r + L - 1) // L]
+                out[r::L] = rows @ self._bank[d % L]
+        elif count:
+            # Too few outputs per phase to be worth a loop over phases (small chunks, large L)
+            d = np.arange(first, first + count, dtype=np.int64) * M + self._center
+            rows = windows[d // L - self._start - self.taps + 1]
+            np.einsum("ij,ij->i", rows, self._bank[d % L], out=out)
+
+        self._produced = first + count
+        keep = (self._produced * M + self._center) // L - self.taps + 1
+        keep = min(keep, self._start + len(self._buf))
+        if keep > self._start:
+            self._buf = self._buf[keep - self._start:]
+            self._start = keep
+        return out
+
+
+def resample(audio, rate_in, rate_out, **options):
+    """Resamples a whole clip (float32 in, new float32 array out, same duration)."""
+    audio = np.asarray(audio, dtype=np.float32)
+    if int(rate_in) == int(rate_out):
+        return audio.copy()
+    resampler = Resampler(rate_in, rate_out, **options)
+    head, tail = resampler.process(audio), resampler.flush()
+    out = np.concatenate([head, tail])
+    audio_pool.give(head)
+    audio_pool.give(tail)
+    return out
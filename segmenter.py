@@ -0,0 +1,176 @@
+import re
+
+# Words that end in a period without ending the sentence ("Dr. Smith", "e.g. this")
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "mt",
+    "e.g", "i.e", "approx", "no", "fig", "inc", "ltd", "co", "dept",
+}
+SENTENCE_END = ".!?"
+CLAUSE_END = ",;:"
+CLOSERS = "\"')]”’"
+FENCE = "```"
+LIST_MARKER = re.compile(r'^(?:[-*•]|\d+[.)])\s+')
+
+
+class SentenceSegmenter:
+    """
+    Splits a streamed LLM reply into speakable segments as the tokens arrive.
+
+    Each character is examined once, no matter how the reply is chunked.
+    Periods in decimals ("3.5"), abbreviations ("Dr.", "e.g.") and list
+    markers ("1. ") don't end a segment, and fenced code blocks are dropped
+    since they can't be spoken.
+
+    The first segment is allowed to end at a comma once it has
+    first_min_chars, and is cut by first_max_chars, so the first audio
+    starts quickly. Later segments merge short sentences up to min_chars and
+    are cut at max_chars, which keeps the TTS working on longer inputs.
+    """
+
+    def __init__(self, min_chars=40, max_chars=250, first_min_chars=12, first_max_chars=80):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.first_min_chars = first_min_chars
+        self.first_max_chars = first_max_chars
+        self.buffer = ""
+        self.pos = 0          # next index in buffer to examine
+        self.in_code = False
+        self.count = 0        # segments emitted so far
+
+    def feed(self, delta):
+        """Adds a token delta and returns any segments it completed."""
+        self.buffer += delta
+        out = []
+        while True:
+            if self.in_code:
+                if not self._skip_code():
+                    break
+                continue
+            segment = self._scan()
+            if segment is None:
+                break
+            if segment:
+                out.append(segment)
+        return out
+
+    def flush(self):
+        """Returns whatever is left at the end of the stream."""
+        if self.in_code:
+            self.buffer = ""
+        rest = self._clean(self.buffer)
+        self.buffer = ""
+        self.pos = 0
+        self.in_code = False
+        if not rest:
+            return []
+        self.count += 1
+        return [rest]
+
+    def _scan(self):
+        """
+        Advances through the buffer until a segment ends.
+
+        Returns the segment text ("" if it was empty after cleaning), or None
+        when more input is needed.
+        """
+        if self.pos == 0:
+            # Segments never start with whitespace, so lengths below are just indices
+            self.buffer = self.buffer.lstrip()
+        buf = self.buffer
+        first = self.count == 0
+        min_len = self.first_min_chars if first else self.min_chars
+        max_len = self.first_max_chars if first else self.max_chars
+
+        i = self.pos
+        n = len(buf)
+        while i < n:
+            c = buf[i]
+
+            if c == "`":
+                if n - i < 3:
+                    break  # might be a fence split across deltas
+                if buf.startswith(FENCE, i):
+                    self.in_code = True
+                    self.buffer = buf[i + 3:]
+                    self.pos = 0
+                    return self._emit(buf[:i])
+
+            elif c == "\n":
+                if i > 0:
+                    return self._cut(i + 1)
+
+            elif c in SENTENCE_END:
+                j = i + 1
+                while j < n and buf[j] in SENTENCE_END:
+                    j += 1
+                while j < n and buf[j] in CLOSERS:
+                    j += 1
+                if j >= n:
+                    break  # need the next character to decide
+                if buf[j].isspace() and not (c == "." and j == i + 1 and self._is_non_terminal(buf, i)):
+                    if j >= min_len:
+                        return self._cut(j)
+                i = j
+                continue
+
+            elif c in CLAUSE_END and first:
+                if i + 1 >= n:
+                    break
+                if buf[i + 1].isspace() and i + 1 >= min_len:
+                    return self._cut(i + 1)
+
+            i += 1
+            if i >= max_len:
+                return self._cut(self._split_point(buf, i))
+
+        self.pos = i
+        return None
+
+    def _skip_code(self):
+        """Drops fenced code. Returns True once the closing fence is consumed."""
+        end = self.buffer.find(FENCE)
+        if end < 0:
+            # Keep a possible partial fence at the end
+            self.buffer = self.buffer[-2:]
+            return False
+        self.buffer = self.buffer[end + 3:]
+        self.pos = 0
+        self.in_code = False
+        return True
+
+    def _is_non_terminal(self, buf, i):
+        """True if the period at buf[i] belongs to an abbreviation, initial or list marker."""
+        start = i
+        while start > 0 and not buf[start - 1].isspace():
+            start -= 1
+        token = buf[start:i].lstrip("(\"'")
+        if token.lower() in ABBREVIATIONS:
+            return True
+        if len(token) == 1 and token.isupper():
+            return True
+        # "1. " at the start of a line is a list marker, not the end of a sentence
+        at_line_start = start == 0 or buf[start - 1] == "\n"
+        return token.isdigit() and at_line_start
+
+    def _split_point(self, buf, limit):
+        """Best place to break an over-long segment: last clause, else last space."""
+        for chars in (CLAUSE_END, " "):
+            best = max(buf.rfind(ch, 0, limit) for ch in chars)
+            if best > 0:
+                return best + 1
+        return limit
+
+    def _cut(self, end):
+        segment = self.buffer[:end]
+        self.buffer = self.buffer[end:]
+        self.pos = 0
+        return self._emit(segment)
+
+    def _emit(self, text):
+        text = self._clean(text)
+        if text:
+            self.count += 1
+        return text
+
+    def _clean(self, text):
+        return LIST_MARKER.sub("", text.strip())
@@ -0,0 +1,163 @@
+"""
+Trims the near-silence XTTS pads each sentence with and puts a pause
+chosen by the sentence's final punctuation in its place.
+
+Speech is found from short-window RMS: every frame_ms frame louder than
+threshold_db (dBFS) counts as speech, and margin_ms is kept on both sides
+of the first and last loud frame so soft onsets and decays survive. All
+of it is a reshape and a reduction per clip or chunk, no Python loop
+over samples.
+"""
+import functools
+import numpy as np
+from audio_buffers import audio_pool
+
+# Pause after a segment, by its last punctuation mark (the segmenter ends the first segment at a comma)
+PAUSES_MS = {",": 120, ";": 160, ":": 160, ".": 260, "!": 260, "?": 300, "...": 380, "…": 380}
+DEFAULT_PAUSE_MS = 200
+CLOSERS = "\"')]”’ \t\n"
+
+
+def pause_ms(text, pauses=PAUSES_MS, default=DEFAULT_PAUSE_MS):
+    text = text.rstrip(CLOSERS)
+    for mark in sorted(pauses, key=len, reverse=True):
+        if text.endswith(mark):
+            return pauses[mark]
+    return default
+
+
+def loud_frames(audio, frame, threshold):
+    """Boolean per frame (the last one may be short): RMS above threshold."""
+    n = len(audio) // frame * frame
+    frames = audio[:n].reshape(-1, frame)
+    power = np.einsum("ij,ij->i", frames, frames) / frame
+    if n < len(audio):
+        rest = audio[n:]
+        power = np.append(power, np.dot(rest, rest) / len(rest))
+    return power > threshold * threshold
+
+
+class SilenceTrimmer:
+    """
+    Post-processing for synthesized sentences: apply(result, text) takes
+    what a synthesize function returns (an array, None, or a generator of
+    streamed chunks) and gives back the same kind of thing, trimmed.
+
+    Streamed chunks pass through as soon as they are known to contain
+    speech; silence after the last loud frame is held back until more
+    speech arrives, and dropped at the end of the sentence. Output arrays
+    come from the buffer pool, like streamed chunks already do.
+    """
+
+    def __init__(self, samplerate=24000, pauses=None, default_pause_ms=DEFAULT_PAUSE_MS, frame_ms=10,
+                 threshold_db=-45.0, margin_ms=30, enabled=True):
+        self.samplerate = samplerate
+        self.pauses = PAUSES_MS if pauses is None else pauses
+        self.default_pause_ms = default_pause_ms
+        self.frame = max(1, int(samplerate * frame_ms / 1000))
+        self.threshold = 10 ** (threshold_db / 20)
+        self.margin = int(samplerate * margin_ms / 1000)
+        self.enabled = enabled
+        self.trimmed_samples = 0  # silence removed so far, before pauses are added back
+
+    def pause_samples(self, text):
+        return int(self.samplerate * pause_ms(text, self.pauses, self.default_pause_ms) / 1000)
+
+    def wrap(self, synthesize):
+        """synthesize(text, ...) with its results trimmed; text's final punctuation picks the pause."""
+        @functools.wraps(synthesize)
+        def trimmed(text, *args, **kwargs):
+            return self.apply(synthesize(text, *args, **kwargs), text)
+        return trimmed
+
+    def apply(self, result, text):
+        if not self.enabled or result is None:
+            return result
+        if hasattr(result, "__next__"):
+            return self.stream(result, text)
+        return self.trim(result, text)
+
+    def speech_bounds(self, audio):
+        """(start, end) of the speech in audio with margins, or None if it is all silence."""
+        loud = np.flatnonzero(loud_frames(audio, self.frame, self.threshold))
+        if len(loud) == 0:
+            return None
+        start = max(0, int(loud[0]) * self.frame - self.margin)
+        end = min(len(audio), (int(loud[-1]) + 1) * self.frame + self.margin)
+        return start, end
+
+    def trim(self, audio, text):
+        """Returns a new array: the speech in audio followed by the pause for text."""
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        start, end = self.speech_bounds(audio) or (0, 0)
+        pause = self.pause_samples(text)
+        out = audio_pool.take(end - start + pause)
+        out[:end - start] = audio[start:end]
+        out[end - start:] = 0.0
+        self.trimmed_samples += len(audio) - (end - start)
+        return out
+
+    def stream(self, chunks, text):
+        held = []       # arrays not yet passed on: silence that may turn out to be a pause inside the sentence
+        owed = 0        # margin after the last loud frame that fell past the end of its chunk
+        started = False
+        for chunk in chunks:
+            chunk = np.asarray(chunk, dtype=np.float32).reshape(-1)
+            loud = np.flatnonzero(loud_frames(chunk, self.frame, self.threshold))
+            if len(loud) == 0:
+                held.append(chunk)
+                continue
+            end = (int(loud[-1]) + 1) * self.frame + self.margin
+            cut, owed = min(len(chunk), end), max(0, end - len(chunk))
+            if not started:
+                onset = int(loud[0]) * self.frame
+                start = max(0, onset - self.margin)
+                # Keep up to margin of the silence before the onset, even from earlier chunks
+                lead = self._tail(held, self.margin - onset)
+                self.trimmed_samples += sum(len(h) for h in held) + start - (len(lead) if lead is not None else 0)
+                self._release(held)
+                held = [lead] if lead is not None else []
+                started = True
+            else:
+                start = 0
+            # Anything after the cut stays here until we know it isn't the end of the sentence;
+            # it is copied because the part that goes ahead is given back to the pool once played
+            rest = chunk[cut:].copy() if cut < len(chunk) else None
+            yield from held
+            held = []
+            yield chunk[start:cut]
+            if rest is not None:
+                held.append(rest)
+
+        if started:
+            tail = self._head(held, owed)
+            if tail is not None:
+                yield tail
+            self.trimmed_samples += sum(len(h) for h in held) - (len(tail) if tail is not None else 0)
+        else:
+            self.trimmed_samples += sum(len(h) for h in held)
+        self._release(held)
+        pause = audio_pool.take(self.pause_samples(text))
+        pause.fill(0.0)
+        yield pause
+
+    @staticmethod
+    def _release(arrays):
+        for a in arrays:
+            audio_pool.give(a)
+
+    @staticmethod
+    def _tail(arrays, n):
+        """Copy of the last n samples across arrays (fewer if they are shorter), or None."""
+        if n <= 0 or not arrays:
+            return None
+        joined = np.concatenate(arrays)[-n:]
+        return joined if len(joined) else None
+
+    @staticmethod
+    def _head(arrays, n):
+        """Copy of the first n samples across arrays, or None."""
+        if n <= 0 or not arrays:
+            return None
+        joined = np.concatenate(arrays)[:n]
+        return joined if len(joined) else None
@@ -0,0 +1,177 @@
+import os
+import re
+import sys
+import threading
+import numpy as np
+import torch
+
+CATALOG_FILE = "Voice_models"
+CACHE_DIR = "speaker_cache"
+
+
+def read_catalog(path=CATALOG_FILE):
+    """Returns the quoted speaker names listed in the Voice_models file."""
+    with open(path, encoding="utf-8") as f:
+        return re.findall(r'"([^"]+)"', f.read())
+
+
+def _slug(name):
+    return re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_').lower()
+
+
+class SpeakerStore:
+    """
+    Precomputed XTTS v2 conditioning for every voice we use.
+
+    The GPT conditioning latents and speaker embedding for each voice are
+    computed once, saved as .npy files and loaded back memory-mapped, so
+    synthesis goes straight to model.inference() and never re-runs
+    conditioning. Once a voice is loaded, switching to it is a dict lookup.
+    """
+
+    def __init__(self, tts, cache_dir=CACHE_DIR, profile="fp32"):
+        self.model = tts.synthesizer.tts_model
+        self.profile = profile  # inference profile tts was loaded with; audio caches key on it
+        self.cache_dir = cache_dir
+        self._speakers = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def load_catalog(self, path=CATALOG_FILE):
+        """Loads (computing on first run) every voice in the catalog file."""
+        for name in read_catalog(path):
+            try:
+                self.get(name)
+            except KeyError:
+                print(f"[Speaker Store] '{name}' is not a built-in XTTS speaker, skipping")
+
+    def add_reference(self, name, wav_paths):
+        """Registers a custom voice cloned from one or more reference WAVs."""
+        if isinstance(wav_paths, str):
+            wav_paths = [wav_paths]
+        with self._lock:
+            newest_wav = max(os.path.getmtime(p) for p in wav_paths)
+            cached = self._load(name, newer_than=newest_wav)
+            if cached is None:
+                gpt_cond_latent, speaker_embedding = self.model.get_conditioning_latents(audio_path=wav_paths)
+                cached = self._save(name, gpt_cond_latent, speaker_embedding)
+            self._speakers[name] = cached
+        return cached
+
+    def get(self, name):
+        """Returns (gpt_cond_latent, speaker_embedding) for a voice."""
+        latents = self._speakers.get(name)
+        if latents is not None:
+            return latents
+
+        with self._lock:
+            if name in self._speakers:
+                return self._speakers[name]
+            latents = self._load(name)
+            if latents is None:
+                builtin = self.model.speaker_manager.speakers[name]
+                latents = self._save(name, builtin["gpt_cond_latent"], builtin["speaker_embedding"])
+            self._speakers[name] = latents
+        return latents
+
+    def tts(self, text, speaker, language="en"):
+        """Synthesizes text with a cached voice, skipping speaker conditioning. Returns float32 samples."""
+        gpt_cond_latent, speaker_embedding = self.get(speaker)
+        out = self.model.inference(text, language, gpt_cond_latent, speaker_embedding)
+        return np.asarray(out["wav"], dtype=np.float32)
+
+    def tts_batch(self, requests):
+        """
+        Synthesizes several (text, speaker, language) requests at once.
+
+        The autoregressive GPT decode, which is most of the work, runs as a
+        single batch: conditioning latents are stacked and shorter texts are
+        padded with the stop-text token. The GPT latent pass and the HiFi-GAN
+        decoder then run per request. Sampling settings are the same as
+        model.inference()'s defaults, so tts() and tts_batch() sound alike.
+        """
+        if len(requests) == 1:
+            return [self.tts(*requests[0])]
+        model, gpt = self.model, self.model.gpt
+        tokens, voices = [], []
+        for text, speaker, language in requests:
+            ids = model.tokenizer.encode(text.strip().lower(), lang=language.split("-")[0])
+            tokens.append(torch.IntTensor(ids))
+            voices.append(tuple(t.to(model.device) for t in self.get(speaker)))
+
+        text_inputs = torch.nn.utils.rnn.pad_sequence(tokens, batch_first=True, padding_value=gpt.stop_text_token)
+        with torch.no_grad():
+            codes = gpt.generate(
+                cond_latents=torch.cat([latent for latent, _ in voices]),
+                text_inputs=text_inputs.to(model.device),
+                do_sample=True, top_p=0.85, top_k=50, temperature=0.75,
+                num_return_sequences=1, num_beams=1, length_penalty=1.0, repetition_penalty=10.0,
+                output_attentions=False,
+            )
+            wavs = []
+            for row, ids, (gpt_cond_latent, speaker_embedding) in zip(codes, tokens, voices):
+                # Rows that finished early are padded with the stop token; keep the first one
+                stops = (row == gpt.stop_audio_token).nonzero()
+                row = row[: int(stops[0]) + 1] if len(stops) else row
+                text_tokens = ids.unsqueeze(0).to(model.device)
+                latents = gpt(
+                    text_tokens,
+                    torch.tensor([text_tokens.shape[-1]], device=model.device),
+                    row.unsqueeze(0),
+                    torch.tensor([len(row) * gpt.code_stride_len], device=model.device),
+                    cond_latents=gpt_cond_latent,
+                    return_attentions=False,
+                    return_latent=True,
+                )
+                wavs.append(model.hifigan_decoder(latents, g=speaker_embedding).cpu().squeeze().numpy())
+        return wavs
+
+    def stream(self, text, speaker, language="en", chunk_size=20):
+        """
+        Yields audio chunks as the XTTS decoder produces them.
+
+        chunk_size is the number of GPT tokens per chunk: smaller values get
+        the first audio out sooner at the cost of more decoder calls.
+        """
+        gpt_cond_latent, speaker_embedding = self.get(speaker)
+        chunks = self.model.inference_stream(
+            text, language, gpt_cond_latent, speaker_embedding, stream_chunk_size=chunk_size
+        )
+        for chunk in chunks:
+            yield chunk.detach().cpu().numpy()
+
+    def _paths(self, name):
+        base = os.path.join(self.cache_dir, _slug(name))
+        return base + ".gpt.npy", base + ".spk.npy"
+
+    def _load(self, name, newer_than=0):
+        gpt_path, spk_path = self._paths(name)
+        if not (os.path.exists(gpt_path) and os.path.exists(spk_path)):
+            return None
+        if os.path.getmtime(gpt_path) < newer_than:
+            return None
+        # Copy-on-write mmap: pages come from the page cache and are shared
+        # between processes, but torch still gets a writable array
+        gpt_cond_latent = torch.from_numpy(np.load(gpt_path, mmap_mode="c"))
+        speaker_embedding = torch.from_numpy(np.load(spk_path, mmap_mode="c"))
+        return gpt_cond_latent, speaker_embedding
+
+    def _save(self, name, gpt_cond_latent, speaker_embedding):
+        gpt_path, spk_path = self._paths(name)
+        np.save(gpt_path, gpt_cond_latent.detach().cpu().numpy())
+        np.save(spk_path, speaker_embedding.detach().cpu().numpy())
+        return self._load(name)
+
+
+if __name__ == "__main__":
+    # Precompute the whole catalog, plus any reference WAVs given as
+    # arguments (each file becomes a voice named after it).
+    from model_loader import load_tts
+
+    print("Loading XTTS v2...")
+    tts = load_tts("tts_models/multilingual/multi-dataset/xtts_v2")
+    store = SpeakerStore(tts)
+    store.load_catalog()
+    for wav in sys.argv[1:]:
+        store.add_reference(os.path.splitext(os.path.basename(wav))[0], wav)
+    print(f"Cached {len(store._speakers)} voices in {store.cache_dir}/")
@@ -0,0 +1,162 @@
+import queue
+import re
+import threading
+import time
+from barge_in import CancelToken
+
+_DONE = object()
+
+
+def same_request(a, b):
+    """True if two transcripts would make the same prompt (case, punctuation and spacing aside)."""
+    def simplify(text):
+        return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+    return simplify(a) == simplify(b)
+
+
+class SpeculativeReply:
+    """
+    An LLM stream opened before the final transcript is known.
+
+    A background thread calls open_stream(prompt) and buffers the chunks, so
+    prefill and the first tokens happen while the user is still finishing
+    their sentence. Iterating yields the buffered chunks and then the rest of
+    the stream, like the stream itself. close() abandons it; the HTTP stream
+    is dropped as soon as the next chunk arrives.
+    """
+
+    def __init__(self, prompt, open_stream):
+        self.prompt = prompt
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self._chunks = queue.Queue()
+        self._cancel = CancelToken()
+        threading.Thread(target=self._read, args=(open_stream,), daemon=True).start()
+
+    def _read(self, open_stream):
+        stream = None
+        try:
+            stream = open_stream(self.prompt)
+            for chunk in stream:
+                if self._cancel.cancelled:
+                    break
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                self._chunks.put(chunk)
+        except Exception as e:
+            self._chunks.put(e)
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+            self._chunks.put(_DONE)
+
+    def __iter__(self):
+        while True:
+            item = self._chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        self._cancel.cancel("speculation dropped")
+
+    def saved_seconds(self, now=None):
+        """
+        First-token latency this reply saves if it is promoted at now: the
+        same request started now would get its first token one
+        time-to-first-token later, and it can't save more than that.
+        """
+        now = time.perf_counter() if now is None else now
+        head_start = now - self.started
+        if self.first_token_at is None:
+            return head_start
+        return min(head_start, self.first_token_at - self.started)
+
+
+class Speculator:
+    """
+    Starts the LLM request on a partial transcript that has stopped changing
+    and, once the final transcript is in, either promotes that request or
+    drops it.
+
+    The user must have been silent for stable_ms (silence_ms is a callable,
+    e.g. lambda: capture.silence_ms), so speculation fires in the pause
+    before endpointing rather than between two partial decodes. The partial
+    must also be settled (decoded after the pause began, see
+    asr.transcribe_stream) or unchanged for stable_ms. Keeps counters for
+    the hit rate, the head start on hits and the first-token latency that
+    head start actually saved.
+    """
+
+    def __init__(self, open_stream, silence_ms, stable_ms=150):
+        self.open_stream = open_stream
+        self.silence_ms = silence_ms
+        self.stable_ms = stable_ms
+        self.current = None
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.head_start_seconds = 0.0
+        self.saved_seconds = 0.0
+        self._partial = None
+        self._partial_since = 0.0
+        self._settled = False
+
+    def on_partial(self, text, settled=False):
+        if text != self._partial:
+            self._partial = text
+            self._partial_since = time.perf_counter()
+        self._settled = settled
+
+    def poll(self):
+        """Call regularly while listening; starts a speculative request when the partial is stable."""
+        silent_ms = self.silence_ms()
+        if silent_ms == 0:
+            self._settled = False  # speech resumed; the settled partial is missing the new words
+        text = self._partial
+        if not text or (self.current is not None and self.current.prompt == text):
+            return
+        stable_for = (time.perf_counter() - self._partial_since) * 1000
+        if silent_ms < self.stable_ms or (stable_for < self.stable_ms and not self._settled):
+            return
+        if self.current is not None:
+            # The user went on talking; the earlier guess is stale
+            self.current.close()
+            self.misses += 1
+        self.current = SpeculativeReply(text, self.open_stream)
+        self.started += 1
+
+    def resolve(self, final):
+        """
+        Returns the speculative reply if it was started on the final
+        transcript (promote it), otherwise drops it and returns None.
+        """
+        reply, self.current = self.current, None
+        self._partial = None
+        if reply is None:
+            return None
+        if final and same_request(reply.prompt, final):
+            now = time.perf_counter()
+            self.hits += 1
+            self.head_start_seconds += now - reply.started
+            self.saved_seconds += reply.saved_seconds(now)
+            return reply
+        reply.close()
+        self.misses += 1
+        return None
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.started if self.started else 0.0
+
+    def stats(self):
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "head_start_seconds": round(self.head_start_seconds, 3),
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
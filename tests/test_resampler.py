@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from audio_buffers import audio_pool
+from resampler import Resampler, resample
+
+RATES = [(24000, 48000), (24000, 44100), (44100, 48000), (24000, 16000), (48000, 16000)]
+
+
+def streamed(audio, rate_in, rate_out, sizes):
+    resampler = Resampler(rate_in, rate_out)
+    out, start = [], 0
+    for size in sizes:
+        chunk = resampler.process(audio[start:start + size])
+        out.append(chunk.copy())
+        audio_pool.give(chunk)
+        start += size
+    out.append(resampler.flush())
+    return np.concatenate(out)
+
+
+@pytest.mark.parametrize("rate_in,rate_out", RATES)
+def test_empty_chunk_on_fresh_resampler(rate_in, rate_out):
+    assert len(Resampler(rate_in, rate_out).process(np.zeros(0, dtype=np.float32))) == 0
+
+
+@pytest.mark.parametrize("rate_in,rate_out", RATES)
+@pytest.mark.parametrize("sizes", [[1] * 50, [0, 1] * 25 + [0], [0, 1, 0, 300, 0, 1, 2, 0, 500, 1]])
+def test_tiny_chunks_match_one_shot(rate_in, rate_out, sizes):
+    audio = np.random.default_rng(0).standard_normal(sum(sizes)).astype(np.float32)
+    expected = resample(audio, rate_in, rate_out)
+    got = streamed(audio, rate_in, rate_out, sizes)
+    assert len(got) == len(expected)
+    np.testing.assert_allclose(got, expected, atol=1e-5)
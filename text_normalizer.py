@@ -0,0 +1,241 @@
+import re
+
+# Everything the old four-pass clean_text_for_tts did, plus number and
+# currency expansion, in a single regex pass. The pattern is built per
+# language because the set of characters to keep depends on the script.
+#
+# It opens with one character class, the only shape re can skip over in C
+# without entering the pattern, so letters, spaces and punctuation cost next
+# to nothing; the lookbehinds then tell which construct the matched first
+# character started. Abbreviations start with letters, so they get a pass
+# of their own (ABBREVIATION_PATTERN) that re can skip through the same way.
+TOKEN_PATTERN = r"""
+    [^a-zA-Z\s.,!?'\-{script}]
+    (?:
+          (?<=\()(?P<paren>[^)]*\)?\s*)           # (actions), or an unclosed one at the end
+        | (?<=\*)(?P<action>(?=\S)[^*]*\*?\s*)    # *actions*, but not "* bullet" or "5 * 3"
+        | (?<=[$€£₹])(?P<money>
+              \s?(?:\d{{1,3}}(?:,\d{{3}})+|\d+)(?:\.\d+)?
+              (?:\s?(?P<scale>thousand|million|billion|trillion|bn|[kKmM])(?![A-Za-z]))?
+              (?!\w|\.\d))
+        | (?<![\w.]\d)(?<=\d)(?P<number>           # not inside v2, A4 or 1.5e10
+              (?::\d\d|\d:\d\d|\d{{0,2}}(?:,\d{{3}})+(?:\.\d+)?|\d*(?:\.\d+)?)(?!\d|[.:]\d)
+              (?P<suffix>%|st|nd|rd|th|[kmgt]b|[kxgmlhs](?![A-Za-z])     # glued only: 3kg, 2h, 1990s
+                 |\ ?(?:[aApP](?:\.[mM]\.|[mM])|[KMGT]B|kg|km|cm|mm|mg|ml|mph|lbs?|oz|hrs?|min|ms))?
+              (?![A-Za-z]))
+        | (?<=[—–/_])(?P<sep>[—–/_]*\s*)            # word separators must not glue words together
+        | (?<=[^a-zA-Z0-9\s.,!?'\-{script}])(?P<junk>[^a-zA-Z0-9\s.,!?'\-{script}]*)  # emojis, markdown, other scripts
+    )
+"""
+ABBREVIATION_PATTERN = re.compile(r"(?:Dr|dr|Mrs|Mr|Ms|Prof|St|vs|etc|e\.g|i\.e)\.")
+
+ABBREVIATIONS = {
+    "dr.": "doctor", "mr.": "mister", "mrs.": "missus", "ms.": "miz", "prof.": "professor",
+    "vs.": "versus", "etc.": "et cetera", "e.g.": "for example", "i.e.": "that is",
+}
+# (unit, units), (sub-unit, sub-units)
+CURRENCIES = {
+    "$": (("dollar", "dollars"), ("cent", "cents")),
+    "€": (("euro", "euros"), ("cent", "cents")),
+    "£": (("pound", "pounds"), ("penny", "pence")),
+    "₹": (("rupee", "rupees"), ("paisa", "paise")),
+}
+SCALE_WORDS = {"k": "thousand", "m": "million", "bn": "billion"}
+# Suffixes after a number, by lower case: (singular, plural)
+UNITS = {
+    "%": ("percent", "percent"), "k": ("thousand", "thousand"), "x": ("times", "times"),
+    "kg": ("kilogram", "kilograms"), "g": ("gram", "grams"), "mg": ("milligram", "milligrams"),
+    "km": ("kilometer", "kilometers"), "m": ("meter", "meters"), "cm": ("centimeter", "centimeters"),
+    "mm": ("millimeter", "millimeters"), "l": ("liter", "liters"), "ml": ("milliliter", "milliliters"),
+    "lb": ("pound", "pounds"), "lbs": ("pound", "pounds"), "oz": ("ounce", "ounces"), "mph": ("mile per hour", "miles per hour"),
+    "h": ("hour", "hours"), "hr": ("hour", "hours"), "hrs": ("hour", "hours"), "min": ("minute", "minutes"),
+    "ms": ("millisecond", "milliseconds"), "kb": ("kilobyte", "kilobytes"), "mb": ("megabyte", "megabytes"),
+    "gb": ("gigabyte", "gigabytes"), "tb": ("terabyte", "terabytes"),
+}
+
+ONES = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+        "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen"]
+TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+SCALES = [(10 ** 12, "trillion"), (10 ** 9, "billion"), (10 ** 6, "million"), (1000, "thousand"), (100, "hundred")]
+ORDINALS = {"one": "first", "two": "second", "three": "third", "five": "fifth", "eight": "eighth",
+            "nine": "ninth", "twelve": "twelfth"}
+
+# Unicode blocks kept on top of ASCII, so e.g. Tamil text isn't deleted
+LANGUAGE_SCRIPTS = {
+    "ta": "\u0B80-\u0BFF",
+    "hi": "\u0900-\u097F",
+    "ru": "\u0400-\u04FF",
+    "ar": "\u0600-\u06FF",
+    "ko": "\u1100-\u11FF\u3130-\u318F\uAC00-\uD7AF",
+    "ja": "\u3040-\u30FF\u4E00-\u9FFF",
+    "zh-cn": "\u4E00-\u9FFF",
+}
+LATIN_EXTENDED = "\u00C0-\u024F"
+for _lang in ("es", "fr", "de", "it", "pt", "pl", "tr", "nl", "cs", "hu"):
+    LANGUAGE_SCRIPTS[_lang] = LATIN_EXTENDED
+
+_NEXT_CAPITALIZED = re.compile(r"\s+[A-Z]")
+_AT_END = re.compile(r"[\"')\]\s]*$")
+
+
+def number_to_words(n):
+    """Spells out a non-negative integer in English."""
+    if n < 20:
+        return ONES[n]
+    if n < 100:
+        tens, ones = divmod(n, 10)
+        return TENS[tens] + ("-" + ONES[ones] if ones else "")
+    for value, name in SCALES:
+        if n >= value:
+            head, rest = divmod(n, value)
+            words = number_to_words(head) + " " + name
+            return words + (" " + number_to_words(rest) if rest else "")
+
+
+def _ordinal(words):
+    head, sep, last = words.rpartition("-" if words.rpartition(" ")[2].count("-") else " ")
+    if last in ORDINALS:
+        last = ORDINALS[last]
+    elif last.endswith("y"):
+        last = last[:-1] + "ieth"
+    else:
+        last += "th"
+    return head + sep + last
+
+
+def _plural(words):
+    """1990s -> nineteen nineties, 80s -> eighties."""
+    if words.endswith("y"):
+        return words[:-1] + "ies"
+    return words + ("es" if words.endswith("x") else "s")
+
+
+def _year(n):
+    """Years the way they are said: 1990 -> nineteen ninety, 1900 -> nineteen hundred, 2000 -> two thousand."""
+    if n % 1000 == 0 or 2000 < n < 2010:
+        return number_to_words(n)
+    head, rest = divmod(n, 100)
+    if rest == 0:
+        return number_to_words(head) + " hundred"
+    return number_to_words(head) + (" oh " if rest < 10 else " ") + number_to_words(rest)
+
+
+def _decimal(text):
+    whole, _, frac = text.replace(",", "").partition(".")
+    words = number_to_words(int(whole))
+    if frac:
+        words += " point " + " ".join(ONES[int(d)] for d in frac)
+    return words
+
+
+def _time(text, suffix):
+    hours, minutes = (int(part or 0) for part in text.split(":"))
+    if minutes == 0:
+        words = number_to_words(hours) + ("" if suffix else " o'clock")
+    else:
+        words = number_to_words(hours) + (" oh " if minutes < 10 else " ") + number_to_words(minutes)
+    return words
+
+
+def _spell_number(text, suffix):
+    if suffix:
+        text = text[:len(text) - len(suffix)]
+        suffix = suffix.strip()
+    if ":" in text:
+        words = _time(text, suffix)
+    elif suffix in ("st", "nd", "rd", "th") and "." not in text:
+        return _ordinal(number_to_words(int(text.replace(",", ""))))
+    elif suffix == "s" and "." not in text:
+        n = int(text.replace(",", ""))
+        return _plural(_year(n) if 1000 <= n < 10000 and "," not in text else number_to_words(n))
+    else:
+        words = _decimal(text)
+    if not suffix:
+        return words
+    if suffix[0] in "aApP" and suffix[-1] in "mM.":
+        return words + " " + suffix[0].upper() + " M"
+    singular, plural = UNITS[suffix.lower()]
+    return words + " " + (singular if text == "1" else plural)
+
+
+def _spell_money(text, scale):
+    (unit, units), (sub_unit, sub_units) = CURRENCIES[text[0]]
+    amount = text[1:].strip()
+    if scale:
+        amount = amount[:len(amount) - len(scale)].strip()
+        return _decimal(amount) + " " + SCALE_WORDS.get(scale.lower(), scale) + " " + units
+    whole, _, frac = amount.replace(",", "").partition(".")
+    major = int(whole)
+    minor = int((frac + "00")[:2]) if frac else 0
+    if major == 0 and minor:
+        return number_to_words(minor) + " " + (sub_unit if minor == 1 else sub_units)
+    words = number_to_words(major) + " " + (unit if major == 1 else units)
+    if minor:
+        words += " and " + number_to_words(minor) + " " + (sub_unit if minor == 1 else sub_units)
+    return words
+
+
+def _spell_abbreviation(m):
+    token = m.group()
+    text, start, end = m.string, m.start(), m.end()
+    if start and (text[start - 1].isalnum() or text[start - 1] in "'_"):
+        return token  # the end of a longer word: "etc." in "fetc.", "St." in "1St."
+    if token == "St.":
+        # St. Louis, but Main St.
+        words = "saint" if _NEXT_CAPITALIZED.match(text, end) else "street"
+    else:
+        words = ABBREVIATIONS[token.lower()]
+    # The period also ended the sentence; keep it so the pause after it stays a full stop
+    return words + "." if _AT_END.match(text, end) else words
+
+
+def _clean(m):
+    kind = m.lastgroup
+    if kind == "junk":
+        return ""
+    if kind in ("paren", "action", "sep"):
+        # They take the whitespace after them along, so they don't leave a double space behind
+        return "" if m.group()[-1].isspace() else " "
+    return m.group()
+
+
+def _expand(m):
+    kind = m.lastgroup
+    if kind == "number":
+        words = _spell_number(m.group(), m.group("suffix"))
+        # "p.m." may have ended the sentence too
+        return words + "." if m.group().endswith(".") and _AT_END.match(m.string, m.end()) else words
+    if kind == "money":
+        return _spell_money(m.group(), m.group("scale"))
+    return _clean(m)
+
+
+_patterns = {}
+
+
+def _pattern(language):
+    pattern = _patterns.get(language)
+    if pattern is None:
+        script = LANGUAGE_SCRIPTS.get(language, "")
+        pattern = _patterns[language] = re.compile(TOKEN_PATTERN.format(script=script), re.X)
+    return pattern
+
+
+def normalize_text(text, language="en"):
+    """
+    Turns one LLM segment into text XTTS can say.
+
+    Drops (actions), *actions*, emojis and symbols, keeps the script of the
+    target language, and for English spells out numbers (with ordinals,
+    decades, times and unit suffixes), currency and common abbreviations.
+    Cost is linear in the segment length.
+    """
+    if language == "en":
+        text = _pattern(language).sub(_expand, text)
+        # After the main pass, so an abbreviation that ended the sentence before an emoji or *action* is seen as such
+        text = ABBREVIATION_PATTERN.sub(_spell_abbreviation, text)
+    else:
+        text = _pattern(language).sub(_clean, text)
+    if "  " in text or "\n" in text or "\t" in text:
+        return " ".join(text.split())
+    return text.strip()
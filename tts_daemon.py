@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import numpy as np
+from audio_buffers import audio_pool
+from inference_profiles import PROFILES
+
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+SOCKET_PATH = os.environ.get("EMMA_TTS_SOCKET", "/tmp/emma-tts.sock")
+
+# Every reply is a sequence of frames: 1-byte type + 4-byte little-endian length + payload.
+# b"A" = raw float32 PCM, b"E" = utf-8 error message, b"D" = done (empty payload, except that
+# a ping's carries JSON about the daemon, e.g. {"profile": "int8"}).
+FRAME_HEADER = struct.Struct("<cI")
+
+
+def _send_frame(sock, kind, payload=b""):
+    sock.sendall(FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    _recv_into(sock, memoryview(buf))
+    return buf
+
+
+def _recv_into(sock, view):
+    n = len(view)
+    while n:
+        got = sock.recv_into(view[-n:], n)
+        if not got:
+            raise ConnectionError("TTS daemon closed the connection")
+        n -= got
+
+
+class DaemonClient:
+    """
+    Thin client for a running tts_daemon, with the same interface as
+    SpeakerStore (tts / stream / load_catalog), so scripts use either one.
+    profile is the daemon's inference profile, known after ping().
+    """
+
+    def __init__(self, path=SOCKET_PATH, timeout=None):
+        self.path = path
+        self.timeout = timeout
+        self.profile = "fp32"
+
+    def _request(self, request):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        return sock
+
+    def _frames(self, request):
+        sock = self._request(request)
+        try:
+            while True:
+                kind, length = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+                if kind == b"A":
+                    # Received straight into a pooled float32 buffer; the sink gives it back
+                    chunk = audio_pool.take(length // 4)
+                    _recv_into(sock, memoryview(chunk).cast("B"))
+                    yield chunk
+                    continue
+                payload = _recv_exact(sock, length) if length else b""
+                if kind == b"E":
+                    raise RuntimeError(payload.decode("utf-8"))
+                else:
+                    return
+        finally:
+            sock.close()
+
+    def ping(self):
+        sock = self._request({"op": "ping"})
+        try:
+            kind, length = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+            payload = _recv_exact(sock, length) if length else b""
+        finally:
+            sock.close()
+        if kind != b"D":
+            raise RuntimeError(payload.decode("utf-8", "replace"))
+        self.profile = json.loads(payload).get("profile", "fp32") if payload else "fp32"
+        return True
+
+    def load_catalog(self, path=None):
+        pass  # the daemon loaded it at startup
+
+    def add_reference(self, name, wav_paths):
+        if isinstance(wav_paths, str):
+            wav_paths = [wav_paths]
+        wav_paths = [os.path.abspath(p) for p in wav_paths]
+        list(self._frames({"op": "add_reference", "name": name, "wav_paths": wav_paths}))
+
+    def tts(self, text, speaker, language="en"):
+        chunks = list(self._frames({"op": "tts", "text": text, "speaker": speaker, "language": language}))
+        audio = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+        for chunk in chunks:
+            audio_pool.give(chunk)
+        return audio
+
+    def stream(self, text, speaker, language="en", chunk_size=20):
+        request = {"op": "stream", "text": text, "speaker": speaker, "language": language, "chunk_size": chunk_size}
+        return self._frames(request)
+
+
+def connect_synthesizer(model_name=TTS_MODEL, path=SOCKET_PATH, processes=0, profile="fp32"):
+    """
+    Returns a DaemonClient if a daemon is listening on path, otherwise loads
+    XTTS in this process and returns a SpeakerStore with the catalog loaded,
+    or, with processes > 0, a ProcessSynthesizer running that many workers.
+    profile (see inference_profiles) applies to a model loaded here; a
+    daemon keeps the profile it was started with.
+    """
+    if os.path.exists(path):
+        try:
+            client = DaemonClient(path, timeout=2.0)
+            client.ping()
+            client.timeout = None
+            print(f"Using TTS daemon at {path}")
+            return client
+        except (OSError, RuntimeError):
+            print(f"TTS daemon at {path} is not answering, loading the model in-process")
+
+    if processes:
+        from tts_pool import ProcessSynthesizer
+        print(f"Starting {processes} TTS worker processes...")
+        return ProcessSynthesizer(model_name, num_workers=processes, profile=profile)
+
+    # Heavy imports only on the fallback path so daemon clients start fast
+    from model_loader import load_tts
+    from speaker_store import SpeakerStore
+
+    tts = load_tts(model_name, profile=profile)
+    # Conditioning for every catalog voice is cached on disk; switching voices is free
+    store = SpeakerStore(tts, profile=profile)
+    store.load_catalog()
+    return store
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        store = self.server.store
+        try:
+            request = json.loads(self.rfile.readline())
+            op = request.get("op")
+            if op == "tts":
+                audio = store.tts(request["text"], request["speaker"], request.get("language", "en"))
+                _send_frame(self.connection, b"A", np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+            elif op == "stream":
+                chunks = store.stream(request["text"], request["speaker"], request.get("language", "en"),
+                                      chunk_size=request.get("chunk_size", 20))
+                for chunk in chunks:
+                    _send_frame(self.connection, b"A", np.ascontiguousarray(chunk, dtype=np.float32).tobytes())
+            elif op == "add_reference":
+                store.add_reference(request["name"], request["wav_paths"])
+            elif op == "ping":
+                # Clients key their audio caches on the profile the daemon synthesizes with
+                _send_frame(self.connection, b"D", json.dumps({"profile": store.profile}).encode("utf-8"))
+                return
+            else:
+                raise ValueError(f"unknown op {op!r}")
+            _send_frame(self.connection, b"D")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away (e.g. barge-in); nothing to report
+        except Exception as e:
+            _send_frame(self.connection, b"E", str(e).encode("utf-8"))
+
+
+class TTSDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, store):
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket from a previous run
+        super().__init__(path, _Handler)
+        self.store = store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve XTTS v2 synthesis over a local Unix socket.")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--model", default=TTS_MODEL)
+    parser.add_argument("--reference", nargs="*", default=[], help="extra reference WAVs to register as voices")
+    parser.add_argument("--batch", type=int, default=1, help="batch up to this many concurrent tts requests")
+    parser.add_argument("--batch-wait-ms", type=float, default=5, help="how long a request waits for a batch to fill")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="synthesize in this many worker processes, each on its own CPU cores")
+    parser.add_argument("--profile", choices=PROFILES, default="fp32", help="CPU inference profile (see inference_profiles.py)")
+    args = parser.parse_args()
+    if args.processes and args.batch > 1:
+        parser.error("--batch needs the model in this process; use either --batch or --processes")
+
+    if args.processes:
+        from tts_pool import ProcessSynthesizer
+
+        print(f"Starting {args.processes} XTTS v2 worker processes (shared by every client)...")
+        store = ProcessSynthesizer(args.model, num_workers=args.processes, profile=args.profile)
+    else:
+        from model_loader import load_tts
+        from speaker_store import SpeakerStore
+
+        print(f"Loading XTTS v2 ({args.profile}, once for every client)...")
+        tts = load_tts(args.model, profile=args.profile)
+        store = SpeakerStore(tts, profile=args.profile)
+        store.load_catalog()
+    for wav in args.reference:
+        store.add_reference(os.path.splitext(os.path.basename(wav))[0], wav)
+    if args.batch > 1:
+        # Clients connect on their own threads; concurrent tts requests share forward passes
+        from tts_scheduler import MicroBatcher
+        store = MicroBatcher(store, max_batch=args.batch, max_wait_ms=args.batch_wait_ms)
+
+    server = TTSDaemon(args.socket, store)
+    print(f"TTS daemon listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+        sys.exit(0)
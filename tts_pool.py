@@ -0,0 +1,256 @@
+import functools
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import weakref
+import numpy as np
+from multiprocessing import shared_memory
+from audio_buffers import audio_pool
+
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+
+
+def split_cores(num_workers):
+    """Splits the CPUs this process may use into num_workers contiguous groups."""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    if len(cores) < num_workers:
+        return [cores] * num_workers  # oversubscribed: everyone shares
+    size = len(cores) // num_workers
+    return [cores[i * size:(i + 1) * size] for i in range(num_workers)]
+
+
+def _load_store(model_name, threads, profile="fp32"):
+    """
+    Default worker factory: XTTS on the CPU with the catalog's cached
+    conditioning. With converted weights (model_loader.py --convert) all
+    workers map the same file and share its pages.
+    """
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    from model_loader import load_tts
+    from speaker_store import SpeakerStore
+
+    # The profile's thread tuning is limited to this worker's cores
+    store = SpeakerStore(load_tts(model_name, profile=profile, threads=threads), profile=profile)
+    store.load_catalog()
+    return store
+
+
+def _worker_main(index, cores, factory, requests, results, free_slots, cancelled, shm_name, slot_samples):
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    store = factory(len(cores))
+
+    # Workers share the parent's resource tracker, so attaching here doesn't change who unlinks it
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slots = np.ndarray((shm.size // (slot_samples * 4), slot_samples), dtype=np.float32, buffer=shm.buf)
+    results.put((index, None, "R", None))
+
+    while (request := requests.get()) is not None:
+        job, op, args = request
+        try:
+            if op == "tts":
+                chunks = [store.tts(*args)]
+            elif op == "stream":
+                chunks = store.stream(*args)
+            elif op == "add_reference":
+                store.add_reference(*args)
+                chunks = []
+            else:
+                raise ValueError(f"unknown op {op!r}")
+            for chunk in chunks:
+                if cancelled.value == job:
+                    if hasattr(chunks, "close"):
+                        chunks.close()
+                    break
+                chunk = np.asarray(chunk, dtype=np.float32).reshape(-1)
+                for start in range(0, len(chunk), slot_samples):
+                    piece = chunk[start:start + slot_samples]
+                    # Blocks while every slot is still waiting to be read: backpressure
+                    slot = free_slots.get()
+                    slots[slot, :len(piece)] = piece
+                    results.put((index, job, "A", (slot, len(piece))))
+            results.put((index, job, "D", None))
+        except Exception as e:
+            results.put((index, job, "E", str(e)))
+    del slots
+    shm.close()
+
+
+class ProcessSynthesizer:
+    """
+    Runs XTTS in num_workers separate processes so CPU synthesis scales
+    across cores instead of fighting over the GIL and one torch thread pool.
+
+    Each worker is pinned to its own group of cores and sets torch's thread
+    count to match. Audio never goes through pickle: every worker owns a
+    block of shared-memory slots, writes its float32 output there and only
+    sends (slot, length) back. The slot is only handed back once the caller
+    takes the chunk (copied into a pooled buffer, audio_buffers), so a slow
+    reader stalls its worker instead of piling audio up in the parent.
+    Requests go to the least busy worker.
+
+    Same interface as SpeakerStore and DaemonClient (tts / stream /
+    add_reference), so connect_synthesizer() can return one. factory(threads)
+    builds each worker's store; the default loads XTTS for model_name with
+    the given inference profile.
+    """
+
+    def __init__(self, model_name=TTS_MODEL, num_workers=2, slots=8, slot_seconds=2.0, samplerate=24000,
+                 factory=None, profile="fp32"):
+        factory = factory or functools.partial(_load_store, model_name, profile=profile)
+        self.slot_samples = int(slot_seconds * samplerate)
+        self.profile = profile
+        self._jobs = {}  # job -> queue.Queue of (kind, payload), payload (slot, length) for audio
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Semaphore(0)
+        self.busy = [0] * num_workers
+        self.completed = [0] * num_workers
+
+        # Forked where possible: a spawned worker would re-run the voice script's module-level
+        # setup. Safe because the parent never imports torch in this mode; the workers load it.
+        ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+        self._results = ctx.Queue()
+        self._workers = []
+        for index, cores in enumerate(split_cores(num_workers)):
+            shm = shared_memory.SharedMemory(create=True, size=slots * self.slot_samples * 4)
+            free_slots = ctx.Queue()
+            for slot in range(slots):
+                free_slots.put(slot)
+            requests, cancelled = ctx.Queue(), ctx.Value("q", -1, lock=False)
+            process = ctx.Process(
+                target=_worker_main,
+                args=(index, cores, factory, requests, self._results, free_slots, cancelled, shm.name,
+                      self.slot_samples),
+                daemon=True,
+            )
+            process.start()
+            view = np.ndarray((slots, self.slot_samples), dtype=np.float32, buffer=shm.buf)
+            self._workers.append((process, requests, free_slots, cancelled, shm, view))
+
+        threading.Thread(target=self._dispatch, daemon=True).start()
+        # Workers load the model in parallel; wait for all of them
+        for _ in self._workers:
+            while not self._ready.acquire(timeout=1.0):
+                dead = [process for process, *_ in self._workers if not process.is_alive()]
+                if dead:
+                    self.close()
+                    raise RuntimeError(f"TTS worker failed to start (exit code {dead[0].exitcode})")
+
+    def _dispatch(self):
+        """Routes worker output to the waiting callers and recycles the slots."""
+        while True:
+            index, job, kind, payload = self._results.get()
+            if kind == "R":
+                self._ready.release()
+                continue
+            with self._lock:
+                if kind != "A":
+                    self.busy[index] -= 1
+                    self.completed[index] += 1
+                jobs = self._jobs.get(job)
+                if jobs is not None:
+                    jobs.put((kind, payload))
+            if jobs is None and kind == "A":
+                self._workers[index][2].put(payload[0])  # nobody is waiting for this job any more
+
+    def _submit(self, op, args, worker=None):
+        """
+        Queues a request and returns the generator of its chunks. The job is
+        released when the generator finishes or is dropped, even if it was
+        never started, so its slots can't stay taken.
+        """
+        with self._lock:
+            if worker is None:
+                worker = min(range(len(self._workers)), key=self.busy.__getitem__)
+            self.busy[worker] += 1
+            job = next(self._ids)
+            self._jobs[job] = queue.Queue()
+        _, requests, free_slots, cancelled, _, _ = self._workers[worker]
+        requests.put((job, op, args))
+        results = self._results_of(worker, job)
+        weakref.finalize(results, self._release, job, free_slots, cancelled).atexit = False
+        return results
+
+    def _release(self, job, free_slots, cancelled, finished=False):
+        """Forgets a job, hands back the slots nobody read and cancels it if it is still running."""
+        with self._lock:
+            jobs = self._jobs.pop(job, None)
+        if jobs is None:
+            return
+        while True:
+            try:
+                kind, payload = jobs.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "A":
+                free_slots.put(payload[0])
+            else:
+                finished = True
+        if not finished:
+            cancelled.value = job
+
+    def _results_of(self, worker, job):
+        """Yields a job's chunks; abandoning the generator cancels the job."""
+        process, _, free_slots, cancelled, _, view = self._workers[worker]
+        jobs = self._jobs[job]
+        done = False
+        try:
+            while True:
+                try:
+                    kind, payload = jobs.get(timeout=1.0)
+                except queue.Empty:
+                    if not process.is_alive():
+                        raise RuntimeError(f"TTS worker {worker} died (exit code {process.exitcode})")
+                    continue
+                done = kind != "A"
+                if kind == "E":
+                    raise RuntimeError(payload)
+                if done:
+                    return
+                slot, n = payload
+                chunk = audio_pool.take(n)
+                chunk[:] = view[slot, :n]
+                free_slots.put(slot)
+                yield chunk
+        finally:
+            self._release(job, free_slots, cancelled, finished=done)
+
+    def tts(self, text, speaker, language="en"):
+        chunks = list(self._submit("tts", (text, speaker, language)))
+        audio = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+        for chunk in chunks:
+            audio_pool.give(chunk)
+        return audio
+
+    def stream(self, text, speaker, language="en", chunk_size=20):
+        return self._submit("stream", (text, speaker, language, chunk_size))
+
+    def load_catalog(self, path=None):
+        pass  # every worker loads the catalog when it starts
+
+    def add_reference(self, name, wav_paths):
+        """Registers the voice in every worker (the conditioning is cached on disk after the first)."""
+        for worker in range(len(self._workers)):
+            for _ in self._submit("add_reference", (name, wav_paths), worker):
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"workers": len(self._workers), "busy": list(self.busy), "completed": list(self.completed)}
+
+    def close(self):
+        workers, self._workers = self._workers, []
+        for process, requests, _, _, shm, view in workers:
+            requests.put(None)
+            process.join(timeout=5)
+            del view  # the segment can't be closed while an array still points into it
+            shm.close()
+            shm.unlink()
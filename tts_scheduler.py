@@ -0,0 +1,354 @@
+import collections
+import concurrent.futures
+import functools
+import queue
+import threading
+import time
+
+# Output-queue marker sent by cancel(): ordered() drops everything before it
+RESET = object()
+
+
+class TTSScheduler:
+    """
+    Runs speech synthesis on a fixed pool of worker threads.
+
+    Segments are numbered in the order they are submitted. Workers put
+    (seq, audio, last) items on the output queue as audio becomes available,
+    and ordered() hands them back in submission order, so a short sentence
+    never jumps ahead of a longer one that came before it.
+
+    synthesize() may return one array, None, or a generator of chunks for
+    streaming synthesis; chunks are forwarded as soon as they are produced.
+
+    If on_segment is given it is called with (seq, stats) after each segment,
+    where stats holds queue wait, synthesis time, audio length and RTF.
+
+    cancel() drops every segment submitted so far: queued ones are never
+    synthesized and in-flight ones stop after their current chunk.
+    """
+
+    def __init__(self, synthesize, output_queue, num_workers=2, max_pending=4, report_ttfa=False,
+                 samplerate=24000, on_segment=None):
+        self.synthesize = synthesize
+        self.output_queue = output_queue
+        self.report_ttfa = report_ttfa
+        self.samplerate = samplerate
+        self.on_segment = on_segment
+        # seq -> seconds from submit() to the first audio chunk, for segments still in flight
+        self.ttfa = {}
+        # Bounded so submit() blocks (backpressure) when the LLM outruns the TTS
+        self.input_queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        # Segments numbered below this were cancelled
+        self.cancel_below = 0
+        self._workers = []
+        for _ in range(num_workers):
+            worker = threading.Thread(target=self._worker, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, *args):
+        """Queues synthesize(*args) and returns its sequence number."""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+        self.input_queue.put((seq, args, time.perf_counter()))
+        return seq
+
+    def _worker(self):
+        while True:
+            item = self.input_queue.get()
+            if item is None:
+                self.input_queue.task_done()
+                break
+
+            seq, args, submitted = item
+            started = time.perf_counter()
+            samples = 0
+            try:
+                result = self.synthesize(*args) if seq >= self.cancel_below else None
+                chunks = result if hasattr(result, "__next__") else [result]
+                for chunk in chunks:
+                    if seq < self.cancel_below:
+                        # Cancelled mid-sentence: closing the generator stops the decoder
+                        if hasattr(chunks, "close"):
+                            chunks.close()
+                        break
+                    if chunk is None or len(chunk) == 0:
+                        continue
+                    if seq not in self.ttfa:
+                        self._first_audio(seq, submitted, started)
+                    samples += len(chunk)
+                    self.output_queue.put((seq, chunk, False))
+            except Exception as e:
+                print(f"\n[TTS Error] {e}")
+            # Always close the seq, even with no audio, so playback never stalls on a gap
+            self.output_queue.put((seq, None, True))
+            if self.on_segment is not None:
+                self.on_segment(seq, self._stats(seq, args, submitted, started, samples))
+            # Scripts keep one scheduler for the whole session; don't keep every segment's TTFA
+            self.ttfa.pop(seq, None)
+            self.input_queue.task_done()
+
+    def _stats(self, seq, args, submitted, started, samples):
+        synth_seconds = time.perf_counter() - started
+        audio_seconds = samples / self.samplerate
+        stats = {
+            "chars": len(args[0]) if args and isinstance(args[0], str) else 0,
+            "queue_wait": round(started - submitted, 4),
+            "synth_seconds": round(synth_seconds, 4),
+            "audio_seconds": round(audio_seconds, 4),
+        }
+        if seq in self.ttfa:
+            stats["ttfa"] = round(self.ttfa[seq], 4)
+        if audio_seconds:
+            stats["rtf"] = round(synth_seconds / audio_seconds, 4)
+        return stats
+
+    def _first_audio(self, seq, submitted, started):
+        now = time.perf_counter()
+        self.ttfa[seq] = now - submitted
+        if self.report_ttfa:
+            print(f"\n[TTFA] segment {seq}: {now - submitted:.2f}s after submit ({now - started:.2f}s synthesis)")
+
+    def cancel(self):
+        """
+        Cancels every segment submitted so far and returns the first seq
+        that will still be played.
+        """
+        with self._lock:
+            self.cancel_below = self._next_seq
+            first_new = self._next_seq
+        self.output_queue.put((RESET, first_new, True))
+
+        while True:
+            try:
+                item = self.input_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # close() is in progress; leave its sentinel for a worker
+                self.input_queue.put(item)
+                self.input_queue.task_done()
+                break
+            # Close the seq so ordered() never waits on a segment we dropped
+            self.output_queue.put((item[0], None, True))
+            self.input_queue.task_done()
+        return first_new
+
+    def wait(self):
+        """Blocks until every submitted segment has been synthesized."""
+        self.input_queue.join()
+
+    def close(self):
+        """Lets queued segments finish, then stops the workers."""
+        for _ in self._workers:
+            self.input_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+
+
+class FairScheduler:
+    """
+    Shares one synthesizer between many sessions.
+
+    Jobs are queued per session and the workers take them round-robin
+    across sessions, one sentence at a time, so a long reply in one session
+    can't hold back another session's first sentence. Each session's jobs
+    run one at a time and in order.
+
+    session(key) returns a concurrent.futures.Executor bound to that
+    session, so it plugs straight into loop.run_in_executor() and
+    VoicePipeline(executor=...).
+    """
+
+    def __init__(self, num_workers=2):
+        self._queues = collections.OrderedDict()  # session -> deque of (future, fn)
+        self._running = set()
+        self._cond = threading.Condition()
+        self.completed = 0
+        for _ in range(num_workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(self, key, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        with self._cond:
+            self._queues.setdefault(key, collections.deque()).append((future, functools.partial(fn, *args, **kwargs)))
+            self._cond.notify()
+        return future
+
+    def session(self, key):
+        return _SessionExecutor(self, key)
+
+    def drop(self, key):
+        """Cancels a session's queued jobs (the one running, if any, finishes)."""
+        with self._cond:
+            jobs = self._queues.pop(key, ())
+        for future, _ in jobs:
+            future.cancel()
+
+    def pending(self):
+        with self._cond:
+            return {key: len(jobs) for key, jobs in self._queues.items()}
+
+    def _take(self):
+        for key in self._queues:
+            if key in self._running:
+                continue
+            jobs = self._queues.pop(key)
+            job = jobs.popleft()
+            if jobs:
+                self._queues[key] = jobs  # back of the line
+            self._running.add(key)
+            return key, job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while (picked := self._take()) is None:
+                    self._cond.wait()
+            key, (future, fn) = picked
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn())
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running.discard(key)
+                    self.completed += 1
+                    self._cond.notify_all()
+
+
+class _SessionExecutor(concurrent.futures.Executor):
+    def __init__(self, scheduler, key):
+        self.scheduler = scheduler
+        self.key = key
+
+    def submit(self, fn, /, *args, **kwargs):
+        return self.scheduler.submit(self.key, fn, *args, **kwargs)
+
+
+class MicroBatcher:
+    """
+    Gathers tts() calls from many threads into batched forward passes.
+
+    The first request waits up to max_wait_ms for others to join it; as
+    soon as max_batch requests are waiting (or the wait is over) they go to
+    synthesizer.tts_batch() together and each caller gets its own audio
+    back. A batch of one goes through plain tts(), so a lone request only
+    pays the wait.
+
+    Wraps a SpeakerStore and is a drop-in replacement for it: stream() and
+    everything else go straight to the wrapped synthesizer, unbatched.
+    """
+
+    def __init__(self, synthesizer, max_batch=4, max_wait_ms=5):
+        if not hasattr(synthesizer, "tts_batch"):
+            raise TypeError(f"{type(synthesizer).__name__} has no tts_batch(); batch in the TTS daemon instead")
+        self.synthesizer = synthesizer
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def __getattr__(self, name):
+        return getattr(self.synthesizer, name)
+
+    def submit(self, text, speaker, language="en"):
+        """Queues one request; returns a Future for its audio."""
+        future = concurrent.futures.Future()
+        self._queue.put((future, (text, speaker, language)))
+        return future
+
+    def tts(self, text, speaker, language="en"):
+        return self.submit(text, speaker, language).result()
+
+    def _gather(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.perf_counter())))
+            except queue.Empty:
+                break
+        return [(future, request) for future, request in batch if future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._gather()
+            if not batch:
+                continue
+            requests = [request for _, request in batch]
+            try:
+                if len(requests) == 1:
+                    results = [self.synthesizer.tts(*requests[0])]
+                else:
+                    results = self.synthesizer.tts_batch(requests)
+            except Exception as e:
+                for future, _ in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            for (future, _), audio in zip(batch, results):
+                future.set_result(audio)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+def ordered(audio_queue):
+    """
+    Yields (seq, audio) from the scheduler's output queue in seq order.
+
+    Chunks of the segment currently playing pass straight through; chunks of
+    later segments are held until every earlier segment is finished. After a
+    RESET marker, anything numbered before the new start is dropped.
+    Stops on None.
+    """
+    pending = {}
+    finished = set()
+    next_seq = 0
+    while True:
+        item = audio_queue.get()
+        if item is None:
+            audio_queue.task_done()
+            return
+
+        seq, audio, last = item
+        if seq is RESET:
+            next_seq = audio
+            pending = {s: chunks for s, chunks in pending.items() if s >= next_seq}
+            finished = {s for s in finished if s >= next_seq}
+            audio_queue.task_done()
+            continue
+        if seq < next_seq:
+            audio_queue.task_done()  # left over from a cancelled reply
+            continue
+
+        if audio is not None:
+            pending.setdefault(seq, []).append(audio)
+        if last:
+            finished.add(seq)
+
+        while True:
+            for chunk in pending.pop(next_seq, ()):
+                yield next_seq, chunk
+            if next_seq not in finished:
+                break
+            finished.discard(next_seq)
+            next_seq += 1
+        # Only now, so audio_queue.join() means "everything was handed to the player"
+        audio_queue.task_done()
@@ -1,16 +1,18 @@
 import ollama
-from TTS.api import TTS
 import sounddevice as sd
 import numpy as np
+from tts_daemon import connect_synthesizer
+from segmenter import SentenceSegmenter
 
 # Load TTS model (female voice, multilingual)
-tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2", progress_bar=False, gpu=False)
+# Uses the shared tts_daemon when one is running, otherwise loads XTTS here
+speakers = connect_synthesizer()
 
 def speak_text(text, language="en", speaker="EN-FEMALE"):
     # Generate audio from text
     try:
-        audio = tts.tts(text=text, speaker=speaker, language=language)
-        sd.play(audio, samplerate=22050)
+        audio = speakers.tts(text, speaker, language)
+        sd.play(np.asarray(audio, dtype=np.float32), samplerate=24000)  # XTTS v2 outputs at 24 kHz
         sd.wait()
     except Exception as e:
         print(f"Error in TTS: {e}")
@@ -23,17 +25,16 @@ def stream_and_speak(model_name, prompt, language="en", speaker="EN-FEMALE"):
         messages=[{"role": "user", "content": prompt}],
         stream=True,
     )
-    buffer = ""
+    # Segments end at real sentence boundaries (not "3.5" or "Dr."); each token is scanned once
+    segmenter = SentenceSegmenter()
     for chunk in response:
         content = chunk['message']['content']
-        buffer += content
-        # Speak when a sentence ends
-        if content.endswith((".", "!", "?")):
-            speak_text(content, language, speaker)
-            buffer = ""
+        for sentence in segmenter.feed(content):
+            speak_text(sentence, language, speaker)
+
     # Speak any remaining text
-    if buffer:
-        speak_text(buffer, language, speaker)
+    for sentence in segmenter.flush():
+        speak_text(sentence, language, speaker)
 
 # Example usage
 stream_and_speak("emma", "hi", language="en", speaker="EN-FEMALE")
@@ -0,0 +1,418 @@
+"""
+Multi-session voice server: many clients (kiosks, browser tabs) talk to
+Emma at once while sharing one loaded XTTS model.
+
+    python voice_server.py --port 8765 [--asr whisper]
+
+Endpoints (audio out is 16-bit little-endian mono PCM at 24 kHz):
+
+    GET  /health    JSON with sessions, queued synthesis jobs and server-side TTFA
+    POST /v1/chat   body {"text": ..., "session": optional id, "speaker": ..., "language": ...}
+                    or raw 16 kHz int16 PCM (Content-Type: audio/L16) when --asr is set;
+                    the reply streams back as chunked audio/L16
+    GET  /v1/ws     WebSocket, one session per connection. Send text frames
+                    {"type": "text", "text": ...}, {"type": "config", "speaker": ..., "language": ...},
+                    {"type": "cancel"}, or binary 16 kHz int16 PCM followed by {"type": "audio_end"}.
+                    Receive binary PCM frames and JSON events: transcript, reply, done, error.
+
+Synthesis for every session goes through one FairScheduler, so sentences
+from different sessions are interleaved round-robin instead of first come,
+first served.
+"""
+import argparse
+import asyncio
+import base64
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import struct
+import time
+import numpy as np
+from audio_buffers import audio_pool
+from conversation import Conversation
+from inference_profiles import PROFILES
+from pipeline import VoicePipeline
+from silence_trim import SilenceTrimmer
+from tts_scheduler import FairScheduler, MicroBatcher
+
+# --- CONFIGURATION ---
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+MODEL_NAME = "emma"              # Your local Ollama model
+DEFAULT_SPEAKER = "Ana Florence" # Voice for sessions that don't pick one
+SAMPLE_RATE = 24000              # Native XTTS v2 sample rate (audio out)
+MIC_SAMPLE_RATE = 16000          # PCM in, for speech recognition
+TTS_WORKERS = 2                  # Synthesis threads shared by all sessions
+STREAM_CHUNK_SIZE = 20           # GPT tokens per streamed audio chunk (0 = whole sentences)
+TTS_BATCH = 1                    # Sentences from different sessions synthesized together (needs whole sentences)
+TTS_BATCH_WAIT_MS = 5            # How long a sentence waits for its batch to fill
+AUDIO_CACHE_MB = 64              # Clip cache shared by all sessions
+TRIM_SILENCE = True              # Cut XTTS's leading/trailing near-silence; pauses then follow punctuation
+SYSTEM_PROMPT = "You are Emma. Be playful and helpful. Speak naturally for voice output."
+KEEP_ALIVE = "30m"               # Keep the model loaded in Ollama between turns
+HISTORY_TOKENS = 2048            # Memory budget per session
+MAX_HTTP_SESSIONS = 256          # Conversations kept for POST /v1/chat callers
+SEND_TIMEOUT = 10                # Seconds a client may stop reading before its session is dropped
+# ---------------------
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+def ws_accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+
+
+def ws_frame(opcode, payload, mask=False):
+    """Encodes one unfragmented WebSocket frame (clients must mask, servers must not)."""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    n = len(payload)
+    if n < 126:
+        header.append(mask_bit | n)
+    elif n < 1 << 16:
+        header += bytes([mask_bit | 126]) + struct.pack("!H", n)
+    else:
+        header += bytes([mask_bit | 127]) + struct.pack("!Q", n)
+    if not mask:
+        return bytes(header) + payload
+    key = np.random.bytes(4)
+    return bytes(header) + key + _unmask(payload, key)
+
+
+def _unmask(payload, key):
+    data = np.frombuffer(payload, dtype=np.uint8)
+    mask = np.resize(np.frombuffer(key, dtype=np.uint8), len(data))
+    return (data ^ mask).tobytes()
+
+
+async def ws_read(reader):
+    """Reads one message: returns (opcode, payload), joining continuation frames."""
+    opcode, message = None, b""
+    while True:
+        b1, b2 = await reader.readexactly(2)
+        n = b2 & 0x7F
+        if n == 126:
+            n = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif n == 127:
+            n = struct.unpack("!Q", await reader.readexactly(8))[0]
+        key = await reader.readexactly(4) if b2 & 0x80 else None
+        payload = await reader.readexactly(n)
+        if key:
+            payload = _unmask(payload, key)
+        if b1 & 0x0F >= OP_CLOSE:
+            return b1 & 0x0F, payload  # control frames may arrive between fragments
+        opcode = opcode or b1 & 0x0F
+        message += payload
+        if b1 & 0x80:
+            return opcode, message
+
+
+def to_pcm16(chunk):
+    return (np.clip(chunk, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+async def drain(writer):
+    """
+    Waits for the client to take what was written. A client that stops
+    reading would otherwise hold its reply's synthesis jobs, and with them
+    the shared workers, forever; after SEND_TIMEOUT it is disconnected.
+    """
+    try:
+        await asyncio.wait_for(writer.drain(), SEND_TIMEOUT)
+    except asyncio.TimeoutError:
+        writer.transport.abort()
+        raise ConnectionError("client stopped reading") from None
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class _Sink:
+    """VoicePipeline player that sends PCM to a client instead of a sound card."""
+
+    def __init__(self, send):
+        self.send = send
+        self.first_audio = None
+
+    async def write(self, chunk, crossfade=True):
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter()
+        pcm = to_pcm16(chunk)
+        audio_pool.give(chunk)  # int16 only here, at the socket
+        await self.send(pcm)
+
+
+class Session:
+    def __init__(self, key, server, speaker=DEFAULT_SPEAKER, language="en"):
+        self.key = key
+        self.server = server
+        self.speaker = speaker
+        self.language = language
+        self.conversation = Conversation(SYSTEM_PROMPT, max_tokens=HISTORY_TOKENS)
+        self.executor = server.scheduler.session(key)
+        self.last_used = time.monotonic()
+
+    def synthesize(self, clean_text, language):
+        """Runs on a shared scheduler worker; the speaker is fixed per session."""
+        speakers, cache, speaker = self.server.speakers, self.server.audio_cache, self.speaker
+        cached = cache.get(clean_text, speaker, language)
+        if cached is not None:
+            return cached
+        if self.server.stream_chunk_size:
+            stream = speakers.stream(clean_text, speaker, language, chunk_size=self.server.stream_chunk_size)
+            return cache.record(clean_text, speaker, language, stream)
+        audio = np.asarray(speakers.tts(clean_text, speaker, language), dtype=np.float32)
+        cache.put(clean_text, speaker, language, audio)
+        return audio
+
+    async def reply(self, text, send):
+        """Speaks a reply to text through send(pcm_bytes); returns (reply text, seconds to first audio)."""
+        self.last_used = time.monotonic()
+        sink = _Sink(send)
+        pipeline = VoicePipeline(self.server.client, MODEL_NAME, self.server.trimmer.wrap(self.synthesize), sink,
+                                 keep_alive=KEEP_ALIVE, executor=self.executor)
+        started = time.perf_counter()
+        reply = await pipeline.speak(self.conversation.messages(text), self.language)
+        self.conversation.add_turn(text, reply)
+        self.conversation.compact()
+        ttfa = sink.first_audio - started if sink.first_audio else None
+        if ttfa is not None:
+            self.server.ttfa.append(ttfa)
+        return reply, ttfa
+
+
+class VoiceServer:
+    def __init__(self, speakers, client, audio_cache, recognizer=None, workers=TTS_WORKERS,
+                 stream_chunk_size=STREAM_CHUNK_SIZE, trim_silence=TRIM_SILENCE):
+        self.speakers = speakers
+        self.stream_chunk_size = stream_chunk_size
+        self.client = client
+        self.audio_cache = audio_cache
+        self.trimmer = SilenceTrimmer(SAMPLE_RATE, enabled=trim_silence)
+        self.recognizer = recognizer
+        self.scheduler = FairScheduler(workers)
+        # Recognition gets its own thread so it never waits behind synthesis jobs
+        self.asr_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr")
+        self.http_sessions = collections.OrderedDict()
+        self.live_sessions = 0
+        self.ttfa = collections.deque(maxlen=1000)
+        self._ids = itertools.count(1)
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        server = await asyncio.start_server(self._handle, host, port)
+        print(f"Voice server listening on http://{host}:{port} (WebSocket at /v1/ws)")
+        async with server:
+            await server.serve_forever()
+
+    async def transcribe(self, pcm):
+        if self.recognizer is None:
+            raise ValueError("this server was started without --asr, send text instead")
+        audio = np.frombuffer(pcm, dtype="<i2")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.asr_executor, self.recognizer.transcribe, audio)
+
+    def health(self):
+        ttfa = list(self.ttfa)
+        return {
+            "websocket_sessions": self.live_sessions,
+            "http_sessions": len(self.http_sessions),
+            "queued_jobs": sum(self.scheduler.pending().values()),
+            "completed_jobs": self.scheduler.completed,
+            "ttfa_p50": percentile(ttfa, 50),
+            "ttfa_p95": percentile(ttfa, 95),
+            "audio_cache": self.audio_cache.stats(),
+            "batching": self.speakers.stats() if isinstance(self.speakers, MicroBatcher) else None,
+        }
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if len(request_line) < 2:
+                return
+            method, path = request_line[0], request_line[1].split("?")[0]
+
+            if path == "/v1/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self._websocket(reader, writer, headers)
+            elif method == "GET" and path == "/health":
+                self._respond(writer, 200, "application/json", json.dumps(self.health()).encode("utf-8"))
+            elif method == "POST" and path == "/v1/chat":
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                await self._http_chat(writer, headers, body)
+            else:
+                self._respond(writer, 404, "text/plain", b"not found")
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # client went away
+        finally:
+            writer.close()
+
+    def _respond(self, writer, status, content_type, body):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found"}.get(status, "Error")
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+
+    def _http_session(self, key, request):
+        session = self.http_sessions.pop(key, None) or Session(key, self)
+        session.speaker = request.get("speaker", session.speaker)
+        session.language = request.get("language", session.language)
+        self.http_sessions[key] = session
+        while len(self.http_sessions) > MAX_HTTP_SESSIONS:
+            old_key, _ = self.http_sessions.popitem(last=False)
+            self.scheduler.drop(old_key)
+        return session
+
+    async def _http_chat(self, writer, headers, body):
+        try:
+            if headers.get("content-type", "").startswith("audio/"):
+                request = {"session": headers.get("x-session")}
+                text = await self.transcribe(body)
+            else:
+                request = json.loads(body)
+                text = request["text"]
+        except (ValueError, KeyError) as e:
+            self._respond(writer, 400, "text/plain", str(e).encode("utf-8"))
+            return
+
+        key = request.get("session") or f"http-{next(self._ids)}"
+        session = self._http_session(key, request)
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: audio/L16;rate={SAMPLE_RATE};channels=1\r\n"
+                     f"Transfer-Encoding: chunked\r\nX-Session: {key}\r\n"
+                     f"X-Transcript: {json.dumps(text)}\r\nConnection: close\r\n\r\n".encode("utf-8"))
+
+        async def send(data):
+            writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            await drain(writer)
+
+        await session.reply(text, send)
+        writer.write(b"0\r\n\r\n")
+
+    async def _websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            self._respond(writer, 400, "text/plain", b"missing Sec-WebSocket-Key")
+            return
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {ws_accept_key(key)}\r\n\r\n").encode("ascii"))
+        await writer.drain()
+
+        session = Session(f"ws-{next(self._ids)}", self)
+        self.live_sessions += 1
+        send_lock = asyncio.Lock()
+        audio_in = bytearray()
+        current = None  # task speaking the current reply
+
+        async def send(opcode, payload):
+            async with send_lock:
+                writer.write(ws_frame(opcode, payload))
+                await drain(writer)
+
+        async def send_event(kind, **fields):
+            await send(OP_TEXT, json.dumps(dict(type=kind, **fields)).encode("utf-8"))
+
+        async def respond(text):
+            try:
+                if text is None:
+                    text = await self.transcribe(bytes(audio_in))
+                    audio_in.clear()
+                    await send_event("transcript", text=text)
+                if text:
+                    reply, ttfa = await session.reply(text, lambda data: send(OP_BINARY, data))
+                    await send_event("reply", text=reply, ttfa=ttfa)
+            except asyncio.CancelledError:
+                raise
+            except ConnectionError:
+                return  # the client is gone; the read loop below ends the session
+            except Exception as e:
+                await send_event("error", message=str(e))
+            await send_event("done")
+
+        try:
+            while True:
+                opcode, payload = await ws_read(reader)
+                if opcode == OP_CLOSE:
+                    writer.write(ws_frame(OP_CLOSE, payload[:2]))
+                    break
+                if opcode == OP_PING:
+                    await send(OP_PONG, payload)
+                elif opcode == OP_BINARY:
+                    audio_in += payload
+                elif opcode == OP_TEXT:
+                    try:
+                        message = json.loads(payload)
+                        if not isinstance(message, dict):
+                            raise ValueError("expected a JSON object")
+                    except ValueError as e:
+                        await send_event("error", message=f"bad message: {e}")
+                        continue
+                    kind = message.get("type")
+                    if kind == "config":
+                        session.speaker = message.get("speaker", session.speaker)
+                        session.language = message.get("language", session.language)
+                    elif kind in ("text", "audio_end", "cancel"):
+                        # A new turn (or an explicit cancel) interrupts the reply in progress
+                        if current is not None and not current.done():
+                            current.cancel()
+                            self.scheduler.drop(session.key)
+                        if kind != "cancel":
+                            current = asyncio.ensure_future(respond(message.get("text") if kind == "text" else None))
+        finally:
+            if current is not None:
+                current.cancel()
+            self.scheduler.drop(session.key)
+            self.live_sessions -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=TTS_WORKERS, help="synthesis threads shared by all sessions")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="run XTTS in this many worker processes, each on its own CPU cores")
+    parser.add_argument("--profile", choices=PROFILES, default="fp32", help="CPU inference profile (see inference_profiles.py)")
+    parser.add_argument("--batch", type=int, default=TTS_BATCH,
+                        help="synthesize up to this many sentences together (whole sentences, no streaming)")
+    parser.add_argument("--batch-wait-ms", type=float, default=TTS_BATCH_WAIT_MS)
+    parser.add_argument("--asr", help="speech recognition backend for PCM input (see asr.py), e.g. whisper")
+    args = parser.parse_args()
+    if args.processes and args.batch > 1:
+        parser.error("--batch needs the model in this process; use either --batch or --processes")
+
+    import ollama
+    from audio_cache import AudioCache
+    from tts_daemon import connect_synthesizer
+
+    print("Loading Emma's voice engine (XTTS v2, shared by every session)...")
+    speakers = connect_synthesizer(TTS_MODEL, processes=args.processes, profile=args.profile)
+    stream_chunk_size, workers = STREAM_CHUNK_SIZE, max(args.workers, args.processes)
+    if args.batch > 1:
+        # Streamed sentences can't share a forward pass, and a batch can only fill
+        # if at least that many sessions are synthesizing at once
+        speakers = MicroBatcher(speakers, max_batch=args.batch, max_wait_ms=args.batch_wait_ms)
+        stream_chunk_size, workers = 0, max(workers, args.batch)
+    recognizer = None
+    if args.asr:
+        from asr import load_recognizer
+        recognizer = load_recognizer(args.asr, samplerate=MIC_SAMPLE_RATE)
+
+    audio_cache = AudioCache(TTS_MODEL, max_memory_mb=AUDIO_CACHE_MB, profile=speakers.profile)
+    server = VoiceServer(speakers, ollama.AsyncClient(), audio_cache,
+                         recognizer=recognizer, workers=workers, stream_chunk_size=stream_chunk_size)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,26 @@
 import ollama
-from TTS.api import TTS
 import sounddevice as sd
 import numpy as np
+import time
+from tts_daemon import connect_synthesizer
+from segmenter import SentenceSegmenter
 
 # Load model (GPU is highly recommended for XTTS if available)
-tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2", progress_bar=True, gpu=False)
+# Uses the shared tts_daemon when one is running, otherwise loads XTTS here
+speakers = connect_synthesizer()
 
 def speak_text(text):
     if not text.strip():
         return
     try:
-        # XTTS v2 outputs at 24kHz
-        audio = tts.tts(text=text, speaker="Claribel Dervla", language="en")
-        sd.play(np.array(audio), samplerate=24000)
-        sd.wait()
+        # XTTS v2 outputs at 24kHz. Stream chunks straight to the device so
+        # the first words play while the rest of the sentence renders.
+        start = time.perf_counter()
+        with sd.OutputStream(samplerate=24000, channels=1, dtype="float32") as stream:
+            for i, chunk in enumerate(speakers.stream(text, "Claribel Dervla", "en", chunk_size=20)):
+                if i == 0:
+                    print(f"\n[TTFA] {time.perf_counter() - start:.2f}s")
+                stream.write(np.asarray(chunk, dtype=np.float32).reshape(-1, 1))
     except Exception as e:
         print(f"Error in TTS: {e}")
 
@@ -25,18 +32,16 @@ def stream_and_speak(model_name, prompt):
         stream=True,
     )
     
-    buffer = ""
+    # Segments end at real sentence boundaries (not "3.5" or "Dr."); each token is scanned once
+    segmenter = SentenceSegmenter()
     for chunk in response:
         content = chunk['message']['content']
         print(content, end="", flush=True) # See text as it generates
-        buffer += content
-        
-        # Speak when a natural pause is reached
-        if any(char in content for char in (".", "!", "?", "\n")):
-            speak_text(buffer.strip())
-            buffer = ""
-            
-    if buffer.strip():
-        speak_text(buffer.strip())
+        for sentence in segmenter.feed(content):
+            speak_text(sentence)
+
+    # Speak any remaining text
+    for sentence in segmenter.flush():
+        speak_text(sentence)
 
 stream_and_speak("emma", "Hello! Tell me a very short joke.")
\ No newline at end of file
@@ -1,73 +1,86 @@
 import ollama
-from TTS.api import TTS
-import sounddevice as sd
 import numpy as np
 import threading
 import queue
 import re
+from tts_scheduler import TTSScheduler, ordered
+from audio_sinks import open_sink
+from tts_daemon import connect_synthesizer
+from segmenter import SentenceSegmenter
 
 # 1. Load Model (CPU mode)
 print("Loading Emma's voice...")
-tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2", progress_bar=True, gpu=False)
+# Uses the shared tts_daemon when one is running, otherwise loads XTTS here
+speakers = connect_synthesizer()
 
 # 2. Setup a Queue for synchronized audio playback
+TTS_WORKERS = 2       # Parallel synthesis threads
+TTS_MAX_PENDING = 4   # Sentences that may wait for a worker before the LLM loop blocks
+STREAM_CHUNK_SIZE = 20  # GPT tokens per streamed audio chunk (0 = render whole sentences)
+REPORT_TTFA = True      # Print time-to-first-audio for every sentence
+AUDIO_OUT = "device"    # Where Emma's voice goes: device, null, or a .wav/.flac path
 audio_queue = queue.Queue()
 
 def play_audio_worker():
     """ Keeps the audio player alive and playing sequences from the queue """
-    while True:
+    # ordered() holds back finished sentences until the earlier ones have played
+    last_seq = None
+    for seq, audio_data in ordered(audio_queue):
         try:
-            audio_data = audio_queue.get()
-            if audio_data is None: break
-            
-            # Final check before playing
-            if len(audio_data) > 0:
-                sd.play(audio_data, samplerate=24000)
-                sd.wait()
-            audio_queue.task_done()
+            # One persistent stream: no device setup or gap between sentences.
+            # Only crossfade at sentence joins; streamed chunks are contiguous.
+            player.write(audio_data, crossfade=seq != last_seq)
+            last_seq = seq
         except Exception as e:
             print(f"\n[Playback Error] {e}")
 
 # Start background player thread
+player = open_sink(AUDIO_OUT, samplerate=24000)
+player.start()
 threading.Thread(target=play_audio_worker, daemon=True).start()
 
-def speak_text(text):
+def synthesize_text(text):
+    """Runs on a scheduler worker: returns the audio for one sentence, or None."""
     # SAFETY: Remove non-alphanumeric junk and check length
     clean_text = re.sub(r'[^a-zA-Z0-9\s.,!?]', '', text).strip()
     
     if len(clean_text) < 2: # Skip if it's just a dot or a space
-        return
+        return None
         
     try:
         # Generate the audio
-        audio = tts.tts(text=clean_text, speaker="Claribel Dervla", language="en")
-        audio_queue.put(np.array(audio))
+        if STREAM_CHUNK_SIZE:
+            # Playback starts on the first chunk instead of after the whole sentence
+            return speakers.stream(clean_text, "Claribel Dervla", "en", chunk_size=STREAM_CHUNK_SIZE)
+        audio = speakers.tts(clean_text, "Claribel Dervla", "en")
+        return np.asarray(audio, dtype=np.float32)
     except Exception as e:
         # This catches the 'index out of range' error without crashing the script
         print(f"\n[TTS Skip] Text '{clean_text}' was too short or invalid: {e}")
+        return None
+
+scheduler = TTSScheduler(synthesize_text, audio_queue, num_workers=TTS_WORKERS, max_pending=TTS_MAX_PENDING, report_ttfa=REPORT_TTFA)
+
+def speak_text(text):
+    """Queues a sentence for synthesis; it plays after everything queued before it."""
+    scheduler.submit(text)
 
 def stream_and_speak(model_name, prompt):
     print("\nEmma is thinking...")
     try:
         response = ollama.chat(model=model_name, messages=[{"role": "user", "content": prompt}], stream=True)
         
-        buffer = ""
+        # Segments end at real sentence boundaries (not "3.5" or "Dr."); each token is scanned once
+        segmenter = SentenceSegmenter()
         for chunk in response:
             content = chunk['message']['content']
             print(content, end="", flush=True)
-            buffer += content
-            
-            # Speak when a sentence or line ends
-            if any(char in content for char in (".", "!", "?", "\n")):
-                sentence = buffer.strip()
-                if sentence:
-                    # Threading here makes the LLM keep typing while voice generates
-                    threading.Thread(target=speak_text, args=(sentence,), daemon=True).start()
-                buffer = ""
+            for sentence in segmenter.feed(content):
+                speak_text(sentence)
 
-        # Final speak for any remaining text
-        if buffer.strip():
-            speak_text(buffer.strip())
+        # Speak any remaining text
+        for sentence in segmenter.flush():
+            speak_text(sentence)
             
     except Exception as e:
         print(f"\n[Ollama Error] {e}")
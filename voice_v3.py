@@ -1,53 +1,72 @@
 import ollama
-from TTS.api import TTS
-import sounddevice as sd
 import numpy as np
 import threading
 import queue
 import re
+from tts_scheduler import TTSScheduler, ordered
+from audio_sinks import open_sink
+from tts_daemon import connect_synthesizer
+from segmenter import SentenceSegmenter
 
 # --- CONFIGURATION ---
 MODEL_NAME = "emma"  # Change to "emma" or your preferred model
 SPEAKER_NAME = "Gracie Wise" # XTTS v2 built-in speaker
 SAMPLE_RATE = 24000              # Matches XTTS v2 default output
+TTS_WORKERS = 2                  # Parallel synthesis threads
+TTS_MAX_PENDING = 4              # Sentences that may wait for a worker before the LLM loop blocks
+STREAM_CHUNK_SIZE = 20           # GPT tokens per streamed audio chunk (0 = render whole sentences)
+REPORT_TTFA = True               # Print time-to-first-audio for every sentence
+AUDIO_OUT = "device"             # Where Emma's voice goes: device, null, or a .wav/.flac path
 # ---------------------
 
 print("Initializing Emma's voice engine...")
-tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2", progress_bar=False, gpu=False)
+# Uses the shared tts_daemon when one is running, otherwise loads XTTS here
+speakers = connect_synthesizer()
 
 audio_queue = queue.Queue()
 
 def play_audio_worker():
     """Background thread to handle smooth audio playback without lag."""
-    while True:
+    # ordered() holds back finished sentences until the earlier ones have played
+    last_seq = None
+    for seq, audio_data in ordered(audio_queue):
         try:
-            audio_data = audio_queue.get()
-            if audio_data is None: break
-            
-            if len(audio_data) > 0:
-                sd.play(audio_data, samplerate=SAMPLE_RATE)
-                sd.wait()
-            audio_queue.task_done()
+            # One persistent stream: no device setup or gap between sentences.
+            # Only crossfade at sentence joins; streamed chunks are contiguous.
+            player.write(audio_data, crossfade=seq != last_seq)
+            last_seq = seq
         except Exception as e:
             print(f"\n[Playback Error] {e}")
 
 # Start the performance-optimized background thread
+player = open_sink(AUDIO_OUT, samplerate=SAMPLE_RATE)
+player.start()
 threading.Thread(target=play_audio_worker, daemon=True).start()
 
-def speak_text(text):
-    """Sanitizes text and generates audio in a thread-safe way."""
+def synthesize_text(text):
+    """Sanitizes text and generates audio on a scheduler worker."""
     # Customization: Clean text to prevent 'index out of range' errors
     clean_text = re.sub(r'[^a-zA-Z0-9\s.,!?]', '', text).strip()
     
     if len(clean_text) < 2: 
-        return
+        return None
         
     try:
         # Generate the waveform
-        audio = tts.tts(text=clean_text, speaker=SPEAKER_NAME, language="en")
-        audio_queue.put(np.array(audio))
+        if STREAM_CHUNK_SIZE:
+            # Playback starts on the first chunk instead of after the whole sentence
+            return speakers.stream(clean_text, SPEAKER_NAME, "en", chunk_size=STREAM_CHUNK_SIZE)
+        audio = speakers.tts(clean_text, SPEAKER_NAME, "en")
+        return np.asarray(audio, dtype=np.float32)
     except Exception as e:
         print(f"\n[TTS Error] Skipping fragment: {e}")
+        return None
+
+scheduler = TTSScheduler(synthesize_text, audio_queue, num_workers=TTS_WORKERS, max_pending=TTS_MAX_PENDING, report_ttfa=REPORT_TTFA)
+
+def speak_text(text):
+    """Queues a sentence for synthesis; it plays after everything queued before it."""
+    scheduler.submit(text)
 
 def stream_and_speak(prompt):
     """Streams from Ollama and triggers speech on natural pauses."""
@@ -55,22 +74,17 @@ def stream_and_speak(prompt):
     try:
         response = ollama.chat(model=MODEL_NAME, messages=[{"role": "user", "content": prompt}], stream=True)
         
-        buffer = ""
+        # Segments end at real sentence boundaries (not "3.5" or "Dr."); each token is scanned once
+        segmenter = SentenceSegmenter()
         for chunk in response:
             content = chunk['message']['content']
             print(content, end="", flush=True)
-            buffer += content
-            
-            # Sentence-based triggering for human-like flow
-            if any(char in content for char in (".", "!", "?", "\n")):
-                sentence = buffer.strip()
-                if sentence:
-                    # Threading ensures the LLM keeps typing while the voice works
-                    threading.Thread(target=speak_text, args=(sentence,), daemon=True).start()
-                buffer = ""
+            for sentence in segmenter.feed(content):
+                speak_text(sentence)
 
-        if buffer.strip():
-            speak_text(buffer.strip())
+        # Speak any remaining text
+        for sentence in segmenter.flush():
+            speak_text(sentence)
             
     except Exception as e:
         print(f"\n[Ollama Error] Check if Ollama is running: {e}")
@@ -78,7 +92,7 @@ def stream_and_speak(prompt):
 if __name__ == "__main__":
     print("\nSYSTEM READY.")
     print("Model Selection: Set to", MODEL_NAME)
-    print("Performance: Background threading active.")
+    print(f"Performance: {TTS_WORKERS} synthesis workers active.")
     
     while True:
         user_msg = input("\n\nYou: ")
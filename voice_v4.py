@@ -1,121 +1,108 @@
 import ollama
-from TTS.api import TTS
-import sounddevice as sd
 import numpy as np
-import threading
-import queue
-import re
+from audio_sinks import open_sink
+from tts_daemon import connect_synthesizer
+from audio_cache import AudioCache
+from silence_trim import SilenceTrimmer
+from pipeline import VoicePipeline
+from conversation import Conversation, ollama_summarizer
 
 
 # --- CONFIGURATION ---
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
 MODEL_NAME = "emma"             # Your local Ollama model
 ENGLISH_SPEAKER = "Ana Florence" # Built-in XTTS v2 English Female voice
 TAMIL_SPEAKER = "TA-FEMALE"      # Built-in XTTS v2 Tamil Female voice (check available speakers)
 SAMPLE_RATE = 24000              # Native XTTS v2 sample rate
+TTS_WORKERS = 2                  # Parallel synthesis threads
+INFERENCE_PROFILE = "fp32"       # CPU speed-ups: fp32, tuned, int8, compiled, int8-compiled (bench_profiles.py)
+TTS_PROCESSES = 0                # >0: run XTTS in this many processes, each on its own cores (keep <= TTS_WORKERS)
+TTS_MAX_PENDING = 4              # Sentences that may wait for synthesis before the LLM stream is paused
+STREAM_CHUNK_SIZE = 20           # GPT tokens per streamed audio chunk (0 = render whole sentences)
+REPORT_TTFA = True               # Print time-to-first-audio for every sentence
+TRIM_SILENCE = True              # Cut XTTS's leading/trailing near-silence; pauses then follow punctuation
+AUDIO_OUT = "device"             # Where Emma's voice goes: device, null, or a .wav/.flac path
+AUDIO_CACHE_MB = 64              # In-memory clip cache; older clips stay on disk
+# System message helps Emma be more 'TTS friendly'
+SYSTEM_PROMPT = "You are Emma. Be playful and helpful. Avoid using emojis or writing actions in parentheses as I cannot hear them."
+KEEP_ALIVE = "30m"               # Keep the model loaded in Ollama between turns
+HISTORY_TOKENS = 2048            # Conversation memory budget; older turns get summarized
 # ---------------------
 
 
 print("Loading Emma's voice engine (XTTS v2)...")
-# Note: gpu=True is much faster if you have an NVIDIA card
-tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2", progress_bar=True, gpu=False)
+# Uses the shared tts_daemon when one is running, otherwise loads XTTS here
+speakers = connect_synthesizer(TTS_MODEL, processes=TTS_PROCESSES, profile=INFERENCE_PROFILE)
+audio_cache = AudioCache(TTS_MODEL, max_memory_mb=AUDIO_CACHE_MB, profile=speakers.profile)
+# Clips are cached as synthesized and trimmed on the way out
+trimmer = SilenceTrimmer(SAMPLE_RATE, enabled=TRIM_SILENCE)
 
 
-audio_queue = queue.Queue()
+# Multi-turn memory; the prompt prefix stays identical between turns so Ollama's KV cache is reused
+conversation = Conversation(SYSTEM_PROMPT, max_tokens=HISTORY_TOKENS,
+                            summarize=ollama_summarizer(MODEL_NAME, keep_alive=KEEP_ALIVE))
 
-
-def play_audio_worker():
-    """Background thread: Plays audio chunks smoothly in the order they arrive."""
-    while True:
-        try:
-            audio_data = audio_queue.get()
-            if audio_data is None: break
-            
-            if len(audio_data) > 0:
-                sd.play(audio_data, samplerate=SAMPLE_RATE)
-                sd.wait()
-            audio_queue.task_done()
-        except Exception as e:
-            print(f"\n[Playback Error] {e}")
-
-
-# Start the audio playback thread
-threading.Thread(target=play_audio_worker, daemon=True).start()
+# One persistent stream: no device setup or gap between sentences
+player = open_sink(AUDIO_OUT, samplerate=SAMPLE_RATE)
+player.start()
 
 
-def clean_text_for_tts(text):
-    """
-    Cleans the AI output so the TTS doesn't crash on emojis or actions.
-    """
-    # 1. Remove text inside parentheses (e.g., "(Giggles)", "(Eyes sparkling)")
-    text = re.sub(r'\(.*?\)', '', text)
-    
-    # 2. Remove asterisks (e.g., "*smiles*")
-    text = re.sub(r'\*.*?\*', '', text)
-    
-    # 3. Remove emojis and non-ASCII characters
-    text = re.sub(r'[^\x00-\x7F]+', '', text)
-    
-    # 4. Remove code blocks or weird symbols
-    text = re.sub(r'[^a-zA-Z0-9\s.,!?\']', '', text)
-    
-    return text.strip()
+def synthesize_text(clean_text, language="en"):
+    """Generates audio for one normalized sentence on a pipeline worker."""
+    # Choose speaker and language
+    speaker = ENGLISH_SPEAKER if language == "en" else TAMIL_SPEAKER
 
+    # Repeated phrases come straight from the cache
+    cached = audio_cache.get(clean_text, speaker, language)
+    if cached is not None:
+        return cached
 
-def speak_text(text, language="en"):
-    """Generates audio from cleaned text and adds it to the playback queue."""
-    clean_text = clean_text_for_tts(text)
-    
-    # Skip if nothing is left to say
-    if len(clean_text) < 2:
-        return
-        
     try:
-        # Choose speaker and language
-        speaker = ENGLISH_SPEAKER if language == "en" else TAMIL_SPEAKER
         # Generate waveform
-        audio = tts.tts(text=clean_text, speaker=speaker, language=language)
-        audio_queue.put(np.array(audio))
+        if STREAM_CHUNK_SIZE:
+            # Playback starts on the first chunk instead of after the whole sentence
+            stream = speakers.stream(clean_text, speaker, language, chunk_size=STREAM_CHUNK_SIZE)
+            return audio_cache.record(clean_text, speaker, language, stream)
+        audio = np.asarray(speakers.tts(clean_text, speaker, language), dtype=np.float32)
+        audio_cache.put(clean_text, speaker, language, audio)
+        return audio
     except Exception as e:
         # This catches the 'index out of range' error silently
-        pass
+        return None
+
+
+# tokens -> segmenter -> normalizer -> synthesis -> playback, with bounded queues in between
+pipeline = VoicePipeline(ollama.AsyncClient(), MODEL_NAME, trimmer.wrap(synthesize_text), player, workers=TTS_WORKERS,
+                         max_pending=TTS_MAX_PENDING, keep_alive=KEEP_ALIVE, report_ttfa=REPORT_TTFA)
+
+
+def print_chunk(chunk, prompt):
+    print(chunk['message']['content'], end="", flush=True)
+    if chunk.get("done"):
+        usage = conversation.record_usage(chunk, prompt)
+        if usage:
+            print(f"\n[prefill {usage['prompt_tokens']} of ~{usage['prompt_tokens_estimate']} prompt tokens"
+                  f" in {usage['prefill_seconds'] * 1000:.0f} ms]", end="")
 
 
 def stream_and_speak(prompt, language="en"):
-    """Streams from Ollama and sends sentences to the TTS thread."""
+    """Synchronous wrapper: streams a reply through the async pipeline and returns once it is queued for playback."""
     print(f"\n--- Chatting with {MODEL_NAME} ---")
     
-    # System message helps Emma be more 'TTS friendly'
-    messages = [
-        {"role": "system", "content": "You are Emma. Be playful and helpful. Avoid using emojis or writing actions in parentheses as I cannot hear them."},
-        {"role": "user", "content": prompt}
-    ]
-    
     try:
-        response = ollama.chat(model=MODEL_NAME, messages=messages, stream=True)
-        
-        buffer = ""
-        for chunk in response:
-            content = chunk['message']['content']
-            print(content, end="", flush=True)
-            buffer += content
-            
-            # Trigger speech when a sentence ends
-            if any(char in content for char in (".", "!", "?", "\n")):
-                sentence = buffer.strip()
-                if sentence:
-                    # Threading allows audio to generate while text is still streaming
-                    threading.Thread(target=speak_text, args=(sentence, language), daemon=True).start()
-                buffer = ""
-
-
-        # Final check for remaining text
-        if buffer.strip():
-            speak_text(buffer.strip(), language)
+        reply = pipeline.run(pipeline.speak(conversation.messages(prompt), language,
+                                            on_chunk=lambda chunk: print_chunk(chunk, prompt)))
+        conversation.add_turn(prompt, reply)
             
     except Exception as e:
         print(f"\n[Ollama Error] Ensure Ollama is running: {e}")
 
 
+def wait_until_spoken():
+    """Blocks until everything handed to the player has been played."""
+    player.drain()
+
+
 if __name__ == "__main__":
     print("\n" + "="*30)
     print("EMMA LIVE VOICE CHAT")
@@ -131,3 +118,6 @@ if __name__ == "__main__":
             break
         # To switch to Tamil, use language="ta"
         stream_and_speak(user_input, language="en")  # Change to "ta" for Tamil
+        # Summarizing old turns is an LLM round-trip; it runs while you type
+        conversation.compact_in_background()
+    player.close()
@@ -1,148 +1,171 @@
-from TTS.api import TTS
-import sounddevice as sd
+import ollama
 import numpy as np
 import threading
 import queue
-import re
-from google.cloud import speech_v1p1beta1
+from tts_scheduler import TTSScheduler, ordered
+from audio_sinks import open_sink
+from tts_daemon import connect_synthesizer
+from audio_cache import AudioCache
+from silence_trim import SilenceTrimmer
+from segmenter import SentenceSegmenter
+from text_normalizer import normalize_text
+from conversation import Conversation, ollama_summarizer
+from mic_capture import MicCapture, EnergyVAD
+from asr import load_recognizer, transcribe_stream
 
 # --- CONFIGURATION ---
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
 MODEL_NAME = "emma"             # Your local Ollama model
 SPEAKER_NAME = "Ana Florence" # Built-in XTTS v2 Female voice
 SAMPLE_RATE = 24000              # Native XTTS v2 sample rate
-GOOGLE_CLOUD_PROJECT_ID = 'your-project-id'  # Replace with your Google Cloud project ID
-GOOGLE_CLOUD_REGION = 'us-central1'         # Replace with your Google Cloud region
+TTS_WORKERS = 2                  # Parallel synthesis threads
+TTS_MAX_PENDING = 4              # Sentences that may wait for a worker before the LLM loop blocks
+STREAM_CHUNK_SIZE = 20           # GPT tokens per streamed audio chunk (0 = render whole sentences)
+REPORT_TTFA = True               # Print time-to-first-audio for every sentence
+TRIM_SILENCE = True              # Cut XTTS's leading/trailing near-silence; pauses then follow punctuation
+AUDIO_OUT = "device"             # Where Emma's voice goes: device, null, or a .wav/.flac path
+AUDIO_CACHE_MB = 64              # In-memory clip cache; older clips stay on disk
+MIC_SAMPLE_RATE = 16000          # Capture rate for speech recognition
+END_SILENCE_MS = 300             # Trailing silence that ends your turn
+ASR_BACKEND = "whisper"          # Local CPU recognition; "google_cloud" for Cloud Speech-to-Text
+ASR_OPTIONS = {"model_size": "base.en"}  # Passed to the backend (see asr.py)
+# System message helps Emma be more 'TTS friendly'
+SYSTEM_PROMPT = "You are Emma. Be playful and helpful. Avoid using emojis or writing actions in parentheses as I cannot hear them."
+KEEP_ALIVE = "30m"               # Keep the model loaded in Ollama between turns
+HISTORY_TOKENS = 2048            # Conversation memory budget; older turns get summarized
 # ---------------------
 
 print("Loading Emma's voice engine (XTTS v2)...")
-tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2", progress_bar=False, gpu=False)
+# Uses the shared tts_daemon when one is running, otherwise loads XTTS here
+speakers = connect_synthesizer(TTS_MODEL)
+audio_cache = AudioCache(TTS_MODEL, max_memory_mb=AUDIO_CACHE_MB, profile=speakers.profile)
+# Clips are cached as synthesized and trimmed on the way out
+trimmer = SilenceTrimmer(SAMPLE_RATE, enabled=TRIM_SILENCE)
 
 audio_queue = queue.Queue()
 
+# Multi-turn memory; the prompt prefix stays identical between turns so Ollama's KV cache is reused
+conversation = Conversation(SYSTEM_PROMPT, max_tokens=HISTORY_TOKENS,
+                            summarize=ollama_summarizer(MODEL_NAME, keep_alive=KEEP_ALIVE))
+
 def play_audio_worker():
     """Background thread: Plays audio chunks smoothly in the order they arrive."""
-    while True:
+    # ordered() holds back finished sentences until the earlier ones have played
+    last_seq = None
+    for seq, audio_data in ordered(audio_queue):
         try:
-            audio_data = audio_queue.get()
-            if audio_data is None: break
-            
-            if len(audio_data) > 0:
-                sd.play(audio_data, samplerate=SAMPLE_RATE)
-                sd.wait()
-            audio_queue.task_done()
+            # One persistent stream: no device setup or gap between sentences.
+            # Only crossfade at sentence joins; streamed chunks are contiguous.
+            player.write(audio_data, crossfade=seq != last_seq)
+            last_seq = seq
         except Exception as e:
             print(f"\n[Playback Error] {e}")
 
 # Start the audio playback thread
+player = open_sink(AUDIO_OUT, samplerate=SAMPLE_RATE)
+player.start()
 threading.Thread(target=play_audio_worker, daemon=True).start()
 
-def clean_text_for_tts(text):
-    """
-    Cleans the AI output so the TTS doesn't crash on emojis or actions.
-    """
-    # 1. Remove text inside parentheses (e.g., "(Giggles)", "(Eyes sparkling)")
-    text = re.sub(r'\(.*?\)', '', text)
-    
-    # 2. Remove asterisks (e.g., "*smiles*")
-    text = re.sub(r'\*.*?\*', '', text)
-    
-    # 3. Remove emojis and non-ASCII characters
-    text = re.sub(r'[^\x00-\x7F]+', '', text)
-    
-    # 4. Remove code blocks or weird symbols
-    text = re.sub(r'[^a-zA-Z0-9\s.,!?\']', '', text)
-    
-    return text.strip()
-
-def speak_text(text):
-    """Generates audio from cleaned text and adds it to the playback queue."""
-    clean_text = clean_text_for_tts(text)
+def synthesize_text(text):
+    """Generates audio from cleaned text on a scheduler worker."""
+    # One pass: drops actions/emojis, spells out numbers, currency and abbreviations
+    clean_text = normalize_text(text)
     
     # Skip if nothing is left to say
     if len(clean_text) < 2:
-        return
+        return None
+
+    # Repeated phrases come straight from the cache
+    cached = audio_cache.get(clean_text, SPEAKER_NAME, "en")
+    if cached is not None:
+        return cached
         
     try:
         # Generate waveform
-        audio = tts.tts(text=clean_text, speaker=SPEAKER_NAME, language="en")
-        audio_queue.put(np.array(audio))
+        if STREAM_CHUNK_SIZE:
+            # Playback starts on the first chunk instead of after the whole sentence
+            stream = speakers.stream(clean_text, SPEAKER_NAME, "en", chunk_size=STREAM_CHUNK_SIZE)
+            return audio_cache.record(clean_text, SPEAKER_NAME, "en", stream)
+        audio = np.asarray(speakers.tts(clean_text, SPEAKER_NAME, "en"), dtype=np.float32)
+        audio_cache.put(clean_text, SPEAKER_NAME, "en", audio)
+        return audio
     except Exception as e:
         # This catches the 'index out of range' error silently
-        pass
+        return None
+
+scheduler = TTSScheduler(trimmer.wrap(synthesize_text), audio_queue, num_workers=TTS_WORKERS, max_pending=TTS_MAX_PENDING, report_ttfa=REPORT_TTFA)
+
+def speak_text(text):
+    """Queues a sentence for synthesis; it plays after everything queued before it."""
+    scheduler.submit(text)
 
 def stream_and_speak(prompt):
     """Streams from Ollama and sends sentences to the TTS thread."""
     print(f"\n--- Chatting with {MODEL_NAME} ---")
     
-    # System message helps Emma be more 'TTS friendly'
-    messages = [
-        {"role": "system", "content": "You are Emma. Be playful and helpful. Avoid using emojis or writing actions in parentheses as I cannot hear them."},
-        {"role": "user", "content": prompt}
-    ]
-    
     try:
-        response = ollama.chat(model=MODEL_NAME, messages=messages, stream=True)
+        response = ollama.chat(model=MODEL_NAME, messages=conversation.messages(prompt), stream=True,
+                               keep_alive=KEEP_ALIVE)
         
-        buffer = ""
+        # Segments end at real sentence boundaries (not "3.5" or "Dr."); each token is scanned once
+        segmenter = SentenceSegmenter()
+        reply = []
         for chunk in response:
             content = chunk['message']['content']
+            reply.append(content)
             print(content, end="", flush=True)
-            buffer += content
-            
-            # Trigger speech when a sentence ends
-            if any(char in content for char in (".", "!", "?", "\n")):
-                sentence = buffer.strip()
-                if sentence:
-                    # Threading allows audio to generate while text is still streaming
-                    threading.Thread(target=speak_text, args=(sentence,), daemon=True).start()
-                buffer = ""
+            if chunk.get("done"):
+                usage = conversation.record_usage(chunk, prompt)
+                if usage:
+                    print(f"\n[prefill {usage['prompt_tokens']} of ~{usage['prompt_tokens_estimate']} prompt tokens"
+                          f" in {usage['prefill_seconds'] * 1000:.0f} ms]", end="")
+            for sentence in segmenter.feed(content):
+                speak_text(sentence)
 
-        # Final check for remaining text
-        if buffer.strip():
-            speak_text(buffer.strip())
+        # Speak any remaining text
+        for sentence in segmenter.flush():
+            speak_text(sentence)
+        conversation.add_turn(prompt, "".join(reply))
             
     except Exception as e:
         print(f"\n[Ollama Error] Ensure Ollama is running: {e}")
 
-def process_audio():
-    """Process audio from the microphone and send it to the TTS thread."""
-    def callback(indata, frames, time, status):
-        if status:
-            raise RuntimeError(status)
-        
-        # Convert mono input to stereo
-        outdata[:] = np.interp(frames, (0, indata.shape[1]), (indata[:, 0], indata[:, 0] * 2))
-        
-        # Send audio data to the TTS thread
-        if len(outdata) > 0:
-            audio_queue.put(np.array(outdata))
-
-    with sd.InputStream(samplerate=SAMPLE_RATE, channels=2, callback=callback):
-        print("\nListening...")
-        while True:
-            user_input = input("\nYou: ")
-            if user_input.lower() in ["exit", "quit", "bye"]:
-                print("Goodbye, darling!")
-                return
+def wait_until_spoken():
+    """Blocks until every queued sentence has been synthesized and played."""
+    scheduler.wait()
+    audio_queue.join()
+    player.drain()
 
 if __name__ == "__main__":
     print("\n" + "="*30)
     print("EMMA LIVE VOICE CHAT")
     print("Speaker:", SPEAKER_NAME)
     print("Model:", MODEL_NAME)
-    print("Type 'exit' to quit.")
+    print("Say 'exit' to quit.")
     print("="*30 + "\n")
     
-    # Initialize Google Cloud Speech-to-Text client
-    speech_client = speech_v1p1beta1.SpeechClient()
-    config = speech_v1p1beta1.RecognitionConfig(
-        encoding=speech_v1p1beta1.RecognitionConfig.AudioEncoding.LINEAR16,
-        sample_rate_hertz=SAMPLE_RATE,
-        language_code="en-US"
-    )
+    recognizer = load_recognizer(ASR_BACKEND, samplerate=MIC_SAMPLE_RATE, **ASR_OPTIONS)
     
-    # Start processing audio in the background
-    threading.Thread(target=process_audio, daemon=True).start()
+    # The mic stays open; each turn ends after END_SILENCE_MS of silence
+    capture = MicCapture(MIC_SAMPLE_RATE, end_silence_ms=END_SILENCE_MS,
+                         vad=EnergyVAD(echo_level=lambda: player.output_rms))
+    capture.start()
     
     while True:
-        pass
+        print("\nListening...")
+        _, user_input = transcribe_stream(capture, recognizer)
+        if not user_input:
+            continue
+        print(f"\nYou: {user_input}")
+        if user_input.lower().strip(" .!") in ["exit", "quit", "bye"]:
+            print("Goodbye, darling!")
+            break
+        stream_and_speak(user_input)
+        wait_until_spoken()
+        # Summarizing old turns is an LLM round-trip; it runs while you talk
+        conversation.compact_in_background()
+        # Anything picked up while Emma was talking is most likely her own voice
+        capture.clear()
+
+    capture.close()
+    player.close()